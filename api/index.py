@@ -1,23 +1,63 @@
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, g
+from flask.json.provider import DefaultJSONProvider
 from io import BytesIO
-from PIL import Image
 import logging
-import requests
 import re
-from py_mini_racer import MiniRacer
 import json
 import base64
+import hashlib
+import hmac
+import math
+import unicodedata
+import bisect
+import random
 import logging
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 import sys
+import os
 import time
-from urllib.parse import unquote, quote, urlencode
-from asgiref.wsgi import WsgiToAsgi
+import sqlite3
+import threading
+import queue
+import asyncio
+import functools
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from urllib.parse import unquote, quote, urlencode, urlsplit, parse_qs
+
+# PIL、py_mini_racer、requests、httpx和asgiref在首次使用时才导入，
+# 不需要它们的路由和冷启动不承担导入开销
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from PIL import Image
 
 sys.stdout.reconfigure(encoding="utf-8")
 
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """记录JSON序列化耗时"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with timed("serialize"):
+            return super().dumps(obj, **kwargs)
+
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 logging.basicConfig(level=logging.INFO)
+# httpx会为每个请求输出INFO日志
+logging.getLogger("httpx").setLevel(logging.WARNING)
 app.debug = False
 app.json.ensure_ascii = False
 
@@ -49,6 +89,16 @@ def decode_search_value(value: str) -> str:
         return value
 
 
+def normalize_search_query(value: str) -> str:
+    """
+    规范化搜索关键词，作为搜索结果缓存和查询统计的键
+
+    解码多重URL编码，全角转半角，连续空白合并为一个空格，忽略大小写
+    """
+    text = unicodedata.normalize("NFKC", decode_search_value(value))
+    return " ".join(text.split()).casefold()
+
+
 # 配置
 class Config:
     HEADERS = {
@@ -66,443 +116,3743 @@ class Config:
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36",
     }
 
+    # 缓存后端，留空只使用进程内缓存
+    # 支持 sqlite:///tmp/qqcomic-cache.sqlite3 或 redis://host:6379/0
+    CACHE_BACKEND = os.environ.get("QQCOMIC_CACHE_BACKEND", "")
+    # 漫画详情缓存，单位秒
+    COMIC_INFO_CACHE_TTL = float(os.environ.get("QQCOMIC_COMIC_INFO_CACHE_TTL", 600))
+    COMIC_INFO_CACHE_SIZE = int(os.environ.get("QQCOMIC_COMIC_INFO_CACHE_SIZE", 256))
+    # 详情超过新鲜期后继续返回旧结果并在后台重新验证的时长，单位秒
+    COMIC_INFO_STALE_TTL = float(os.environ.get("QQCOMIC_COMIC_INFO_STALE_TTL", 86400))
 
-class ComicParser:
-    """漫画解析器"""
+    # 解密后的章节图片列表缓存，单位秒
+    CHAPTER_IMAGES_CACHE_TTL = float(
+        os.environ.get("QQCOMIC_CHAPTER_IMAGES_CACHE_TTL", 300)
+    )
+    CHAPTER_IMAGES_CACHE_SIZE = int(
+        os.environ.get("QQCOMIC_CHAPTER_IMAGES_CACHE_SIZE", 1024)
+    )
 
-    @staticmethod
-    def decode_base64_custom(T: str) -> bytes:
-        """自定义Base64解码"""
-        keyStr = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
-        result = []
-        e = 0
-
-        while e < len(T):
-            b = keyStr.index(T[e])
-            e += 1
-            d = keyStr.index(T[e])
-            e += 1
-            f = keyStr.index(T[e])
-            e += 1
-            g = keyStr.index(T[e])
-            e += 1
+    # 章节索引（章节号到cid）的SQLite文件，留空则只保存在内存中
+    CHAPTER_INDEX_PATH = os.environ.get(
+        "QQCOMIC_CHAPTER_INDEX_PATH", "/tmp/qqcomic-chapters.sqlite3"
+    )
+    # 索引超过该时间（秒）后在后台重新读取详情页
+    CHAPTER_INDEX_TTL = float(os.environ.get("QQCOMIC_CHAPTER_INDEX_TTL", 600))
+    # 请求的章节号大于索引中最新章节时立即刷新索引，两次刷新至少间隔该时间（秒）
+    CHAPTER_INDEX_MIN_REFRESH = float(
+        os.environ.get("QQCOMIC_CHAPTER_INDEX_MIN_REFRESH", 30)
+    )
+    # 进程内保留索引的漫画数
+    CHAPTER_INDEX_MEMORY_SIZE = int(
+        os.environ.get("QQCOMIC_CHAPTER_INDEX_MEMORY_SIZE", 1024)
+    )
 
-            b = b << 2 | d >> 4
-            d = (d & 15) << 4 | f >> 2
-            h = (f & 3) << 6 | g
+    # 上游地址，可指向本地桩服务器做测试
+    AC_BASE_URL = os.environ.get("QQCOMIC_AC_BASE_URL", "https://ac.qq.com").rstrip("/")
+    M_AC_BASE_URL = os.environ.get(
+        "QQCOMIC_M_AC_BASE_URL", "https://m.ac.qq.com"
+    ).rstrip("/")
+    # 上游连接池与超时，单位秒
+    UPSTREAM_POOL_SIZE = int(os.environ.get("QQCOMIC_UPSTREAM_POOL_SIZE", 10))
+    UPSTREAM_CONNECT_TIMEOUT = float(
+        os.environ.get("QQCOMIC_UPSTREAM_CONNECT_TIMEOUT", 5)
+    )
+    UPSTREAM_READ_TIMEOUT = float(os.environ.get("QQCOMIC_UPSTREAM_READ_TIMEOUT", 15))
+    # 每个上游主机每秒最多请求数与突发容量，0表示不限速
+    UPSTREAM_RATE_LIMIT = float(os.environ.get("QQCOMIC_UPSTREAM_RATE_LIMIT", 0))
+    UPSTREAM_RATE_BURST = int(os.environ.get("QQCOMIC_UPSTREAM_RATE_BURST", 20))
+    # 限流、Retry-After或退避需要等待的上限，超过则直接失败，单位秒
+    UPSTREAM_MAX_WAIT = float(os.environ.get("QQCOMIC_UPSTREAM_MAX_WAIT", 2))
+    # 连接失败和429/502/503/504的重试次数，退避时间按指数增长并加随机抖动
+    UPSTREAM_RETRIES = int(os.environ.get("QQCOMIC_UPSTREAM_RETRIES", 2))
+    UPSTREAM_BACKOFF_BASE = float(os.environ.get("QQCOMIC_UPSTREAM_BACKOFF_BASE", 0.2))
+    UPSTREAM_BACKOFF_MAX = float(os.environ.get("QQCOMIC_UPSTREAM_BACKOFF_MAX", 2))
+    # 连续失败多少次后熔断，0表示不熔断；熔断后经过冷却时间放行一个探测请求
+    UPSTREAM_BREAKER_THRESHOLD = int(
+        os.environ.get("QQCOMIC_UPSTREAM_BREAKER_THRESHOLD", 5)
+    )
+    UPSTREAM_BREAKER_COOLDOWN = float(
+        os.environ.get("QQCOMIC_UPSTREAM_BREAKER_COOLDOWN", 30)
+    )
 
-            result.append(b)
-            if f != 64:
-                result.append(d)
-            if g != 64:
-                result.append(h)
+    # 处理后图片缓存：内存层与磁盘层的容量上限，单位字节
+    IMAGE_CACHE_MEMORY_BYTES = int(
+        os.environ.get("QQCOMIC_IMAGE_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+    )
+    IMAGE_CACHE_DIR = os.environ.get("QQCOMIC_IMAGE_CACHE_DIR", "/tmp/qqcomic-images")
+    # Vercel的/tmp总共只有512MB，还要存放章节和搜索索引，默认只用一小部分
+    IMAGE_CACHE_DISK_BYTES = int(
+        os.environ.get(
+            "QQCOMIC_IMAGE_CACHE_DISK_BYTES",
+            (64 if os.environ.get("VERCEL") else 512) * 1024 * 1024,
+        )
+    )
 
-        return bytes(result)
+    # 图片代理的原图限制
+    IMAGE_MAX_BYTES = int(os.environ.get("QQCOMIC_IMAGE_MAX_BYTES", 20 * 1024 * 1024))
+    IMAGE_MAX_PIXELS = int(os.environ.get("QQCOMIC_IMAGE_MAX_PIXELS", 40_000_000))
+    # 图片代理输出的最大宽度，width参数超过时按该值处理；输出像素同样受上面的限制
+    IMAGE_MAX_WIDTH = int(os.environ.get("QQCOMIC_IMAGE_MAX_WIDTH", 2048))
+    # 缩小倍数较大时先用reduce降到目标尺寸的该倍数，再做LANCZOS
+    IMAGE_REDUCING_GAP = float(os.environ.get("QQCOMIC_IMAGE_REDUCING_GAP", 2.0))
 
-    @staticmethod
-    def get_comic_info(comic_id: str) -> Dict:
-        """获取漫画基本信息"""
-        url = f"https://ac.qq.com/Comic/comicInfo/id/{comic_id}"
-        resp = requests.get(url, headers=Config.HEADERS)
+    # 图片缩放编码的子进程数，0表示在请求线程中处理；
+    # Vercel等无法创建子进程的环境默认不启用
+    IMAGE_WORKERS = int(
+        os.environ.get(
+            "QQCOMIC_IMAGE_WORKERS",
+            0 if os.environ.get("VERCEL") else os.cpu_count() or 2,
+        )
+    )
+    # 等待和处理中的任务数上限，超过后返回503
+    IMAGE_QUEUE_SIZE = int(os.environ.get("QQCOMIC_IMAGE_QUEUE_SIZE", 64))
+    # 子进程处理多少张图片后重建，0表示不重建
+    IMAGE_WORKER_MAX_TASKS = int(os.environ.get("QQCOMIC_IMAGE_WORKER_MAX_TASKS", 500))
 
-        if resp.status_code != 200:
-            return {"error": f"请求失败，状态码: {resp.status_code}"}
+    # 章节图片列表为每张图片附加分段URL时每段的目标高度（像素），0表示不附加
+    IMAGE_SLICE_HEIGHT = int(os.environ.get("QQCOMIC_IMAGE_SLICE_HEIGHT", 0))
+    # 单张图片最多的分段数
+    IMAGE_MAX_SLICES = int(os.environ.get("QQCOMIC_IMAGE_MAX_SLICES", 16))
+    # 503响应的Retry-After，单位秒
+    IMAGE_RETRY_AFTER = int(os.environ.get("QQCOMIC_IMAGE_RETRY_AFTER", 1))
 
-        # 提取标题
-        title_match = re.search("<title>(.*?)</title>", resp.text)
-        title = title_match.group(1) if title_match else "未知标题"
-        comic_title = title.split("-")[0].strip() if "-" in title else title
+    # 根据Accept自动选择的输出格式，按优先级排列；AVIF编码较慢，默认不自动选择
+    IMAGE_NEGOTIATED_FORMATS = [
+        fmt.strip().lower()
+        for fmt in os.environ.get("QQCOMIC_IMAGE_NEGOTIATED_FORMATS", "webp").split(",")
+        if fmt.strip()
+    ]
+    # 代理URL未指定时的宽度和质量
+    IMAGE_DEFAULT_WIDTH = 600
+    IMAGE_DEFAULT_QUALITY = 50
 
-        # 提取封面图片
+    # 图片代理URL的签名密钥；设置后只处理签名有效的请求，防止被当作公开的图片缩放服务
+    IMAGE_URL_SECRET = os.environ.get("QQCOMIC_IMAGE_URL_SECRET", "")
+    # 腾讯动漫的图片主机；未设置签名密钥时，图片代理只处理这些主机和上游地址的图片
+    IMAGE_HOSTS = tuple(
+        host.strip().lower()
+        for host in os.environ.get(
+            "QQCOMIC_IMAGE_HOSTS", "manhua.acimg.cn,ac.gtimg.com"
+        ).split(",")
+        if host.strip()
+    )
+    # 生成图片代理URL使用的固定地址，留空时使用请求的地址
+    IMAGE_PROXY_BASE_URL = os.environ.get("QQCOMIC_IMAGE_PROXY_BASE_URL", "")
+    # 参数完整的图片代理URL的浏览器与CDN缓存时间，单位秒
+    IMAGE_CACHE_MAX_AGE = int(os.environ.get("QQCOMIC_IMAGE_CACHE_MAX_AGE", 31536000))
 
-        cover_match = re.search(
-            r'<div class="works-cover[^"]*">\s*<a[^>]*>\s*<img src="([^"]*)"[^>]*>',
-            resp.text,
-        )
+    # 返回章节图片列表后在后台预取并处理该章图片，默认关闭
+    IMAGE_PREFETCH = os.environ.get("QQCOMIC_IMAGE_PREFETCH", "0") == "1"
+    # 同时预取下一章
+    IMAGE_PREFETCH_NEXT_CHAPTER = (
+        os.environ.get("QQCOMIC_IMAGE_PREFETCH_NEXT_CHAPTER", "0") == "1"
+    )
+    IMAGE_PREFETCH_WORKERS = int(os.environ.get("QQCOMIC_IMAGE_PREFETCH_WORKERS", 4))
+    # 每个图片主机同时进行的预取数
+    IMAGE_PREFETCH_PER_HOST = int(os.environ.get("QQCOMIC_IMAGE_PREFETCH_PER_HOST", 2))
+    # 等待队列长度，队列满时丢弃新的预取任务
+    IMAGE_PREFETCH_QUEUE_SIZE = int(
+        os.environ.get("QQCOMIC_IMAGE_PREFETCH_QUEUE_SIZE", 512)
+    )
+    # 预取的输出格式，留空时使用浏览器请求图片时协商出的格式
+    IMAGE_PREFETCH_FORMAT = os.environ.get("QQCOMIC_IMAGE_PREFETCH_FORMAT", "")
 
-        if cover_match:
-            cover_url = cover_match.group(1)
-            # 处理可能的相对路径
-            if cover_url.startswith("//"):
-                cover_url = "https:" + cover_url
-            elif cover_url.startswith("/"):
-                cover_url = "https://ac.qq.com" + cover_url
-        else:
-            cover_url = None
+    # 搜索每页数量
+    SEARCH_PAGE_SIZE = 10
+    # has_more的判断方式：probe并发请求下一页，count按本页结果数推断
+    SEARCH_HAS_MORE_MODE = os.environ.get("QQCOMIC_SEARCH_HAS_MORE_MODE", "probe")
+    # 搜索结果页缓存，单位秒
+    SEARCH_PAGE_CACHE_TTL = float(os.environ.get("QQCOMIC_SEARCH_PAGE_CACHE_TTL", 120))
+    SEARCH_PAGE_CACHE_SIZE = int(os.environ.get("QQCOMIC_SEARCH_PAGE_CACHE_SIZE", 512))
+    # 搜索结果缓存，按（规范化关键词，页码）缓存接口结果，单位秒
+    SEARCH_RESULT_CACHE_TTL = float(
+        os.environ.get("QQCOMIC_SEARCH_RESULT_CACHE_TTL", 300)
+    )
+    SEARCH_RESULT_CACHE_SIZE = int(
+        os.environ.get("QQCOMIC_SEARCH_RESULT_CACHE_SIZE", 1024)
+    )
+    # 按查询统计次数时最多记录的关键词数
+    SEARCH_QUERY_STATS_SIZE = int(
+        os.environ.get("QQCOMIC_SEARCH_QUERY_STATS_SIZE", 10000)
+    )
+    # /cache/stats 中列出的热门查询数
+    SEARCH_TOP_QUERIES = 20
+    # 本地搜索索引的SQLite文件，留空则只保存在内存中
+    SEARCH_INDEX_PATH = os.environ.get(
+        "QQCOMIC_SEARCH_INDEX_PATH", "/tmp/qqcomic-search.sqlite3"
+    )
+    # 默认搜索来源：remote请求上游，local只查本地索引，
+    # hybrid在本地结果填满当前页时直接返回，否则请求上游
+    SEARCH_SOURCE = os.environ.get("QQCOMIC_SEARCH_SOURCE", "remote")
 
-        # 提取人气信息 - 匹配你提供的HTML结构
-        popularity_match = re.search(r"<span>人气：<em>(.*?)</em></span>", resp.text)
-        popularity = popularity_match.group(1).strip() if popularity_match else "未知"
+    # 异步入口的上游连接上限
+    ASYNC_UPSTREAM_MAX_CONNECTIONS = int(
+        os.environ.get("QQCOMIC_ASYNC_UPSTREAM_MAX_CONNECTIONS", 100)
+    )
+    # 异步入口中执行解析、解密、图片处理等CPU任务的线程数
+    CPU_WORKERS = int(os.environ.get("QQCOMIC_CPU_WORKERS", os.cpu_count() or 2))
 
-        # 提取评分信息 - 匹配你提供的HTML结构
-        rating_match = re.search(
-            r"评分：<strong[^>]*>(.*?)</strong>\s*\(<span>(\d+)</span>人评分\)",
-            resp.text,
-        )
-        if rating_match:
-            rating = {
-                "score": rating_match.group(1).strip(),
-                "rating_count": rating_match.group(2).strip(),
-            }
-        else:
-            rating = {"score": "未知", "rating_count": "0"}
+    # 批量接口：单次请求最多的条目数，以及同时处理的条目数
+    BATCH_MAX_ITEMS = int(os.environ.get("QQCOMIC_BATCH_MAX_ITEMS", 50))
+    BATCH_PARALLELISM = int(os.environ.get("QQCOMIC_BATCH_PARALLELISM", 8))
+    # Flask入口执行批量条目的线程数，由所有批量请求共享
+    BATCH_WORKERS = int(os.environ.get("QQCOMIC_BATCH_WORKERS", 32))
 
-        # 提取章节列表 - 匹配你提供的HTML结构
-        # 查找所有章节链接，格式如：3.梦中人
-        chapter_pattern = r'<a(?!.*?开始阅读)[^>]*?title="([^"]+?)"[^>]*?href="(/ComicView/index/id/\d+/cid/\d+)"[^>]*?>([\s\S]*?)</a>'
-        chapter_matches = re.findall(chapter_pattern, resp.text)
+    # V8上下文池
+    JS_POOL_SIZE = int(os.environ.get("QQCOMIC_JS_POOL_SIZE", 2))
+    # 单个上下文执行多少次后重建
+    JS_CONTEXT_MAX_EVALS = int(os.environ.get("QQCOMIC_JS_CONTEXT_MAX_EVALS", 500))
+    # 堆内存超过该值（字节）后重建
+    JS_CONTEXT_MAX_HEAP = int(
+        os.environ.get("QQCOMIC_JS_CONTEXT_MAX_HEAP", 32 * 1024 * 1024)
+    )
+    # 单次执行超时，单位毫秒
+    JS_EVAL_TIMEOUT_MS = int(os.environ.get("QQCOMIC_JS_EVAL_TIMEOUT_MS", 1000))
 
-        chapters = []
-        for match in chapter_matches:
-            # match[0] 是title属性中的章节名，match[1] 是链接，match[2] 是标签内的章节名
-            title_attr = match[0].strip()  # title属性中的标题，如"王牌御史：01，缘起"
-            link_text = re.sub(
-                r"\s+", " ", match[2]
-            ).strip()  # 标签内的文本，清理多余空格，如"01，缘起"
-            chapter_link = "https://ac.qq.com" + match[1]
 
-            # 优先使用title属性中的标题，如果没有则使用链接文本
-            chapter_name = title_attr.split("：")[1]
+class Histogram:
+    """Prometheus文本格式的直方图，按标签分组"""
 
-            # 提取章节序号 - 更灵活的匹配方式
-            chapter_num = len(chapters) + 1  # 默认序号
+    DEFAULT_BUCKETS = (
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
 
-            chapters.append(
-                {"number": chapter_num, "link": chapter_link, "title": chapter_name}
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...],
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # 标签值 -> [各区间计数, 总和, 总数]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labels] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @staticmethod
+    def _format_labels(pairs) -> str:
+        escaped = []
+        for name, value in pairs:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            value = value.replace("\n", "\\n")
+            escaped.append(f'{name}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted(
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self._series.items()
             )
+        for labels, counts, total, count in series:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for le, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bound = "+Inf" if le == float("inf") else repr(le)
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{self._format_labels(pairs + [('le', bound)])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._format_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(pairs)} {count}")
+        return lines
 
-        seen_links = set()
-        unique_chapters = []
 
-        for chapter in chapters:
-            # 提取链接中的cid作为唯一标识
-            cid_match = re.search(r"/cid/(\d+)", chapter["link"])
-            if cid_match:
-                cid = cid_match.group(1)
-                if cid not in seen_links:
-                    seen_links.add(cid)
-                    unique_chapters.append(chapter)
-            else:
-                # 如果没有cid，使用章节名去重
-                if chapter["link"] not in seen_links:
-                    seen_links.add(chapter["link"])
-                    unique_chapters.append(chapter)
+request_duration = Histogram(
+    "qqcomic_request_duration_seconds", "请求总耗时", ("route", "status")
+)
+stage_duration = Histogram(
+    "qqcomic_stage_duration_seconds", "请求各阶段耗时", ("route", "stage")
+)
+# 当前请求的路由和各阶段累计耗时；后台任务不属于任何请求
+_request_route = contextvars.ContextVar("qqcomic_request_route", default="background")
+_request_timings = contextvars.ContextVar("qqcomic_request_timings", default=None)
+_timings_lock = threading.Lock()
 
-        chapters = unique_chapters
 
-        # 按章节号排序
-        chapters.sort(key=lambda x: x["number"])
+def record_stage(stage: str, seconds: float):
+    """记录一个阶段的耗时，计入当前请求的Server-Timing和阶段直方图"""
+    timings = _request_timings.get()
+    if timings is not None:
+        # 线程池中的任务共享同一个字典
+        with _timings_lock:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+    stage_duration.observe((_request_route.get(), stage), seconds)
 
-        return {
-            "comic_id": comic_id,
-            "title": comic_title,
-            "popularity": popularity,
-            "rating": rating,
-            "chapters": chapters,
-            "cover_url": cover_url,  # 新增封面URL
-            "total_chapters": len(chapters),
-        }
 
-    @staticmethod
-    def get_chapter_images(chapter_url: str, cookie) -> Dict:
-        """获取章节图片数据"""
-        max_retries = 3
-        retry_count = 0
+@contextmanager
+def timed(stage: str):
+    """统计代码块耗时，见 record_stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
 
-        while retry_count < max_retries:
-            try:
-                headers = Config.HEADERS.copy()
-                if cookie:
-                    headers["Cookie"] = cookie
-                resp = requests.get(chapter_url, headers=headers)
-                if resp.status_code != 200:
-                    return {"error": f"章节请求失败，状态码: {resp.status_code}"}
-
-                html = resp.text
-
-                # 提取章节标题
-                chapter_title_match = re.search(
-                    r"<title>《[^》]*》(.*?)-.*?</title>", html
-                )
-                chapter_title = (
-                    chapter_title_match.group(1).strip()
-                    if chapter_title_match
-                    else "未知章节"
-                )
 
-                # 提取加密数据
-                data_match = re.findall("(?<=var DATA = ').*?(?=')", html)
-                if not data_match:
-                    return {"error": "未找到加密数据"}
+def begin_request_timing(route: str) -> Tuple:
+    """开始统计一个请求，返回交给 end_request_timing 的状态"""
+    return (
+        _request_route.set(route),
+        _request_timings.set({}),
+        time.perf_counter(),
+    )
 
-                data = data_match[0]
 
-                # 提取nonce
-                nonce_matches = re.findall('window\[".+?(?<=;)', html)
-                if len(nonce_matches) < 2:
-                    return {"error": "未找到nonce数据"}
+def end_request_timing(state: Tuple, status: int) -> str:
+    """
+    结束请求统计
 
-                nonce = "=".join(nonce_matches[1].split("=")[1:])[:-1]
-                ctx = MiniRacer()
-                nonce = ctx.eval(nonce)
+    Returns:
+        Server-Timing响应头的值
+    """
+    route_token, timings_token, start = state
+    total = time.perf_counter() - start
+    with _timings_lock:
+        timings = dict(_request_timings.get() or {})
+    request_duration.observe((_request_route.get(), str(status)), total)
+    _request_timings.reset(timings_token)
+    _request_route.reset(route_token)
 
-                # 解密数据
-                T = list(data)
-                N = re.findall("\d+[a-zA-Z]+", nonce)
-                jlen = len(N)
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
 
-                while jlen:
-                    jlen -= 1
-                    jlocate = int(re.findall("\d+", N[jlen])[0]) & 255
-                    jstr = re.sub("\d+", "", N[jlen])
-                    del T[jlocate : jlocate + len(jstr)]
 
-                T = "".join(T)
-                decoded_data = ComicParser.decode_base64_custom(T)
+def end_streamed_request_timing(state: Tuple, status: int):
+    """
+    流式响应在发出响应头时调用，代替 end_request_timing
 
-                try:
-                    chapter_data = json.loads(decoded_data)
-                    # 添加章节标题到返回数据中
-                    chapter_data["chapter_title"] = chapter_title
-
-                    result = {
-                        "success": True,
-                        "data": chapter_data,
-                        "chapter_url": chapter_url,
-                        "chapter_title": chapter_title,
-                    }
+    此时产出响应体的工作尚未开始，不生成Server-Timing；
+    返回在流结束时调用的函数，届时记录请求总耗时
+    """
+    route_token, timings_token, start = state
+    route = _request_route.get()
+    _request_timings.reset(timings_token)
+    _request_route.reset(route_token)
 
-                    result = modify_chapter_images_data(result)
-                    return result
-                except (UnicodeDecodeError, json.JSONDecodeError) as e:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        return {"error": f"数据解码失败: {str(e)}"}
-                    continue
+    def finish():
+        request_duration.observe((route, str(status)), time.perf_counter() - start)
 
-            except Exception as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    return {"error": f"解析失败: {str(e)}"}
+    return finish
 
-        return {"error": "达到最大重试次数"}
 
+def run_in_context(executor, func, *args):
+    """提交到线程池，任务中记录的阶段耗时仍计入当前请求"""
+    return executor.submit(contextvars.copy_context().run, func, *args)
 
-# 同时，在获取章节图片数据的部分，修改图片URL为代理URL
-def get_proxy_image_url(original_url, number=0):
-    """生成图片代理URL"""
-    from urllib.parse import quote
-    api_url = request.host_url.rstrip("/")
 
-    proxy_url = f"{api_url}/image/proxy?url={quote(original_url)}&{number}"
-    return proxy_url
+def stream_in_context(iterable):
+    """
+    在当前请求的上下文中迭代流式响应体
 
+    WSGI的流式响应体在 after_request 结束请求统计之后才迭代，
+    先复制上下文，使产出响应体时记录的阶段耗时仍计入当前路由
+    """
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
 
-# 在返回章节数据时，修改图片URL
-def modify_chapter_images_data(chapter_data):
-    """修改章节数据中的图片URL为代理URL"""
-    if chapter_data.get("success") and "data" in chapter_data:
-        pictures = chapter_data["data"].get("picture", [])
-        number = 0
-        for pic in pictures:
-            number += 1
-            if "url" in pic:
-                pic["original_url"] = pic["url"]  # 保留原始URL
-                pic["url"] = get_proxy_image_url(
-                    pic["url"], number=number
-                )  # 替换为代理URL
-    return chapter_data
+    def generate():
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
 
+    return generate()
 
-class ComicSearch:
-    def __init__(self):
-        self.base_url = "https://m.ac.qq.com"
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15E148 Safari/604.1",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "zh-CN,zh;q=0.9",
-        }
 
-    def _check_has_next(
-        self, keyword: str, current_page: int, current_count: int
-    ) -> bool:
-        """
-        检查是否有下一页
+class SQLiteCacheBackend:
+    """基于本地SQLite文件的缓存后端，同一实例内的多个进程可共享"""
 
-        Args:
-            keyword: 搜索关键词
-            current_page: 当前页码
-            current_count: 当前页结果数量
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.commit()
 
-        Returns:
-            是否有下一页
-        """
-        try:
-            # 直接请求下一页看看是否有内容
-            timestamp = int(time.time() * 1000)
-            params = {
-                "_t": timestamp,
-                "word": keyword,
-                "page": current_page + 1,
-                "pageSize": 10,
-                "style": "items",
-            }
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        value, expires = row
+        if expires <= time.time():
+            self.delete(key)
+            return None
+        return expires, json.loads(value)
 
-            url = f"{self.base_url}/search/result?{urlencode(params)}"
-            response = requests.get(url, headers=self.headers, timeout=5)
-            response.encoding = "utf-8"
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl),
+            )
+            self._conn.commit()
 
-            if response.status_code == 200:
-                next_results = self._parse_search_results(response.text)
-                return len(next_results) > 0
-            else:
-                return False
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
 
-        except:
-            # 如果请求失败，认为没有下一页
-            return False
 
-    def search_comics_direct(self, keyword: str, page: int = 1) -> Dict:
-        """
-        直接搜索漫画，返回API原始结果
+class RedisCacheBackend:
+    """Redis兼容的缓存后端（需要安装redis包）"""
 
-        Args:
-            keyword: 搜索关键词
-            page: 页码
+    def __init__(self, url: str):
+        import redis
 
-        Returns:
-            搜索结果的原始数据
-        """
-        try:
-            timestamp = int(time.time() * 1000)
-            params = {
-                "_t": timestamp,
-                "word": keyword,
-                "page": page,
-                "pageSize": 10,  # 可以适当调大一些
-                "style": "items",
-            }
+        self.client = redis.Redis.from_url(url)
 
-            url = f"{self.base_url}/search/result?{urlencode(params)}"
-            print(f"请求搜索URL: {url}")
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.pttl(key)
+        value, pttl = pipe.execute()
+        if value is None:
+            return None
+        expires = time.time() + (pttl / 1000.0 if pttl and pttl > 0 else 0)
+        return expires, json.loads(value)
 
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.encoding = "utf-8"
+    def set(self, key: str, value: Any, ttl: float):
+        self.client.set(
+            key, json.dumps(value, ensure_ascii=False), px=max(int(ttl * 1000), 1)
+        )
 
-            if response.status_code != 200:
-                return {
-                    "error": f"搜索请求失败，状态码: {response.status_code}",
-                    "keyword": keyword,
-                    "page": page,
-                    "results": [],
-                }
+    def delete(self, key: str):
+        self.client.delete(key)
 
-            # 解析结果
-            results = self._parse_search_results(response.text)
-            has_next = self._check_has_next(keyword, page, len(results))
 
-            return {
-                "keyword": keyword,
-                "page": page,
-                "total_results": len(results),
-                "results": results,
-                "has_more": has_next,  # 简单判断是否还有更多结果
-            }
+def create_cache_backend(url: str):
+    """根据配置创建缓存后端，失败时退回纯内存缓存"""
+    if not url:
+        return None
+    try:
+        if url.startswith("sqlite://"):
+            return SQLiteCacheBackend(url[len("sqlite://") :] or ":memory:")
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            return RedisCacheBackend(url)
+        logging.warning(f"不支持的缓存后端: {url}")
+    except Exception as e:
+        logging.warning(f"缓存后端初始化失败，使用内存缓存: {str(e)}")
+    return None
 
-        except Exception as e:
-            return {
-                "error": f"搜索异常: {str(e)}",
-                "keyword": keyword,
-                "page": page,
-                "results": [],
-            }
 
-    def _parse_search_results(self, html: str) -> List[Dict]:
-        """
-        解析搜索结果HTML
-        """
-        comics = []
-        comic_pattern = r'<li class="comic-item">(.*?)</li>'
-        comic_matches = re.findall(comic_pattern, html, re.DOTALL)
+class TTLCache:
+    """带过期时间和LRU淘汰的进程内缓存，可挂载共享后端"""
 
-        print(f"解析到 {len(comic_matches)} 个漫画条目")
+    def __init__(self, name: str, maxsize: int, ttl: float, backend=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
 
-        for comic_html in comic_matches:
-            comic = self._parse_single_comic(comic_html)
-            if comic:
-                comics.append(comic)
+    def _backend_key(self, key) -> str:
+        return f"qqcomic:{self.name}:{key}"
 
-        return comics
+    def _store(self, key, value, expires: float):
+        # 调用方需持有锁
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
 
-    def _parse_single_comic(self, comic_html: str) -> Optional[Dict]:
-        """
-        解析单个漫画信息
-        """
-        try:
-            # 提取漫画ID和链接
-            link_match = re.search(r'href="/comic/index/id/(\d+)"', comic_html)
-            if not link_match:
-                return None
+    def get(self, key):
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                # 过期条目保留到被LRU淘汰，上游不可用时可作为旧数据返回
 
-            comic_id = link_match.group(1)
+        if self.backend is not None:
+            try:
+                item = self.backend.get(self._backend_key(key))
+            except Exception as e:
+                logging.warning(f"读取缓存后端失败: {str(e)}")
+                item = None
+            if item is not None:
+                with self._lock:
+                    self._store(key, item[1], item[0])
+                    self.hits += 1
+                return item[1]
 
-            # 提取标题
-            title_match = re.search(
-                r'<strong class="comic-title">(.*?)</strong>', comic_html
-            )
-            title = title_match.group(1).strip() if title_match else "未知标题"
+        with self._lock:
+            self.misses += 1
+        return None
 
-            # 提取封面图片
-            cover_match = re.search(r'<img class="cover-image" src="(.*?)"', comic_html)
-            cover_url = cover_match.group(1) if cover_match else None
-            if cover_url and cover_url.startswith("//"):
-                cover_url = "https:" + cover_url
+    def get_stale(self, key):
+        """读取进程内的条目，即使已过期，用于上游请求失败时返回旧数据"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            self.stale_hits += 1
+            return item[1]
 
-            # 提取更新日期
-            update_match = re.search(
-                r'<small class="comic-update">(.*?)</small>', comic_html
-            )
-            update_date = update_match.group(1).strip() if update_match else "未知"
+    def set(self, key, value, ttl: Optional[float] = None):
+        """写入缓存"""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._store(key, value, time.time() + ttl)
+        if self.backend is not None:
+            try:
+                self.backend.set(self._backend_key(key), value, ttl)
+            except Exception as e:
+                logging.warning(f"写入缓存后端失败: {str(e)}")
 
-            # 提取标签
-            tag_match = re.search(r'<small class="comic-tag">(.*?)</small>', comic_html)
-            tags = tag_match.group(1).strip() if tag_match else ""
+    def delete(self, key):
+        """删除缓存"""
+        with self._lock:
+            self._data.pop(key, None)
+        if self.backend is not None:
+            try:
+                self.backend.delete(self._backend_key(key))
+            except Exception as e:
+                logging.warning(f"删除缓存后端失败: {str(e)}")
 
-            # 提取描述
-            desc_match = re.search(
-                r'<small class="comic-desc">(.*?)</small>', comic_html, re.DOTALL
-            )
-            description = desc_match.group(1).strip() if desc_match else ""
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._data.clear()
 
+    def stats(self) -> Dict:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
             return {
-                "comic_id": comic_id,
-                "title": title,
-                "cover_url": cover_url,
-                "update_date": update_date,
-                "tags": tags,
-                "description": description,
-                "detail_url": f"{self.base_url}/comic/index/id/{comic_id}",
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "stale_hits": self.stale_hits,
+                "backend": type(self.backend).__name__ if self.backend else None,
             }
 
-        except Exception as e:
-            print(f"解析漫画信息异常: {e}")
-            return None
 
+class ImageCache:
+    """处理后图片的两级缓存，内存LRU加按访问时间淘汰的磁盘目录"""
 
-# 全局搜索实例
-comic_searcher = ComicSearch()
+    # 磁盘文件开头记录原图字节数，用于统计节省的上游流量
+    _HEADER_SIZE = 8
 
+    def __init__(
+        self,
+        memory_bytes: int = Config.IMAGE_CACHE_MEMORY_BYTES,
+        cache_dir: str = Config.IMAGE_CACHE_DIR,
+        disk_bytes: int = Config.IMAGE_CACHE_DISK_BYTES,
+    ):
+        self.memory_bytes = memory_bytes
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        # key -> (图片数据, 原图字节数)
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_served = 0
+        self.upstream_bytes_saved = 0
 
-# Flask路由
-@app.get("/config")
-@app.get("/config/")
-def get_config():
-    """获取漫画源配置信息"""
-    api_url = request.host_url.rstrip("/")
-    config = {
-        "QQComic": {
-            "name": "腾讯动漫",
-            "apiUrl": api_url,
+    @staticmethod
+    def make_key(
+        url: str, width: int, quality: int, fmt: str, layout: str = "", index: int = 0
+    ) -> str:
+        """由原图地址和处理参数生成缓存键，分段图片另带分段方式和段序号"""
+        raw = f"{url}\n{width}\n{quality}\n{fmt}"
+        if layout:
+            raw += f"\n{layout}\n{index}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _remember(self, key: str, data: bytes, source_bytes: int):
+        # 调用方需持有锁
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old[0])
+        self._memory[key] = (data, source_bytes)
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _record_hit(self, data: bytes, source_bytes: int):
+        # 调用方需持有锁
+        self.bytes_served += len(data)
+        self.upstream_bytes_saved += source_bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self._record_hit(*item)
+                return item[0]
+
+        item = self._read_disk(key)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._record_hit(*item)
+            self._remember(key, *item)
+        return item[0]
+
+    def contains(self, key: str) -> bool:
+        """是否已缓存，不计入命中统计"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return bool(self.disk_bytes) and os.path.exists(self._disk_path(key))
+
+    def set(self, key: str, data: bytes, source_bytes: int = 0):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, data, source_bytes)
+        self._write_disk(key, data, source_bytes)
+
+    def mark_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, int]]:
+        if not self.disk_bytes:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            # 更新访问时间用于LRU淘汰
+            os.utime(path)
+        except OSError:
+            return None
+        if len(raw) < self._HEADER_SIZE:
+            return None
+        source_bytes = int.from_bytes(raw[: self._HEADER_SIZE], "big")
+        return raw[self._HEADER_SIZE :], source_bytes
+
+    def _write_disk(self, key: str, data: bytes, source_bytes: int):
+        if not self.disk_bytes or len(data) > self.disk_bytes:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(source_bytes.to_bytes(self._HEADER_SIZE, "big"))
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"写入图片磁盘缓存失败: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = self._scan_disk_usage()
+            else:
+                self._disk_used += len(data) + self._HEADER_SIZE
+            over_limit = self._disk_used > self.disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _list_disk_files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _scan_disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._list_disk_files())
+
+    def _evict_disk(self):
+        """删除最久未访问的文件，直到低于容量上限的90%"""
+        files = sorted(self._list_disk_files())
+        used = sum(size for _, size, _ in files)
+        target = self.disk_bytes * 0.9
+        for _, size, path in files:
+            if used <= target:
+                break
+            try:
+                os.remove(path)
+                used -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_used = used
+
+    def stats(self) -> Dict:
+        """命中率与节省的字节数"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "memory_limit": self.memory_bytes,
+                "disk_bytes": self._disk_used,
+                "disk_limit": self.disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_ratio": round(hits / total, 4) if total else 0.0,
+                "bytes_served": self.bytes_served,
+                "upstream_bytes_saved": self.upstream_bytes_saved,
+            }
+
+
+class SingleFlight:
+    """合并同一键的并发请求，只有第一个调用方执行，其余等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [完成事件, 结果, 异常]
+        self._calls = {}
+        # key -> asyncio.Future，只在事件循环线程中访问
+        self._async_calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args):
+        """执行 func(*args)，同一键已有调用在进行时等待其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = [threading.Event(), None, None]
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = func(*args)
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call[0].set()
+        return call[1]
+
+    async def do_async(self, key, func, *args):
+        """
+        do 的异步版本，func 为协程函数
+
+        同一键已有线程中的调用（例如后台预取）在进行时，也等待其结果
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+        if call is not None:
+            await asyncio.get_running_loop().run_in_executor(None, call[0].wait)
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        future = self._async_calls.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            # 等待方被取消时不影响正在执行的请求
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        with self._lock:
+            self.executed += 1
+        try:
+            result = await func(*args)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # 没有等待方时避免"exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            self._async_calls.pop(key, None)
+            if not future.done():
+                # 执行方被取消，等待方随之取消
+                future.cancel()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
+
+
+class ChapterIndex:
+    """
+    漫画章节索引，记录章节号对应的cid、标题和链接
+
+    持久化在本地SQLite中，进程内保留最近使用的漫画；
+    刷新时只写入有变化的章节
+    """
+
+    _CID_PATTERN = re.compile(r"/cid/(\d+)")
+
+    def __init__(
+        self,
+        path: str = Config.CHAPTER_INDEX_PATH,
+        ttl: float = Config.CHAPTER_INDEX_TTL,
+        memory_size: int = Config.CHAPTER_INDEX_MEMORY_SIZE,
+    ):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._lock = threading.Lock()
+        self.path = path or ":memory:"
+        # 首次读写时才打开数据库，不占用冷启动时间
+        self._db: Optional[sqlite3.Connection] = None
+        # comic_id -> (刷新时间, {章节号: 章节}, 按章节号排序的章节)
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.rows_written = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # 调用方需持有锁
+        if self._db is None:
+            self._db = self._connect(self.path)
+        return self._db
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_tables(conn)
+        except sqlite3.Error as e:
+            logging.warning(f"章节索引文件不可用，使用内存索引: {str(e)}")
+            path = ":memory:"
+            conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_tables(conn)
+        self.path = path
+        return conn
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS comics "
+            "(comic_id TEXT PRIMARY KEY, refreshed REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chapters "
+            "(comic_id TEXT NOT NULL, number INTEGER NOT NULL, cid TEXT NOT NULL, "
+            "title TEXT NOT NULL, link TEXT NOT NULL, PRIMARY KEY (comic_id, number))"
+        )
+        conn.commit()
+
+    def _remember(self, comic_id: str, refreshed: float, chapters: Dict[int, Dict]):
+        # 调用方需持有锁
+        ordered = [chapters[number] for number in sorted(chapters)]
+        self._memory[comic_id] = (refreshed, chapters, ordered)
+        self._memory.move_to_end(comic_id)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+        return self._memory[comic_id]
+
+    def _load(self, comic_id: str):
+        # 调用方需持有锁
+        entry = self._memory.get(comic_id)
+        if entry is not None:
+            self._memory.move_to_end(comic_id)
+            return entry
+
+        row = self._conn.execute(
+            "SELECT refreshed FROM comics WHERE comic_id = ?", (comic_id,)
+        ).fetchone()
+        if not row:
+            return None
+        chapters = {}
+        for number, cid, title, link in self._conn.execute(
+            "SELECT number, cid, title, link FROM chapters WHERE comic_id = ?",
+            (comic_id,),
+        ):
+            chapters[number] = {
+                "number": number,
+                "cid": cid,
+                "title": title,
+                "link": link,
+            }
+        return self._remember(comic_id, row[0], chapters)
+
+    def lookup(self, comic_id: str) -> Optional[Tuple[float, Dict[int, Dict], List]]:
+        """
+        读取漫画的章节索引
+
+        Returns:
+            (刷新时间, {章节号: 章节}, 按章节号排序的章节)，未建立索引返回None
+        """
+        with self._lock:
+            entry = self._load(comic_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def is_stale(self, entry) -> bool:
+        return time.time() - entry[0] > self.ttl
+
+    def update(self, comic_id: str, chapters: List[Dict]) -> Tuple:
+        """
+        用详情页解析出的章节列表更新索引
+
+        Args:
+            comic_id: 漫画ID
+            chapters: parse_comic_info 返回的章节列表
+
+        Returns:
+            更新后的索引，格式同 lookup
+        """
+        rows = {}
+        for chapter in chapters:
+            cid_match = self._CID_PATTERN.search(chapter["link"])
+            rows[chapter["number"]] = {
+                "number": chapter["number"],
+                "cid": cid_match.group(1) if cid_match else "",
+                "title": chapter["title"],
+                "link": chapter["link"],
+            }
+
+        now = time.time()
+        with self._lock:
+            entry = self._load(comic_id)
+            old = entry[1] if entry else {}
+            changed = [row for number, row in rows.items() if old.get(number) != row]
+            removed = [(comic_id, number) for number in old if number not in rows]
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chapters "
+                    "(comic_id, number, cid, title, link) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (comic_id, row["number"], row["cid"], row["title"], row["link"])
+                        for row in changed
+                    ],
+                )
+                self._conn.executemany(
+                    "DELETE FROM chapters WHERE comic_id = ? AND number = ?", removed
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO comics (comic_id, refreshed) VALUES (?, ?)",
+                    (comic_id, now),
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logging.warning(f"写入章节索引失败: {str(e)}")
+            self.refreshes += 1
+            self.rows_written += len(changed) + len(removed)
+            return self._remember(comic_id, now, rows)
+
+    def touch(self, comic_id: str) -> Optional[Tuple]:
+        """
+        章节未变化时只更新刷新时间
+
+        Returns:
+            更新后的索引，尚未建立索引时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._load(comic_id)
+            if entry is None:
+                return None
+            try:
+                self._conn.execute(
+                    "UPDATE comics SET refreshed = ? WHERE comic_id = ?",
+                    (now, comic_id),
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logging.warning(f"写入章节索引失败: {str(e)}")
+            self.refreshes += 1
+            self._memory[comic_id] = (now, entry[1], entry[2])
+            return self._memory[comic_id]
+
+    def stats(self) -> Dict:
+        """索引命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "path": self.path,
+                "memory_comics": len(self._memory),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "refreshes": self.refreshes,
+                "rows_written": self.rows_written,
+            }
+
+
+class SearchIndex:
+    """
+    本地搜索索引，记录搜索结果和详情页中见过的漫画
+
+    标题和标签按相邻两字建立倒排表，持久化在本地SQLite中；
+    查询时先取包含全部二元组的漫画，再核对子串并排序
+    """
+
+    FIELDS = ("title", "tags", "description", "cover_url", "update_date")
+
+    def __init__(self, path: str = Config.SEARCH_INDEX_PATH):
+        self._lock = threading.Lock()
+        self.path = path or ":memory:"
+        # 首次读写时才打开数据库
+        self._db: Optional[sqlite3.Connection] = None
+        self.queries = 0
+        self.fallbacks = 0
+        self.comics_written = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # 调用方需持有锁
+        if self._db is None:
+            self._db = self._connect(self.path)
+        return self._db
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_tables(conn)
+        except sqlite3.Error as e:
+            logging.warning(f"搜索索引文件不可用，使用内存索引: {str(e)}")
+            path = ":memory:"
+            conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_tables(conn)
+        self.path = path
+        return conn
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS comics "
+            "(comic_id TEXT PRIMARY KEY, title TEXT NOT NULL, tags TEXT NOT NULL, "
+            "description TEXT NOT NULL, cover_url TEXT NOT NULL, "
+            "update_date TEXT NOT NULL, folded TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS grams (gram TEXT NOT NULL, "
+            "comic_id TEXT NOT NULL, PRIMARY KEY (gram, comic_id)) WITHOUT ROWID"
+        )
+        conn.commit()
+
+    @staticmethod
+    def fold(text: str) -> str:
+        """全角转半角并忽略大小写"""
+        return unicodedata.normalize("NFKC", text).casefold()
+
+    @staticmethod
+    def _grams(text: str) -> set:
+        """按空白切分后取相邻两字，单字的词没有二元组"""
+        return {word[i : i + 2] for word in text.split() for i in range(len(word) - 1)}
+
+    def add(self, comics: List[Dict]):
+        """
+        写入搜索结果或详情页中的漫画
+
+        Args:
+            comics: 含comic_id的漫画列表，字段与 _parse_search_results 相同，
+                为空的字段保留索引中的旧值
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                for comic in comics:
+                    comic_id = str(comic.get("comic_id") or "")
+                    if not comic_id:
+                        continue
+                    row = self._conn.execute(
+                        "SELECT title, tags, description, cover_url, update_date, "
+                        "folded FROM comics WHERE comic_id = ?",
+                        (comic_id,),
+                    ).fetchone()
+                    old = dict(zip(self.FIELDS, row)) if row else {}
+                    new = {
+                        field: str(comic.get(field) or "") or old.get(field, "")
+                        for field in self.FIELDS
+                    }
+                    if new == old:
+                        continue
+                    folded = self.fold(f"{new['title']}\n{new['tags']}")
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO comics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (comic_id, *(new[field] for field in self.FIELDS), folded, now),
+                    )
+                    # 只增删有变化的二元组
+                    grams = self._grams(folded)
+                    old_grams = self._grams(row[-1]) if row else set()
+                    self._conn.executemany(
+                        "DELETE FROM grams WHERE gram = ? AND comic_id = ?",
+                        [(gram, comic_id) for gram in old_grams - grams],
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO grams (gram, comic_id) VALUES (?, ?)",
+                        [(gram, comic_id) for gram in grams - old_grams],
+                    )
+                    self.comics_written += 1
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logging.warning(f"写入搜索索引失败: {str(e)}")
+
+    def _match(self, terms: List[str]) -> List[Tuple]:
+        # 调用方需持有锁
+        columns = "comic_id, title, tags, description, cover_url, update_date, folded"
+        grams = set().union(*(self._grams(term) for term in terms))
+        if grams:
+            placeholders = ",".join("?" * len(grams))
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM comics WHERE comic_id IN "
+                f"(SELECT comic_id FROM grams WHERE gram IN ({placeholders}) "
+                "GROUP BY comic_id HAVING COUNT(*) = ?)",
+                (*grams, len(grams)),
+            )
+        else:
+            # 查询只有单字时没有二元组，逐条比较子串
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM comics WHERE instr(folded, ?) > 0",
+                (terms[0],),
+            )
+        # 二元组都出现不代表连续出现，再核对子串
+        return [row for row in rows if all(term in row[-1] for term in terms)]
+
+    def search(
+        self, keyword: str, page: int = 1, page_size: int = Config.SEARCH_PAGE_SIZE
+    ) -> Dict:
+        """
+        在本地索引中搜索，标题完全相同、前缀相同、包含关键词的依次靠前
+
+        Returns:
+            与 search_comics_direct 格式相同的结果，另含匹配总数 total_matches
+        """
+        terms = self.fold(keyword).split()
+        with self._lock:
+            self.queries += 1
+            rows = self._match(terms) if terms else []
+
+        query = " ".join(terms)
+
+        def rank(row) -> Tuple:
+            title = self.fold(row[1])
+            if title == query:
+                order = 0
+            elif title.startswith(query):
+                order = 1
+            elif all(term in title for term in terms):
+                order = 2
+            else:
+                order = 3
+            return order, len(title), row[0]
+
+        rows.sort(key=rank)
+        start = (page - 1) * page_size
+        results = [
+            {
+                "comic_id": row[0],
+                "title": row[1],
+                "cover_url": row[4] or None,
+                "update_date": row[5] or "未知",
+                "tags": row[2],
+                "description": row[3],
+                "detail_url": f"{Config.M_AC_BASE_URL}/comic/index/id/{row[0]}",
+            }
+            for row in rows[start : start + page_size]
+        ]
+        return {
+            "keyword": keyword,
+            "page": page,
+            "total_results": len(results),
+            "results": results,
+            "has_more": len(rows) > start + page_size,
+            "total_matches": len(rows),
+        }
+
+    def count_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def stats(self) -> Dict:
+        """索引规模和查询统计"""
+        with self._lock:
+            try:
+                comics = self._conn.execute("SELECT COUNT(*) FROM comics").fetchone()[0]
+            except sqlite3.Error:
+                comics = 0
+            return {
+                "path": self.path,
+                "comics": comics,
+                "queries": self.queries,
+                "fallbacks": self.fallbacks,
+                "comics_written": self.comics_written,
+            }
+
+
+class QueryCounter:
+    """
+    按查询统计请求次数和命中次数
+
+    记录的查询超过上限时，只保留请求次数最多的一半
+    """
+
+    def __init__(self, maxsize: int = Config.SEARCH_QUERY_STATS_SIZE):
+        self.maxsize = maxsize
+        # 查询 -> [请求次数, 命中次数]
+        self._counts: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, query: str, hit: bool):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            counts = self._counts.setdefault(query, [0, 0])
+            counts[0] += 1
+            if hit:
+                counts[1] += 1
+            if len(self._counts) > self.maxsize:
+                kept = sorted(self._counts.items(), key=lambda item: -item[1][0])
+                self._counts = dict(kept[: self.maxsize // 2])
+
+    def top(self, n: int) -> List[Dict]:
+        """请求次数最多的n个查询"""
+        with self._lock:
+            items = sorted(self._counts.items(), key=lambda item: -item[1][0])[:n]
+        return [
+            {"query": query, "requests": requests, "hits": hits}
+            for query, (requests, hits) in items
+        ]
+
+
+def page_validators(resp) -> Dict:
+    """记录上游响应的ETag、Last-Modified和响应体摘要，用于之后的条件请求"""
+    return {
+        "etag": resp.headers.get("ETag", ""),
+        "last_modified": resp.headers.get("Last-Modified", ""),
+        "hash": hashlib.sha256(resp.content).hexdigest(),
+    }
+
+
+def conditional_headers(headers: Dict, validators: Optional[Dict]) -> Dict:
+    """在请求头中加入If-None-Match和If-Modified-Since"""
+    if not validators:
+        return headers
+    headers = dict(headers)
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def upstream_hosts() -> set:
+    """已知的上游主机：详情页、移动版页面和图片主机"""
+    return {
+        urlsplit(Config.AC_BASE_URL).netloc.lower(),
+        urlsplit(Config.M_AC_BASE_URL).netloc.lower(),
+        *Config.IMAGE_HOSTS,
+    }
+
+
+def upstream_pool_key(host: str) -> str:
+    """连接池和请求计数按主机区分，已知上游以外的主机共用other，避免无限增长"""
+    return host if host.lower() in upstream_hosts() else "other"
+
+
+class UpstreamUnavailableError(Exception):
+    """熔断中或需要等待太久，未请求上游"""
+
+    def __init__(self, host: str, reason: str, retry_after: float):
+        self.host = host
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(
+            f"上游 {host} 暂不可用（{reason}），{retry_after:.1f} 秒后重试"
+        )
+
+
+class UpstreamGovernor:
+    """
+    同步与异步上游客户端共享的限流、退避重试和熔断状态，按主机区分
+
+    令牌桶限制请求速率，上游返回Retry-After时暂停该主机；
+    连续失败达到阈值后熔断，冷却期内直接失败，冷却结束后放行一个探测请求，
+    探测成功则恢复，失败则继续熔断
+    """
+
+    # 视为上游过载的状态码，计入熔断并重试
+    RETRY_STATUSES = (429, 502, 503, 504)
+    BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+    # 已知上游以外最多保留状态的主机数，超过时淘汰最久未请求的
+    MAX_HOSTS = 256
+
+    def __init__(
+        self,
+        rate: float = Config.UPSTREAM_RATE_LIMIT,
+        burst: int = Config.UPSTREAM_RATE_BURST,
+        max_wait: float = Config.UPSTREAM_MAX_WAIT,
+        retries: int = Config.UPSTREAM_RETRIES,
+        backoff_base: float = Config.UPSTREAM_BACKOFF_BASE,
+        backoff_max: float = Config.UPSTREAM_BACKOFF_MAX,
+        breaker_threshold: int = Config.UPSTREAM_BREAKER_THRESHOLD,
+        breaker_cooldown: float = Config.UPSTREAM_BREAKER_COOLDOWN,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._hosts: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> Dict:
+        # 调用方需持有锁
+        state = self._hosts.get(host)
+        if state is not None:
+            self._hosts.move_to_end(host)
+        else:
+            self._evict()
+            state = self._hosts[host] = {
+                "tokens": float(self.burst),
+                "updated": time.monotonic(),
+                "paused_until": 0.0,
+                "breaker": "closed",
+                "opened_at": 0.0,
+                "failures": 0,
+                "requests": 0,
+                "retries": 0,
+                "throttled": 0,
+                "rejected": 0,
+                "opened": 0,
+            }
+        return state
+
+    def _evict(self):
+        # 调用方需持有锁；图片代理的主机来自请求参数，已知上游不淘汰
+        known = upstream_hosts()
+        others = [host for host in self._hosts if host.lower() not in known]
+        for host in others[: max(0, len(others) - self.MAX_HOSTS + 1)]:
+            del self._hosts[host]
+
+    def acquire(self, host: str) -> float:
+        """
+        申请一次请求配额
+
+        Returns:
+            发送请求前需要等待的秒数
+
+        Raises:
+            UpstreamUnavailableError: 熔断中，或需要等待的时间超过上限
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(host)
+            if state["breaker"] != "closed":
+                # 半开状态下opened_at为探测开始的时间，探测超过冷却时间仍未
+                # 记录结果时视为失败，放行新的探测，避免一直停留在半开状态
+                remaining = state["opened_at"] + self.breaker_cooldown - now
+                if remaining > 0:
+                    state["rejected"] += 1
+                    raise UpstreamUnavailableError(host, "熔断中", max(remaining, 1.0))
+                state["breaker"] = "half_open"
+                state["opened_at"] = now
+
+            wait = max(0.0, state["paused_until"] - now)
+            if self.rate > 0:
+                state["tokens"] = min(
+                    self.burst, state["tokens"] + (now - state["updated"]) * self.rate
+                )
+                state["updated"] = now
+                if state["tokens"] < 1:
+                    wait = max(wait, (1 - state["tokens"]) / self.rate)
+            if wait > self.max_wait:
+                state["rejected"] += 1
+                if state["breaker"] == "half_open":
+                    # 探测请求没有发出，下一个请求可以立即探测
+                    state["breaker"] = "open"
+                    state["opened_at"] = now - self.breaker_cooldown
+                raise UpstreamUnavailableError(host, "限流", wait)
+
+            if self.rate > 0:
+                # 令牌可以预支为负数，后来的请求排在后面
+                state["tokens"] -= 1
+            if wait > 0:
+                state["throttled"] += 1
+            state["requests"] += 1
+            return wait
+
+    def record(self, host: str, ok: bool, retry_after: float = 0.0):
+        """
+        记录一次请求的结果
+
+        Args:
+            host: 上游主机
+            ok: 是否成功，连接失败、超时和 RETRY_STATUSES 视为失败
+            retry_after: 上游要求暂停的秒数
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(host)
+            if retry_after > 0:
+                state["paused_until"] = max(state["paused_until"], now + retry_after)
+            if ok:
+                state["failures"] = 0
+                state["breaker"] = "closed"
+                return
+            state["failures"] += 1
+            if self.breaker_threshold > 0 and (
+                state["breaker"] == "half_open"
+                or state["failures"] >= self.breaker_threshold
+            ):
+                if state["breaker"] != "open":
+                    state["opened"] += 1
+                    logging.warning(
+                        f"上游 {host} 连续失败 {state['failures']} 次，熔断"
+                    )
+                state["breaker"] = "open"
+                state["opened_at"] = now
+
+    def abandon(self, host: str):
+        """
+        请求被取消或出现非HTTP异常、没有得到上游结果时调用
+
+        探测请求按失败处理，重新熔断；其他请求不计入失败次数
+        """
+        with self._lock:
+            state = self._state(host)
+            if state["breaker"] == "half_open":
+                state["breaker"] = "open"
+                state["opened_at"] = time.monotonic()
+
+    def backoff(self, host: str, attempt: int, retry_after: float = 0.0):
+        """
+        第attempt次失败后重试前的等待秒数
+
+        Returns:
+            指数退避加全抖动，不低于上游的Retry-After；不应再重试时返回None
+        """
+        if attempt >= self.retries:
+            return None
+        delay = max(self.backoff_delay(attempt), retry_after)
+        if delay > self.max_wait:
+            return None
+        with self._lock:
+            self._state(host)["retries"] += 1
+        return delay
+
+    def backoff_delay(self, attempt: int) -> float:
+        """指数退避加全抖动：在0到 base*2^attempt（不超过上限）之间随机取值"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    @staticmethod
+    def retry_after(headers) -> float:
+        """读取以秒表示的Retry-After，缺失或为日期格式时返回0"""
+        value = (headers.get("Retry-After") or "").strip()
+        return float(value) if value.isdigit() else 0.0
+
+    def stats(self) -> Dict:
+        """各主机的熔断状态和限流、重试计数"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "rate_limit": self.rate,
+                "burst": self.burst,
+                "max_wait": self.max_wait,
+                "retries": self.retries,
+                "breaker_threshold": self.breaker_threshold,
+                "breaker_cooldown": self.breaker_cooldown,
+                "hosts": {
+                    host: {
+                        "breaker": state["breaker"],
+                        "failures": state["failures"],
+                        "paused_for": round(max(0.0, state["paused_until"] - now), 3),
+                        **{
+                            key: state[key]
+                            for key in (
+                                "requests",
+                                "retries",
+                                "throttled",
+                                "rejected",
+                                "opened",
+                            )
+                        },
+                    }
+                    for host, state in self._hosts.items()
+                },
+            }
+
+
+# 全局上游调控器，同步与异步客户端共用
+upstream_governor = UpstreamGovernor()
+
+
+class UpstreamClient:
+    """
+    共享的上游HTTP客户端，每个已知上游主机一个保持长连接的连接池，
+    其他主机共用一个连接池
+    """
+
+    def __init__(
+        self,
+        pool_size: int = Config.UPSTREAM_POOL_SIZE,
+        connect_timeout: float = Config.UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout: float = Config.UPSTREAM_READ_TIMEOUT,
+        governor: UpstreamGovernor = upstream_governor,
+    ):
+        self.governor = governor
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._sessions: Dict[str, "requests.Session"] = {}
+        self._requests: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, pool: str) -> "requests.Session":
+        with self._lock:
+            session = self._sessions.get(pool)
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                # 共用的连接池最多保留 pool_size 个主机的连接
+                adapter = HTTPAdapter(
+                    pool_connections=1 if pool != "other" else self.pool_size,
+                    pool_maxsize=self.pool_size,
+                    max_retries=0,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[pool] = session
+            return session
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> "requests.Response":
+        """
+        发起GET请求，经过限流和熔断，连接失败或上游过载时退避重试
+
+        Args:
+            url: 请求地址
+            headers: 请求头
+            timeout: 读取超时，默认使用配置值
+
+        Returns:
+            requests的响应对象，重试用尽时为最后一次的响应
+
+        Raises:
+            UpstreamUnavailableError: 熔断中或需要等待太久
+        """
+        import requests
+
+        host = urlsplit(url).netloc
+        pool = upstream_pool_key(host)
+        read_timeout = self.read_timeout if timeout is None else timeout
+        attempt = 0
+        while True:
+            wait = self.governor.acquire(host)
+            try:
+                if wait:
+                    with timed("throttle"):
+                        time.sleep(wait)
+                with self._lock:
+                    self._requests[pool] = self._requests.get(pool, 0) + 1
+                with timed("upstream"):
+                    resp = self._session(pool).get(
+                        url,
+                        headers=headers,
+                        timeout=(self.connect_timeout, read_timeout),
+                        **kwargs,
+                    )
+            except requests.RequestException as e:
+                with self._lock:
+                    self._errors[pool] = self._errors.get(pool, 0) + 1
+                self.governor.record(host, False)
+                # 读取超时不重试，避免请求耗时成倍增加
+                if not isinstance(e, requests.ConnectionError):
+                    raise
+                delay = self.governor.backoff(host, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                # 结果未知，不能让探测请求一直占着半开状态
+                self.governor.abandon(host)
+                raise
+            else:
+                if resp.status_code not in UpstreamGovernor.RETRY_STATUSES:
+                    self.governor.record(host, True)
+                    return resp
+                retry_after = UpstreamGovernor.retry_after(resp.headers)
+                self.governor.record(host, False, retry_after)
+                delay = self.governor.backoff(host, attempt, retry_after)
+                if delay is None:
+                    return resp
+                resp.close()
+            with timed("backoff"):
+                time.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        """各主机的请求数和连接池状态"""
+        with self._lock:
+            sessions = dict(self._sessions)
+            result = {
+                "pool_size": self.pool_size,
+                "connect_timeout": self.connect_timeout,
+                "read_timeout": self.read_timeout,
+                "hosts": {},
+            }
+            for host in sessions:
+                result["hosts"][host] = {
+                    "requests": self._requests.get(host, 0),
+                    "errors": self._errors.get(host, 0),
+                    "connections_opened": 0,
+                    "idle_connections": 0,
+                }
+
+        for host, session in sessions.items():
+            pools = session.get_adapter("https://").poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                result["hosts"][host]["connections_opened"] += pool.num_connections
+                # 队列中未建立的连接以None占位
+                result["hosts"][host]["idle_connections"] += sum(
+                    1 for conn in list(pool.pool.queue) if conn is not None
+                )
+        return result
+
+
+# 全局上游客户端
+upstream = UpstreamClient()
+
+
+class AsyncUpstreamClient:
+    """异步上游HTTP客户端，供原生ASGI入口使用"""
+
+    def __init__(
+        self,
+        max_connections: int = Config.ASYNC_UPSTREAM_MAX_CONNECTIONS,
+        keepalive_connections: int = Config.UPSTREAM_POOL_SIZE,
+        connect_timeout: float = Config.UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout: float = Config.UPSTREAM_READ_TIMEOUT,
+        governor: UpstreamGovernor = upstream_governor,
+    ):
+        self.governor = governor
+        self.max_connections = max_connections
+        self.keepalive_connections = keepalive_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._loop = None
+        self._requests: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        import httpx
+
+        # httpx的客户端绑定事件循环，循环变化时重新创建
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.keepalive_connections,
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+            self._loop = loop
+        return self._client
+
+    def _timeout(self, timeout: Optional[float]) -> "httpx.Timeout":
+        import httpx
+
+        read_timeout = self.read_timeout if timeout is None else timeout
+        return httpx.Timeout(read_timeout, connect=self.connect_timeout)
+
+    def _count(self, url: str, counter: Dict[str, int]):
+        pool = upstream_pool_key(urlsplit(url).netloc)
+        counter[pool] = counter.get(pool, 0) + 1
+
+    async def _send(
+        self, url: str, headers: Optional[Dict], timeout: Optional[float], stream: bool
+    ) -> "httpx.Response":
+        """发起GET请求，限流、熔断和重试规则与 UpstreamClient.get 相同"""
+        import httpx
+
+        host = urlsplit(url).netloc
+        client = self._get_client()
+        attempt = 0
+        while True:
+            wait = self.governor.acquire(host)
+            try:
+                if wait:
+                    with timed("throttle"):
+                        await asyncio.sleep(wait)
+                self._count(url, self._requests)
+                with timed("upstream"):
+                    request = client.build_request(
+                        "GET", url, headers=headers, timeout=self._timeout(timeout)
+                    )
+                    resp = await client.send(request, stream=stream)
+            except httpx.HTTPError as e:
+                self._count(url, self._errors)
+                self.governor.record(host, False)
+                # 读取超时不重试，避免请求耗时成倍增加
+                retryable = (
+                    httpx.ConnectError,
+                    httpx.ConnectTimeout,
+                    httpx.RemoteProtocolError,
+                )
+                if not isinstance(e, retryable):
+                    raise
+                delay = self.governor.backoff(host, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                # 结果未知，不能让探测请求一直占着半开状态
+                self.governor.abandon(host)
+                raise
+            else:
+                if resp.status_code not in UpstreamGovernor.RETRY_STATUSES:
+                    self.governor.record(host, True)
+                    return resp
+                retry_after = UpstreamGovernor.retry_after(resp.headers)
+                self.governor.record(host, False, retry_after)
+                delay = self.governor.backoff(host, attempt, retry_after)
+                if delay is None:
+                    return resp
+                await resp.aclose()
+            with timed("backoff"):
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get(
+        self, url: str, headers: Optional[Dict] = None, timeout: Optional[float] = None
+    ) -> "httpx.Response":
+        """发起GET请求，读取完整响应"""
+        return await self._send(url, headers, timeout, stream=False)
+
+    @asynccontextmanager
+    async def stream(
+        self, url: str, headers: Optional[Dict] = None, timeout: Optional[float] = None
+    ):
+        """发起流式GET请求，返回异步上下文管理器"""
+        resp = await self._send(url, headers, timeout, stream=True)
+        try:
+            yield resp
+        finally:
+            await resp.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict:
+        """各主机的请求数"""
+        return {
+            "max_connections": self.max_connections,
+            "hosts": {
+                host: {"requests": count, "errors": self._errors.get(host, 0)}
+                for host, count in self._requests.items()
+            },
+        }
+
+
+async_upstream = AsyncUpstreamClient()
+cpu_executor = ThreadPoolExecutor(
+    max_workers=Config.CPU_WORKERS, thread_name_prefix="qqcomic-cpu"
+)
+
+
+async def run_cpu_bound(func, *args):
+    """在线程池中执行CPU密集的同步函数，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    # 复制上下文，使线程中记录的阶段耗时计入当前请求
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        cpu_executor, functools.partial(context.run, func, *args)
+    )
+
+
+class JSContextPool:
+    """线程安全的V8上下文池，按执行次数和堆内存回收上下文"""
+
+    def __init__(
+        self,
+        size: int = Config.JS_POOL_SIZE,
+        max_evals: int = Config.JS_CONTEXT_MAX_EVALS,
+        max_heap: int = Config.JS_CONTEXT_MAX_HEAP,
+        timeout_ms: int = Config.JS_EVAL_TIMEOUT_MS,
+    ):
+        self.size = size
+        self.max_evals = max_evals
+        self.max_heap = max_heap
+        self.timeout_ms = timeout_ms
+        # 空闲上下文，元素为 [MiniRacer, 已执行次数]
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.recycled = 0
+        self.evals = 0
+
+    def _acquire(self) -> list:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.created += 1
+            # V8在首次解码章节时才初始化
+            from py_mini_racer import MiniRacer
+
+            return [MiniRacer(), 0]
+
+    def _should_recycle(self, entry: list) -> bool:
+        if entry[1] >= self.max_evals:
+            return True
+        try:
+            heap = entry[0].heap_stats().get("used_heap_size", 0)
+        except Exception:
+            return True
+        return heap > self.max_heap
+
+    def eval(self, code: str):
+        """在池中的上下文里执行JS表达式"""
+        if not self._slots.acquire(timeout=self.timeout_ms / 1000.0 * 5):
+            raise TimeoutError("等待V8上下文超时")
+        entry = None
+        healthy = False
+        try:
+            entry = self._acquire()
+            result = entry[0].eval(code, timeout=self.timeout_ms)
+            healthy = True
+            return result
+        finally:
+            with self._lock:
+                self.evals += 1
+            if entry is not None:
+                entry[1] += 1
+                # 执行出错的上下文状态不可信，直接丢弃
+                if healthy and not self._should_recycle(entry):
+                    self._idle.put(entry)
+                else:
+                    with self._lock:
+                        self.recycled += 1
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        """上下文池统计"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "created": self.created,
+                "recycled": self.recycled,
+                "evals": self.evals,
+            }
+
+
+class _UnsupportedExpression(Exception):
+    """纯Python无法求值的表达式"""
+
+
+# 字符串字面量、数字、加号和括号
+_NONCE_TOKEN_PATTERN = re.compile(
+    r"""\s*(?:(?P<str>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')|(?P<num>0|[1-9]\d*)|(?P<op>[+()]))"""
+)
+_JS_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "b": "\b",
+    "f": "\f",
+    "v": "\v",
+    "0": "\0",
+}
+# 超过2**53的整数在JS中不能精确表示，交给V8
+_JS_MAX_SAFE_NUMBER = 2**53
+
+
+def _unescape_js_string(literal: str) -> str:
+    body = literal[1:-1]
+    if "\\" not in body:
+        return body
+    chars = []
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c != "\\":
+            chars.append(c)
+            i += 1
+            continue
+        nxt = body[i + 1]
+        if nxt in "xu":
+            # \xHH 与 \uHHHH
+            width = 2 if nxt == "x" else 4
+            hex_digits = body[i + 2 : i + 2 + width]
+            if not re.fullmatch(f"[0-9a-fA-F]{{{width}}}", hex_digits):
+                raise _UnsupportedExpression(literal)
+            code = int(hex_digits, 16)
+            # 代理对在V8中会合并为一个字符
+            if 0xD800 <= code <= 0xDFFF:
+                raise _UnsupportedExpression(literal)
+            chars.append(chr(code))
+            i += 2 + width
+            continue
+        # 旧式八进制转义 \1 到 \7、\0 后跟数字
+        if nxt in "1234567" or (nxt == "0" and body[i + 2 : i + 3].isdigit()):
+            raise _UnsupportedExpression(literal)
+        chars.append(_JS_ESCAPES.get(nxt, nxt))
+        i += 2
+    return "".join(chars)
+
+
+def _eval_simple_js(expr: str) -> str:
+    """
+    纯Python求值只由字符串、整数、加号和括号组成的表达式
+
+    按JS的左结合语义处理加法：数字相加，遇到字符串后拼接。
+    其他形式，以及八进制转义、代理对和超过2**53的整数等
+    与V8结果可能不同的情况，抛出 _UnsupportedExpression
+    """
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = _NONCE_TOKEN_PATTERN.match(expr, pos)
+        if not match:
+            raise _UnsupportedExpression(expr)
+        if match.group("str") is not None:
+            tokens.append(("value", _unescape_js_string(match.group("str"))))
+        elif match.group("num") is not None:
+            number = int(match.group("num"))
+            if number > _JS_MAX_SAFE_NUMBER:
+                raise _UnsupportedExpression(expr)
+            tokens.append(("value", number))
+        else:
+            tokens.append((match.group("op"), None))
+        pos = match.end()
+        while pos < len(expr) and expr[pos].isspace():
+            pos += 1
+
+    index = 0
+
+    def parse_sum():
+        nonlocal index
+        left = parse_atom()
+        while index < len(tokens) and tokens[index][0] == "+":
+            index += 1
+            right = parse_atom()
+            if isinstance(left, str) or isinstance(right, str):
+                left = _js_to_string(left) + _js_to_string(right)
+            else:
+                left = left + right
+                if left > _JS_MAX_SAFE_NUMBER:
+                    raise _UnsupportedExpression(expr)
+        return left
+
+    def parse_atom():
+        nonlocal index
+        if index >= len(tokens):
+            raise _UnsupportedExpression(expr)
+        kind, value = tokens[index]
+        index += 1
+        if kind == "value":
+            return value
+        if kind == "(":
+            value = parse_sum()
+            if index >= len(tokens) or tokens[index][0] != ")":
+                raise _UnsupportedExpression(expr)
+            index += 1
+            return value
+        raise _UnsupportedExpression(expr)
+
+    result = parse_sum()
+    if index != len(tokens):
+        raise _UnsupportedExpression(expr)
+    return _js_to_string(result)
+
+
+def _js_to_string(value) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def evaluate_nonce(expr: str) -> str:
+    """求值nonce表达式，常见形式走纯Python，其他交给V8"""
+    try:
+        result = _eval_simple_js(expr)
+        with _nonce_stats_lock:
+            nonce_stats["fast_path"] += 1
+        return result
+    except _UnsupportedExpression:
+        pass
+    except Exception as e:
+        logging.warning(f"nonce快速求值失败，改用V8: {str(e)}")
+    with _nonce_stats_lock:
+        nonce_stats["v8"] += 1
+    return str(js_pool.eval(expr))
+
+
+# 全局V8上下文池，首次使用时才创建上下文
+js_pool = JSContextPool()
+nonce_stats = {"fast_path": 0, "v8": 0}
+_nonce_stats_lock = threading.Lock()
+
+cache_backend = create_cache_backend(Config.CACHE_BACKEND)
+# 缓存条目为 {"info": 解析结果, "fetched": 验证时间, etag, last_modified, hash}，
+# 超过 COMIC_INFO_CACHE_TTL 后仍保留 COMIC_INFO_STALE_TTL，期间先返回旧结果再后台验证
+comic_info_cache = TTLCache(
+    "comic_info",
+    maxsize=Config.COMIC_INFO_CACHE_SIZE,
+    ttl=Config.COMIC_INFO_CACHE_TTL + Config.COMIC_INFO_STALE_TTL,
+    backend=cache_backend,
+)
+comic_info_revalidation = {
+    "stale_served": 0,
+    "not_modified": 0,
+    "unchanged": 0,
+    "changed": 0,
+}
+_revalidation_lock = threading.Lock()
+image_cache = ImageCache()
+chapter_images_cache = TTLCache(
+    "chapter_images",
+    maxsize=Config.CHAPTER_IMAGES_CACHE_SIZE,
+    ttl=Config.CHAPTER_IMAGES_CACHE_TTL,
+    backend=cache_backend,
+)
+chapter_images_flight = SingleFlight()
+chapter_index_flight = SingleFlight()
+chapter_index = ChapterIndex()
+search_index = SearchIndex()
+# 搜索结果页只在进程内短暂缓存
+search_page_cache = TTLCache(
+    "search_page",
+    maxsize=Config.SEARCH_PAGE_CACHE_SIZE,
+    ttl=Config.SEARCH_PAGE_CACHE_TTL,
+)
+# 键为（规范化关键词，页码），值为 search_comics_direct 的结果
+search_result_cache = TTLCache(
+    "search_result",
+    maxsize=Config.SEARCH_RESULT_CACHE_SIZE,
+    ttl=Config.SEARCH_RESULT_CACHE_TTL,
+)
+search_query_stats = QueryCounter()
+
+
+_BASE64_KEY_STR = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_BASE64_INDEX = {c: i for i, c in enumerate(_BASE64_KEY_STR)}
+# 标准Base64：只在末尾出现最多两个=
+_BASE64_CANONICAL_PATTERN = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
+
+# nonce中的干扰片段，数字为位置，字母为插入的字符
+_NONCE_SCRAMBLE_PATTERN = re.compile(r"(\d+)([a-zA-Z]+)")
+
+
+def descramble(data: str, nonce: str) -> str:
+    """
+    去除DATA中按nonce插入的干扰字符
+
+    与逐个从右往左执行 del T[jlocate:jlocate+len(jstr)] 的结果一致。
+    每个位置都不超过255，所以只有开头 256+干扰字符总长 的范围会受影响，
+    先在这段范围的下标上算出所有要保留的区间，再一次拼接出结果。
+    """
+    tokens = _NONCE_SCRAMBLE_PATTERN.findall(nonce)
+    if not tokens:
+        return data
+
+    bound = min(len(data), 256 + sum(len(letters) for _, letters in tokens))
+    positions = list(range(bound))
+    for digits, letters in reversed(tokens):
+        jlocate = int(digits) & 255
+        del positions[jlocate : jlocate + len(letters)]
+
+    # 把保留的下标合并成连续区间
+    pieces = []
+    start = prev = None
+    for pos in positions:
+        if start is None:
+            start = prev = pos
+        elif pos == prev + 1:
+            prev = pos
+        else:
+            pieces.append(data[start : prev + 1])
+            start = prev = pos
+    if start is not None:
+        pieces.append(data[start : prev + 1])
+    pieces.append(data[bound:])
+    return "".join(pieces)
+
+
+# 漫画详情页
+_TITLE_PATTERN = re.compile("<title>(.*?)</title>")
+_COVER_PATTERN = re.compile(
+    r'<div class="works-cover[^"]*">\s*<a[^>]*>\s*<img src="([^"]*)"[^>]*>'
+)
+_POPULARITY_PATTERN = re.compile(r"<span>人气：<em>(.*?)</em></span>")
+_RATING_PATTERN = re.compile(
+    r"评分：<strong[^>]*>(.*?)</strong>\s*\(<span>(\d+)</span>人评分\)"
+)
+_CHAPTER_LINK_PATTERN = re.compile(
+    r'<a[^>]*?title="([^"]+?)"[^>]*?href="(/ComicView/index/id/\d+/cid/(\d+))"[^>]*?>[\s\S]*?</a>'
+)
+_START_READING = "开始阅读"
+
+
+def _iter_chapter_links(html: str):
+    """
+    依次产出章节链接的 (title属性, 链接路径, cid)
+
+    跳过同一行后面出现"开始阅读"的<a>标签，效果等同于
+    <a(?!.*?开始阅读) 的否定前瞻，但不必每个标签都扫描到行尾
+    """
+    start_reading = [m.start() for m in re.finditer(_START_READING, html)]
+    newlines = [m.start() for m in re.finditer("\n", html)] if start_reading else []
+
+    pos = 0
+    while True:
+        match = _CHAPTER_LINK_PATTERN.search(html, pos)
+        if not match:
+            return
+        begin = match.start() + 2  # 前瞻从"<a"之后开始
+        if start_reading:
+            k = bisect.bisect_left(start_reading, begin)
+            if k < len(start_reading):
+                n = bisect.bisect_left(newlines, begin)
+                line_end = newlines[n] if n < len(newlines) else len(html)
+                if start_reading[k] < line_end:
+                    # 与正则引擎一样从下一个位置继续尝试
+                    pos = match.start() + 1
+                    continue
+        yield match.group(1), match.group(2), match.group(3)
+        pos = match.end()
+
+
+class ComicParser:
+    """漫画解析器"""
+
+    @staticmethod
+    def decode_base64_custom(T: str) -> bytes:
+        """自定义Base64解码"""
+        # 标准格式的数据与标准库的解码结果一致，直接交给C实现
+        if len(T) % 4 == 0 and _BASE64_CANONICAL_PATTERN.fullmatch(T):
+            return base64.b64decode(T)
+        return ComicParser._decode_base64_table(T)
+
+    @staticmethod
+    def _decode_base64_table(T: str) -> bytes:
+        """查表逐组解码，兼容=出现在中间等非标准数据"""
+        if len(T) % 4:
+            raise ValueError("Base64数据长度不是4的倍数")
+        try:
+            indexes = [_BASE64_INDEX[c] for c in T]
+        except KeyError as e:
+            raise ValueError(f"非法Base64字符: {e.args[0]!r}")
+
+        result = bytearray()
+        for e in range(0, len(indexes), 4):
+            b, d, f, g = indexes[e : e + 4]
+
+            b = b << 2 | d >> 4
+            d = (d & 15) << 4 | f >> 2
+            h = (f & 3) << 6 | g
+
+            result.append(b)
+            if f != 64:
+                result.append(d)
+            if g != 64:
+                result.append(h)
+
+        return bytes(result)
+
+    @staticmethod
+    def get_comic_info(comic_id: str) -> Dict:
+        """获取漫画基本信息，优先读取缓存，上游失败时返回已过期的旧结果"""
+        cached = ComicParser.cached_comic_info(comic_id)
+        if cached is not None:
+            return cached
+        try:
+            info = ComicParser.refresh_comic_info(comic_id)
+        except Exception:
+            stale = ComicParser.stale_comic_info(comic_id)
+            if stale is None:
+                raise
+            return stale
+        if "error" in info:
+            return ComicParser.stale_comic_info(comic_id) or info
+        return info
+
+    @staticmethod
+    def refresh_comic_info(comic_id: str) -> Dict:
+        """重新验证详情页，更新缓存和章节索引"""
+        info, changed = ComicParser._revalidate_comic_info(comic_id)
+        if "error" not in info:
+            ComicParser._refresh_chapter_index(comic_id, info, changed)
+        return info
+
+    @staticmethod
+    async def get_comic_info_async(comic_id: str) -> Dict:
+        """get_comic_info 的异步版本"""
+        cached = ComicParser.cached_comic_info(comic_id)
+        if cached is not None:
+            return cached
+
+        try:
+            info = await ComicParser.refresh_comic_info_async(comic_id)
+        except Exception:
+            stale = ComicParser.stale_comic_info(comic_id)
+            if stale is None:
+                raise
+            return stale
+        if "error" in info:
+            return ComicParser.stale_comic_info(comic_id) or info
+        return info
+
+    @staticmethod
+    async def refresh_comic_info_async(comic_id: str) -> Dict:
+        """refresh_comic_info 的异步版本"""
+        info, changed = await ComicParser._revalidate_comic_info_async(comic_id)
+        if "error" not in info:
+            await run_cpu_bound(
+                ComicParser._refresh_chapter_index, comic_id, info, changed
+            )
+        return info
+
+    @staticmethod
+    def _refresh_chapter_index(comic_id: str, info: Dict, changed: bool):
+        # 页面未变化时只更新索引的刷新时间
+        if changed or chapter_index.touch(comic_id) is None:
+            chapter_index.update(comic_id, info["chapters"])
+
+    @staticmethod
+    def stale_comic_info(comic_id: str) -> Optional[Dict]:
+        """超过旧结果保留期、尚未被淘汰的详情"""
+        entry = comic_info_cache.get_stale(comic_id)
+        if entry is None or "info" not in entry:
+            return None
+        return entry["info"]
+
+    @staticmethod
+    def comic_info_url(comic_id: str) -> str:
+        return f"{Config.AC_BASE_URL}/Comic/comicInfo/id/{comic_id}"
+
+    @staticmethod
+    def _comic_info_entry(comic_id: str) -> Optional[Dict]:
+        entry = comic_info_cache.get(comic_id)
+        # 忽略共享后端中旧格式的条目
+        if entry is None or "info" not in entry:
+            return None
+        return entry
+
+    @staticmethod
+    def cached_comic_info(comic_id: str) -> Optional[Dict]:
+        """读取缓存的详情，超过新鲜期时仍返回旧结果，并在后台重新验证"""
+        entry = ComicParser._comic_info_entry(comic_id)
+        if entry is None:
+            return None
+        if time.time() - entry["fetched"] > Config.COMIC_INFO_CACHE_TTL:
+            with _revalidation_lock:
+                comic_info_revalidation["stale_served"] += 1
+            schedule_comic_refresh(comic_id)
+        return entry["info"]
+
+    @staticmethod
+    def _revalidated_info(
+        comic_id: str, entry: Optional[Dict], resp
+    ) -> Tuple[Dict, bool]:
+        """
+        根据条件请求的响应得到详情并写入缓存
+
+        上游返回304，或响应体与上次相同时，沿用缓存的解析结果，不再解析页面
+
+        Returns:
+            (详情, 是否重新解析)，请求失败时详情为错误信息
+        """
+        if resp.status_code == 304 and entry is not None:
+            outcome, info, validators = "not_modified", entry["info"], entry
+        elif resp.status_code != 200:
+            return {"error": f"请求失败，状态码: {resp.status_code}"}, False
+        else:
+            validators = page_validators(resp)
+            if entry is not None and entry.get("hash") == validators["hash"]:
+                outcome, info = "unchanged", entry["info"]
+            else:
+                outcome = "changed"
+                info = ComicParser.parse_comic_info(comic_id, resp.text)
+                if info["title"] != "未知标题":
+                    search_index.add([info])
+
+        if entry is not None:
+            with _revalidation_lock:
+                comic_info_revalidation[outcome] += 1
+        comic_info_cache.set(
+            comic_id,
+            {
+                "info": info,
+                "fetched": time.time(),
+                "etag": validators.get("etag", ""),
+                "last_modified": validators.get("last_modified", ""),
+                "hash": validators.get("hash", ""),
+            },
+        )
+        return info, outcome == "changed"
+
+    @staticmethod
+    def _revalidate_comic_info(comic_id: str) -> Tuple[Dict, bool]:
+        """请求详情页，已有缓存时发送条件请求，返回值见 _revalidated_info"""
+        entry = ComicParser._comic_info_entry(comic_id)
+        resp = upstream.get(
+            ComicParser.comic_info_url(comic_id),
+            headers=conditional_headers(Config.HEADERS, entry),
+        )
+        return ComicParser._revalidated_info(comic_id, entry, resp)
+
+    @staticmethod
+    async def _revalidate_comic_info_async(comic_id: str) -> Tuple[Dict, bool]:
+        """_revalidate_comic_info 的异步版本"""
+        entry = ComicParser._comic_info_entry(comic_id)
+        resp = await async_upstream.get(
+            ComicParser.comic_info_url(comic_id),
+            headers=conditional_headers(Config.HEADERS, entry),
+        )
+        return await run_cpu_bound(ComicParser._revalidated_info, comic_id, entry, resp)
+
+    @staticmethod
+    @timed("parse")
+    def parse_comic_info(comic_id: str, html: str) -> Dict:
+        """解析漫画详情页HTML"""
+        # 提取标题
+        title_match = _TITLE_PATTERN.search(html)
+        title = title_match.group(1) if title_match else "未知标题"
+        comic_title = title.split("-")[0].strip() if "-" in title else title
+
+        # 提取封面图片
+        cover_match = _COVER_PATTERN.search(html)
+
+        if cover_match:
+            cover_url = cover_match.group(1)
+            # 处理可能的相对路径
+            if cover_url.startswith("//"):
+                cover_url = "https:" + cover_url
+            elif cover_url.startswith("/"):
+                cover_url = Config.AC_BASE_URL + cover_url
+        else:
+            cover_url = None
+
+        # 提取人气信息
+        popularity_match = _POPULARITY_PATTERN.search(html)
+        popularity = popularity_match.group(1).strip() if popularity_match else "未知"
+
+        # 提取评分信息
+        rating_match = _RATING_PATTERN.search(html)
+        if rating_match:
+            rating = {
+                "score": rating_match.group(1).strip(),
+                "rating_count": rating_match.group(2).strip(),
+            }
+        else:
+            rating = {"score": "未知", "rating_count": "0"}
+
+        # 提取章节列表，序号按页面中出现的顺序编号（含重复链接），
+        # 同一cid只保留第一次出现的章节
+        chapters = []
+        seen_cids = set()
+        for number, (title_attr, path, cid) in enumerate(
+            _iter_chapter_links(html), start=1
+        ):
+            if cid in seen_cids:
+                continue
+            seen_cids.add(cid)
+            chapters.append(
+                {
+                    "number": number,
+                    "link": Config.AC_BASE_URL + path,
+                    # title属性形如"王牌御史：01，缘起"
+                    "title": title_attr.strip().split("：")[1],
+                }
+            )
+
+        return {
+            "comic_id": comic_id,
+            "title": comic_title,
+            "popularity": popularity,
+            "rating": rating,
+            "chapters": chapters,
+            "cover_url": cover_url,  # 新增封面URL
+            "total_chapters": len(chapters),
+        }
+
+    @staticmethod
+    def _chapter_headers(cookie: Optional[str]) -> Dict:
+        headers = Config.HEADERS.copy()
+        if cookie:
+            headers["Cookie"] = cookie
+        return headers
+
+    @staticmethod
+    def get_chapter_images(chapter_url: str, cookie) -> Dict:
+        """
+        获取章节图片数据
+
+        上游请求失败的重试由上游客户端按退避规则处理，这里只在解密失败时
+        退避后重新请求页面
+        """
+        max_retries = 3
+        retry_count = 0
+
+        while retry_count < max_retries:
+            if retry_count:
+                time.sleep(upstream_governor.backoff_delay(retry_count - 1))
+            try:
+                resp = upstream.get(
+                    chapter_url, headers=ComicParser._chapter_headers(cookie)
+                )
+            except UpstreamUnavailableError:
+                raise
+            except Exception as e:
+                return {"error": f"章节请求失败: {str(e)}"}
+            if resp.status_code != 200:
+                return {"error": f"章节请求失败，状态码: {resp.status_code}"}
+
+            try:
+                return ComicParser.parse_chapter_html(chapter_url, resp.text)
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                retry_count += 1
+                if retry_count == max_retries:
+                    return {"error": f"数据解码失败: {str(e)}"}
+            except Exception as e:
+                retry_count += 1
+                if retry_count == max_retries:
+                    return {"error": f"解析失败: {str(e)}"}
+
+        return {"error": "达到最大重试次数"}
+
+    @staticmethod
+    async def get_chapter_images_async(chapter_url: str, cookie) -> Dict:
+        """get_chapter_images 的异步版本，解密在线程池中执行"""
+        max_retries = 3
+        retry_count = 0
+
+        while retry_count < max_retries:
+            if retry_count:
+                await asyncio.sleep(upstream_governor.backoff_delay(retry_count - 1))
+            try:
+                resp = await async_upstream.get(
+                    chapter_url, headers=ComicParser._chapter_headers(cookie)
+                )
+            except UpstreamUnavailableError:
+                raise
+            except Exception as e:
+                return {"error": f"章节请求失败: {str(e)}"}
+            if resp.status_code != 200:
+                return {"error": f"章节请求失败，状态码: {resp.status_code}"}
+
+            try:
+                return await run_cpu_bound(
+                    ComicParser.parse_chapter_html, chapter_url, resp.text
+                )
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                retry_count += 1
+                if retry_count == max_retries:
+                    return {"error": f"数据解码失败: {str(e)}"}
+            except Exception as e:
+                retry_count += 1
+                if retry_count == max_retries:
+                    return {"error": f"解析失败: {str(e)}"}
+
+        return {"error": "达到最大重试次数"}
+
+    @staticmethod
+    def parse_chapter_html(chapter_url: str, html: str) -> Dict:
+        """
+        解析章节页面并解密图片数据
+
+        缺少加密数据或nonce时返回错误信息，解码失败时抛出异常由调用方重试
+        """
+        with timed("parse"):
+            # 提取章节标题
+            chapter_title_match = re.search(r"<title>《[^》]*》(.*?)-.*?</title>", html)
+            chapter_title = (
+                chapter_title_match.group(1).strip()
+                if chapter_title_match
+                else "未知章节"
+            )
+
+            # 提取加密数据
+            data_match = re.findall("(?<=var DATA = ').*?(?=')", html)
+            if not data_match:
+                return {"error": "未找到加密数据"}
+
+            data = data_match[0]
+
+            # 提取nonce
+            nonce_matches = re.findall('window\\[".+?(?<=;)', html)
+            if len(nonce_matches) < 2:
+                return {"error": "未找到nonce数据"}
+
+        nonce = "=".join(nonce_matches[1].split("=")[1:])[:-1]
+        with timed("nonce"):
+            nonce = evaluate_nonce(nonce)
+
+        # 解密数据
+        with timed("descramble"):
+            T = descramble(data, nonce)
+        with timed("base64"):
+            decoded_data = ComicParser.decode_base64_custom(T)
+
+        with timed("json"):
+            chapter_data = json.loads(decoded_data)
+        # 添加章节标题到返回数据中
+        chapter_data["chapter_title"] = chapter_title
+
+        return {
+            "success": True,
+            "data": chapter_data,
+            "chapter_url": chapter_url,
+            "chapter_title": chapter_title,
+        }
+
+
+# 同时，在获取章节图片数据的部分，修改图片URL为代理URL
+def get_proxy_image_url(original_url, api_url=None, **region):
+    """
+    生成图片代理URL
+
+    同一图片和参数总是得到相同的URL：写明宽度和质量，参数顺序固定，
+    设置了签名密钥时附带签名，浏览器和CDN可以跨页面、跨用户复用缓存
+
+    Args:
+        original_url: 原始图片URL
+        api_url: 服务地址，设置了 QQCOMIC_IMAGE_PROXY_BASE_URL 时使用该配置
+        region: 分段参数，例如 slices=3, slice=0
+    """
+    api_url = (Config.IMAGE_PROXY_BASE_URL or api_url or request.host_url).rstrip("/")
+    params = {
+        "url": original_url,
+        "width": Config.IMAGE_DEFAULT_WIDTH,
+        "quality": Config.IMAGE_DEFAULT_QUALITY,
+        **region,
+    }
+    signature = image_url_signature(params)
+    if signature:
+        params["sig"] = signature
+    return f"{api_url}/image/proxy?{urlencode(params, safe='/', quote_via=quote)}"
+
+
+# 影响图片代理输出的参数，按此顺序参与签名
+IMAGE_URL_PARAMS = ("url", "width", "quality", "format", "slices", "slice", "y0", "y1")
+
+
+def image_url_signature(params) -> str:
+    """计算图片代理参数的HMAC签名，未设置密钥时返回空字符串"""
+    if not Config.IMAGE_URL_SECRET:
+        return ""
+    message = "\n".join(f"{name}={params.get(name, '')}" for name in IMAGE_URL_PARAMS)
+    return hmac.new(
+        Config.IMAGE_URL_SECRET.encode(), message.encode(), hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def image_url_signed(args) -> bool:
+    """
+    校验图片代理请求的签名
+
+    未设置密钥时无法校验签名，只允许已知上游主机的图片，
+    避免代理被当作任意URL的图片缩放服务
+    """
+    if not Config.IMAGE_URL_SECRET:
+        parts = urlsplit(args.get("url", ""))
+        return (
+            parts.scheme in ("http", "https")
+            and parts.netloc.lower() in upstream_hosts()
+        )
+    return hmac.compare_digest(args.get("sig", ""), image_url_signature(args))
+
+
+# 在返回章节数据时，修改图片URL
+def modify_chapter_images_data(chapter_data, api_url=None):
+    """修改章节数据中的图片URL为代理URL，返回副本，不修改缓存中的原数据"""
+    if chapter_data.get("success") and "data" in chapter_data:
+        pictures = [dict(pic) for pic in chapter_data["data"].get("picture", [])]
+        chapter_data = {
+            **chapter_data,
+            "data": {**chapter_data["data"], "picture": pictures},
+        }
+        for pic in pictures:
+            if "url" in pic:
+                pic["original_url"] = pic["url"]  # 保留原始URL
+                pic["url"] = get_proxy_image_url(pic["url"], api_url)  # 替换为代理URL
+                slices = image_slice_count(pic)
+                if slices > 1:
+                    pic["slices"] = [
+                        get_proxy_image_url(
+                            pic["original_url"], api_url, slices=slices, slice=index
+                        )
+                        for index in range(slices)
+                    ]
+    return chapter_data
+
+
+def image_slice_count(pic: Dict) -> int:
+    """按原图尺寸计算默认宽度下的分段数，未开启分段或尺寸未知时为1"""
+    try:
+        width, height = int(pic.get("width", 0)), int(pic.get("height", 0))
+    except (TypeError, ValueError):
+        return 1
+    if Config.IMAGE_SLICE_HEIGHT <= 0 or width <= 0 or height <= 0:
+        return 1
+    scaled_height = height * Config.IMAGE_DEFAULT_WIDTH / width
+    slices = -(-int(scaled_height) // Config.IMAGE_SLICE_HEIGHT)
+    return max(1, min(slices, Config.IMAGE_MAX_SLICES))
+
+
+class SearchRequestError(Exception):
+    """搜索接口返回非200状态码"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"状态码: {status_code}")
+        self.status_code = status_code
+
+
+class ComicSearch:
+    def __init__(self):
+        self.base_url = Config.M_AC_BASE_URL
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15E148 Safari/604.1",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "zh-CN,zh;q=0.9",
+        }
+
+    def _search_url(self, keyword: str, page: int) -> str:
+        """拼接搜索接口地址"""
+        timestamp = int(time.time() * 1000)
+        params = {
+            "_t": timestamp,
+            "word": keyword,
+            "page": page,
+            "pageSize": Config.SEARCH_PAGE_SIZE,
+            "style": "items",
+        }
+        return f"{self.base_url}/search/result?{urlencode(params)}"
+
+    @staticmethod
+    def _page_key(keyword: str, page: int) -> str:
+        return f"{keyword}\n{page}"
+
+    def _fetch_page_results(
+        self, keyword: str, page: int, timeout: float
+    ) -> List[Dict]:
+        """
+        请求并解析一页搜索结果，优先读取页缓存
+
+        Raises:
+            SearchRequestError: 上游返回非200状态码
+        """
+        key = self._page_key(keyword, page)
+        cached = search_page_cache.get(key)
+        if cached is not None:
+            return cached
+
+        url = self._search_url(keyword, page)
+        response = upstream.get(url, headers=self.headers, timeout=timeout)
+        response.encoding = "utf-8"
+        if response.status_code != 200:
+            raise SearchRequestError(response.status_code)
+
+        results = self._parse_search_results(response.text)
+        search_index.add(results)
+        search_page_cache.set(key, results)
+        return results
+
+    async def _fetch_page_results_async(
+        self, keyword: str, page: int, timeout: float
+    ) -> List[Dict]:
+        """_fetch_page_results 的异步版本"""
+        key = self._page_key(keyword, page)
+        cached = search_page_cache.get(key)
+        if cached is not None:
+            return cached
+
+        url = self._search_url(keyword, page)
+        response = await async_upstream.get(url, headers=self.headers, timeout=timeout)
+        response.encoding = "utf-8"
+        if response.status_code != 200:
+            raise SearchRequestError(response.status_code)
+
+        results = await run_cpu_bound(self._parse_search_results, response.text)
+        await run_cpu_bound(search_index.add, results)
+        search_page_cache.set(key, results)
+        return results
+
+    def _check_has_next(
+        self, keyword: str, current_page: int, current_count: int
+    ) -> bool:
+        """
+        检查是否有下一页
+
+        下一页的结果会写入页缓存，客户端翻页时不必再请求上游
+
+        Args:
+            keyword: 搜索关键词
+            current_page: 当前页码
+            current_count: 当前页结果数量
+
+        Returns:
+            是否有下一页
+        """
+        try:
+            # 直接请求下一页看看是否有内容
+            next_results = self._fetch_page_results(keyword, current_page + 1, 5)
+            return len(next_results) > 0
+
+        except Exception:
+            # 如果请求失败，认为没有下一页
+            return False
+
+    async def _check_has_next_async(
+        self, keyword: str, current_page: int, current_count: int
+    ) -> bool:
+        """_check_has_next 的异步版本"""
+        try:
+            next_results = await self._fetch_page_results_async(
+                keyword, current_page + 1, 5
+            )
+            return len(next_results) > 0
+
+        except Exception:
+            return False
+
+    def search_comics_direct(self, keyword: str, page: int = 1) -> Dict:
+        """
+        直接搜索漫画，返回API原始结果
+
+        Args:
+            keyword: 搜索关键词
+            page: 页码
+
+        Returns:
+            搜索结果的原始数据
+        """
+        try:
+            if Config.SEARCH_HAS_MORE_MODE == "count":
+                # 结果数达到每页数量时认为还有下一页，不额外请求
+                results = self._fetch_page_results(keyword, page, 10)
+                has_next = len(results) >= Config.SEARCH_PAGE_SIZE
+            else:
+                # 与当前页并发请求下一页
+                next_future = run_in_context(
+                    search_executor, self._check_has_next, keyword, page, 0
+                )
+                results = self._fetch_page_results(keyword, page, 10)
+                has_next = next_future.result()
+
+            return {
+                "keyword": keyword,
+                "page": page,
+                "total_results": len(results),
+                "results": results,
+                "has_more": has_next,  # 简单判断是否还有更多结果
+            }
+
+        except SearchRequestError as e:
+            return {
+                "error": f"搜索请求失败，状态码: {e.status_code}",
+                "keyword": keyword,
+                "page": page,
+                "results": [],
+            }
+        except Exception as e:
+            return {
+                "error": f"搜索异常: {str(e)}",
+                "keyword": keyword,
+                "page": page,
+                "results": [],
+            }
+
+    async def search_comics_direct_async(self, keyword: str, page: int = 1) -> Dict:
+        """search_comics_direct 的异步版本"""
+        try:
+            if Config.SEARCH_HAS_MORE_MODE == "count":
+                results = await self._fetch_page_results_async(keyword, page, 10)
+                has_next = len(results) >= Config.SEARCH_PAGE_SIZE
+            else:
+                results, has_next = await asyncio.gather(
+                    self._fetch_page_results_async(keyword, page, 10),
+                    self._check_has_next_async(keyword, page, 0),
+                )
+
+            return {
+                "keyword": keyword,
+                "page": page,
+                "total_results": len(results),
+                "results": results,
+                "has_more": has_next,
+            }
+
+        except SearchRequestError as e:
+            return {
+                "error": f"搜索请求失败，状态码: {e.status_code}",
+                "keyword": keyword,
+                "page": page,
+                "results": [],
+            }
+        except Exception as e:
+            return {
+                "error": f"搜索异常: {str(e)}",
+                "keyword": keyword,
+                "page": page,
+                "results": [],
+            }
+
+    @staticmethod
+    def _local_result(keyword: str, page: int, source: str) -> Optional[Dict]:
+        """
+        按搜索来源查询本地索引
+
+        Returns:
+            可直接返回的本地结果；需要请求上游时返回None
+        """
+        if source == "remote":
+            return None
+        result = search_index.search(keyword, page)
+        # hybrid模式下本地结果填满当前页才不请求上游
+        if source == "local" or len(result["results"]) >= Config.SEARCH_PAGE_SIZE:
+            return result
+        search_index.count_fallback()
+        return None
+
+    @staticmethod
+    def _fallback_result(
+        key: str, keyword: str, page: int, error: Dict
+    ) -> Tuple[Dict, str]:
+        """上游搜索失败时依次尝试已过期的缓存结果和本地索引"""
+        stale = search_result_cache.get_stale(key)
+        if stale is not None:
+            return stale, "remote"
+        local = search_index.search(keyword, page)
+        if local["results"]:
+            return local, "local"
+        return error, "remote"
+
+    def search(
+        self, keyword: str, page: int = 1, source: str = Config.SEARCH_SOURCE
+    ) -> Tuple[Dict, str]:
+        """
+        按来源搜索漫画，上游结果按（关键词，页码）缓存
+
+        Args:
+            keyword: 规范化后的搜索关键词
+            page: 页码
+            source: local、remote 或 hybrid
+
+        Returns:
+            (搜索结果, 实际来源local或remote)
+        """
+        local = self._local_result(keyword, page, source)
+        if local is not None:
+            search_query_stats.record(keyword, True)
+            return local, "local"
+
+        key = self._page_key(keyword, page)
+        result = search_result_cache.get(key)
+        search_query_stats.record(keyword, result is not None)
+        if result is None:
+            result = self.search_comics_direct(keyword, page)
+            if "error" not in result:
+                search_result_cache.set(key, result)
+            else:
+                return self._fallback_result(key, keyword, page, result)
+        return result, "remote"
+
+    async def search_async(
+        self, keyword: str, page: int = 1, source: str = Config.SEARCH_SOURCE
+    ) -> Tuple[Dict, str]:
+        """search 的异步版本"""
+        local = self._local_result(keyword, page, source)
+        if local is not None:
+            search_query_stats.record(keyword, True)
+            return local, "local"
+
+        key = self._page_key(keyword, page)
+        result = search_result_cache.get(key)
+        search_query_stats.record(keyword, result is not None)
+        if result is None:
+            result = await self.search_comics_direct_async(keyword, page)
+            if "error" not in result:
+                search_result_cache.set(key, result)
+            else:
+                return self._fallback_result(key, keyword, page, result)
+        return result, "remote"
+
+    @timed("parse")
+    def _parse_search_results(self, html: str) -> List[Dict]:
+        """
+        解析搜索结果HTML
+        """
+        comics = []
+        comic_pattern = r'<li class="comic-item">(.*?)</li>'
+        comic_matches = re.findall(comic_pattern, html, re.DOTALL)
+
+        for comic_html in comic_matches:
+            comic = self._parse_single_comic(comic_html)
+            if comic:
+                comics.append(comic)
+
+        return comics
+
+    def _parse_single_comic(self, comic_html: str) -> Optional[Dict]:
+        """
+        解析单个漫画信息
+        """
+        try:
+            # 提取漫画ID和链接
+            link_match = re.search(r'href="/comic/index/id/(\d+)"', comic_html)
+            if not link_match:
+                return None
+
+            comic_id = link_match.group(1)
+
+            # 提取标题
+            title_match = re.search(
+                r'<strong class="comic-title">(.*?)</strong>', comic_html
+            )
+            title = title_match.group(1).strip() if title_match else "未知标题"
+
+            # 提取封面图片
+            cover_match = re.search(r'<img class="cover-image" src="(.*?)"', comic_html)
+            cover_url = cover_match.group(1) if cover_match else None
+            if cover_url and cover_url.startswith("//"):
+                cover_url = "https:" + cover_url
+
+            # 提取更新日期
+            update_match = re.search(
+                r'<small class="comic-update">(.*?)</small>', comic_html
+            )
+            update_date = update_match.group(1).strip() if update_match else "未知"
+
+            # 提取标签
+            tag_match = re.search(r'<small class="comic-tag">(.*?)</small>', comic_html)
+            tags = tag_match.group(1).strip() if tag_match else ""
+
+            # 提取描述
+            desc_match = re.search(
+                r'<small class="comic-desc">(.*?)</small>', comic_html, re.DOTALL
+            )
+            description = desc_match.group(1).strip() if desc_match else ""
+
+            return {
+                "comic_id": comic_id,
+                "title": title,
+                "cover_url": cover_url,
+                "update_date": update_date,
+                "tags": tags,
+                "description": description,
+                "detail_url": f"{self.base_url}/comic/index/id/{comic_id}",
+            }
+
+        except Exception as e:
+            logging.warning(f"解析漫画信息异常: {e}")
+            return None
+
+
+SEARCH_SOURCES = ("local", "remote", "hybrid")
+
+# 全局搜索实例
+comic_searcher = ComicSearch()
+# 并发请求搜索下一页的线程池
+search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="qqcomic-search")
+
+
+def format_comic_detail(comic_id: str, info: Dict) -> Dict:
+    """转换为漫画源规范的详情格式"""
+    return {
+        "item_id": int(comic_id),
+        "name": info.get("title", ""),
+        "page_count": 0,
+        "views": info.get("popularity", "0"),
+        "rate": float(info.get("rating", {}).get("score", "0")),
+        "cover": info.get("cover_url", ""),
+        "tags": info.get("tags", []),
+        "total_chapters": info.get("total_chapters", 0),
+    }
+
+
+def comic_info_revalidation_stats() -> Dict:
+    with _revalidation_lock:
+        return dict(comic_info_revalidation)
+
+
+# 后台重新验证详情页、刷新章节索引的线程池
+comic_refresh_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="qqcomic-refresh"
+)
+_comic_refreshing = set()
+_comic_refreshing_lock = threading.Lock()
+
+
+def schedule_comic_refresh(comic_id: str):
+    """在后台重新验证详情页并更新章节索引，同一漫画同时只刷新一次"""
+    with _comic_refreshing_lock:
+        if comic_id in _comic_refreshing:
+            return
+        _comic_refreshing.add(comic_id)
+
+    def run():
+        try:
+            ComicParser.refresh_comic_info(comic_id)
+        except Exception as e:
+            logging.warning(f"刷新漫画详情失败: {str(e)}")
+        finally:
+            with _comic_refreshing_lock:
+                _comic_refreshing.discard(comic_id)
+
+    comic_refresh_executor.submit(run)
+
+
+def _use_index_entry(comic_id: str, entry):
+    if chapter_index.is_stale(entry):
+        # 已发布章节的cid不会变化，先用旧索引响应
+        schedule_comic_refresh(comic_id)
+    return entry, None
+
+
+def load_chapter_index(comic_id: str) -> Tuple[Optional[Tuple], Optional[Dict]]:
+    """
+    读取漫画的章节索引，尚未建立时读取详情页建立
+
+    Returns:
+        (索引, 错误信息)
+    """
+    entry = chapter_index.lookup(comic_id)
+    if entry is not None:
+        return _use_index_entry(comic_id, entry)
+    # 同一漫画的并发请求只读取一次详情页
+    return chapter_index_flight.do(comic_id, _build_chapter_index, comic_id)
+
+
+def _build_chapter_index(comic_id: str):
+    info = ComicParser.cached_comic_info(comic_id)
+    if info is None:
+        info, _ = ComicParser._revalidate_comic_info(comic_id)
+        if "error" in info:
+            return None, info
+    return chapter_index.update(comic_id, info["chapters"]), None
+
+
+async def load_chapter_index_async(
+    comic_id: str,
+) -> Tuple[Optional[Tuple], Optional[Dict]]:
+    """load_chapter_index 的异步版本"""
+    entry = chapter_index.lookup(comic_id)
+    if entry is not None:
+        return _use_index_entry(comic_id, entry)
+    return await chapter_index_flight.do_async(
+        comic_id, _build_chapter_index_async, comic_id
+    )
+
+
+async def _build_chapter_index_async(comic_id: str):
+    info = ComicParser.cached_comic_info(comic_id)
+    if info is None:
+        info, _ = await ComicParser._revalidate_comic_info_async(comic_id)
+        if "error" in info:
+            return None, info
+    return await run_cpu_bound(chapter_index.update, comic_id, info["chapters"]), None
+
+
+def _needs_index_refresh(entry, chapter_number: int) -> bool:
+    # 章节号大于索引中最新的章节，可能是上次刷新后新发布的章节
+    latest = entry[2][-1]["number"] if entry[2] else 0
+    return (
+        chapter_number > latest
+        and time.time() - entry[0] >= Config.CHAPTER_INDEX_MIN_REFRESH
+    )
+
+
+def _refresh_index_for_chapter(comic_id: str, entry):
+    info = ComicParser.refresh_comic_info(comic_id)
+    if "error" in info:
+        return entry
+    return chapter_index.lookup(comic_id) or entry
+
+
+async def _refresh_index_for_chapter_async(comic_id: str, entry):
+    info = await ComicParser.refresh_comic_info_async(comic_id)
+    if "error" in info:
+        return entry
+    return chapter_index.lookup(comic_id) or entry
+
+
+def find_chapter(
+    comic_id: str, entry, chapter_number: int
+) -> Tuple[Tuple, Optional[Dict]]:
+    """
+    在索引中查找章节，章节号大于最新章节时先刷新一次索引
+
+    同一漫画的并发请求只刷新一次，距上次刷新不足
+    CHAPTER_INDEX_MIN_REFRESH 秒时不刷新
+
+    Returns:
+        (索引, 章节)，找不到时章节为None
+    """
+    chapter = entry[1].get(chapter_number)
+    if chapter is None and _needs_index_refresh(entry, chapter_number):
+        entry = chapter_index_flight.do(
+            f"{comic_id}:refresh", _refresh_index_for_chapter, comic_id, entry
+        )
+        chapter = entry[1].get(chapter_number)
+    return entry, chapter
+
+
+async def find_chapter_async(
+    comic_id: str, entry, chapter_number: int
+) -> Tuple[Tuple, Optional[Dict]]:
+    """find_chapter 的异步版本"""
+    chapter = entry[1].get(chapter_number)
+    if chapter is None and _needs_index_refresh(entry, chapter_number):
+        entry = await chapter_index_flight.do_async(
+            f"{comic_id}:refresh", _refresh_index_for_chapter_async, comic_id, entry
+        )
+        chapter = entry[1].get(chapter_number)
+    return entry, chapter
+
+
+def cookie_tier(cookie: Optional[str]) -> str:
+    """缓存键中的登录态：匿名请求共享，带Cookie的请求按Cookie摘要隔离"""
+    if not cookie:
+        return "anon"
+    return hashlib.sha256(cookie.encode("utf-8")).hexdigest()[:32]
+
+
+def _cache_chapter_images(key: str, images_data: Dict) -> Dict:
+    # 失败的结果不缓存，有已过期的旧结果时返回旧结果
+    if images_data.get("success"):
+        chapter_images_cache.set(key, images_data)
+        return images_data
+    return chapter_images_cache.get_stale(key) or images_data
+
+
+def _fetch_chapter_images(key: str, chapter: Dict, cookie: Optional[str]) -> Dict:
+    try:
+        images_data = ComicParser.get_chapter_images(chapter["link"], cookie)
+    except UpstreamUnavailableError:
+        # 上游不可用时返回旧结果
+        stale = chapter_images_cache.get_stale(key)
+        if stale is None:
+            raise
+        return stale
+    return _cache_chapter_images(key, images_data)
+
+
+async def _fetch_chapter_images_async(
+    key: str, chapter: Dict, cookie: Optional[str]
+) -> Dict:
+    try:
+        images_data = await ComicParser.get_chapter_images_async(
+            chapter["link"], cookie
+        )
+    except UpstreamUnavailableError:
+        # 上游不可用时返回旧结果
+        stale = chapter_images_cache.get_stale(key)
+        if stale is None:
+            raise
+        return stale
+    return _cache_chapter_images(key, images_data)
+
+
+def load_chapter_images(comic_id: str, chapter: Dict, cookie: Optional[str]) -> Dict:
+    """
+    获取解密后的章节图片数据
+
+    按(漫画ID, cid, 登录态)缓存，同一键的并发请求只访问一次上游
+    """
+    key = f"{comic_id}:{chapter['cid']}:{cookie_tier(cookie)}"
+    cached = chapter_images_cache.get(key)
+    if cached is not None:
+        return cached
+    return chapter_images_flight.do(key, _fetch_chapter_images, key, chapter, cookie)
+
+
+async def load_chapter_images_async(
+    comic_id: str, chapter: Dict, cookie: Optional[str]
+) -> Dict:
+    """load_chapter_images 的异步版本"""
+    key = f"{comic_id}:{chapter['cid']}:{cookie_tier(cookie)}"
+    cached = chapter_images_cache.get(key)
+    if cached is not None:
+        return cached
+    return await chapter_images_flight.do_async(
+        key, _fetch_chapter_images_async, key, chapter, cookie
+    )
+
+
+def unavailable_result(e: UpstreamUnavailableError) -> Tuple[Dict, int]:
+    """上游暂不可用时的(响应数据, 状态码)，retry_after 用于设置 Retry-After 头"""
+    return {"error": str(e), "retry_after": math.ceil(e.retry_after)}, 503
+
+
+def retry_after_headers(payload: Dict, status: int) -> Dict:
+    """unavailable_result 的响应对应的 Retry-After 头，其他响应为空"""
+    if status == 503 and "retry_after" in payload:
+        return {"Retry-After": str(payload["retry_after"])}
+    return {}
+
+
+def comic_detail_result(comic_id: str) -> Tuple[Dict, int]:
+    """获取漫画详情，返回(响应数据, 状态码)"""
+    if not is_comic_id(comic_id):
+        return invalid_comic_id_result()
+    try:
+        info = ComicParser.get_comic_info(comic_id)
+        if "error" in info:
+            return info, 500
+        return format_comic_detail(comic_id, info), 200
+    except UpstreamUnavailableError as e:
+        return unavailable_result(e)
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+async def comic_detail_result_async(comic_id: str) -> Tuple[Dict, int]:
+    """comic_detail_result 的异步版本"""
+    if not is_comic_id(comic_id):
+        return invalid_comic_id_result()
+    try:
+        info = await ComicParser.get_comic_info_async(comic_id)
+        if "error" in info:
+            return info, 500
+        return format_comic_detail(comic_id, info), 200
+    except UpstreamUnavailableError as e:
+        return unavailable_result(e)
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def _chapter_images_response(
+    comic_id: str,
+    entry,
+    target_chapter: Dict,
+    images_data: Dict,
+    cookie: Optional[str],
+    api_url: str,
+    accept: str,
+) -> Tuple[Dict, int]:
+    if not images_data.get("success"):
+        return {"error": images_data.get("error", "获取图片失败")}, 500
+
+    image_prefetcher.schedule_chapter(
+        comic_id, entry[1], target_chapter, images_data, cookie, accept
+    )
+    images_data = modify_chapter_images_data(images_data, api_url)
+    return format_chapter_images(target_chapter, images_data), 200
+
+
+def chapter_images_result(
+    comic_id: str,
+    chapter_number: int,
+    cookie: Optional[str],
+    api_url: str,
+    accept: str = "",
+) -> Tuple[Dict, int]:
+    """
+    获取章节图片，返回(响应数据, 状态码)
+
+    Args:
+        comic_id: 漫画ID
+        chapter_number: 章节号
+        cookie: 请求的Cookie
+        api_url: 生成图片代理URL使用的服务地址
+        accept: 请求的Accept头，用于预取时选择图片格式
+    """
+    if not is_comic_id(comic_id):
+        return invalid_comic_id_result()
+    try:
+        entry, error = load_chapter_index(comic_id)
+        if error:
+            return error, 500
+
+        entry, target_chapter = find_chapter(comic_id, entry, chapter_number)
+        if not target_chapter:
+            return {"error": f"未找到第 {chapter_number} 章"}, 404
+
+        images_data = load_chapter_images(comic_id, target_chapter, cookie)
+        return _chapter_images_response(
+            comic_id, entry, target_chapter, images_data, cookie, api_url, accept
+        )
+    except UpstreamUnavailableError as e:
+        return unavailable_result(e)
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+async def chapter_images_result_async(
+    comic_id: str,
+    chapter_number: int,
+    cookie: Optional[str],
+    api_url: str,
+    accept: str = "",
+) -> Tuple[Dict, int]:
+    """chapter_images_result 的异步版本"""
+    if not is_comic_id(comic_id):
+        return invalid_comic_id_result()
+    try:
+        entry, error = await load_chapter_index_async(comic_id)
+        if error:
+            return error, 500
+
+        entry, target_chapter = await find_chapter_async(
+            comic_id, entry, chapter_number
+        )
+        if not target_chapter:
+            return {"error": f"未找到第 {chapter_number} 章"}, 404
+
+        images_data = await load_chapter_images_async(comic_id, target_chapter, cookie)
+        return _chapter_images_response(
+            comic_id, entry, target_chapter, images_data, cookie, api_url, accept
+        )
+    except UpstreamUnavailableError as e:
+        return unavailable_result(e)
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+# 批量接口的线程池
+batch_executor = ThreadPoolExecutor(
+    max_workers=Config.BATCH_WORKERS, thread_name_prefix="qqcomic-batch"
+)
+
+
+def _batch_items(body) -> List:
+    # 也接受直接传入的列表
+    items = body.get("items") if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError("请求体必须是包含items列表的JSON对象")
+    if not items:
+        raise ValueError("items不能为空")
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        raise ValueError(f"单次最多 {Config.BATCH_MAX_ITEMS} 个条目")
+    return items
+
+
+# 漫画ID只能由数字组成，避免拼入上游URL、缓存键和章节索引时改变路径
+COMIC_ID_PATTERN = re.compile(r"[0-9]+")
+
+
+def is_comic_id(value: str) -> bool:
+    return COMIC_ID_PATTERN.fullmatch(value) is not None
+
+
+def invalid_comic_id_result() -> Tuple[Dict, int]:
+    return {"error": "漫画ID必须是数字"}, 400
+
+
+def _batch_comic_id(item) -> str:
+    if isinstance(item, bool) or not isinstance(item, (str, int)):
+        raise ValueError("漫画ID必须是字符串或整数")
+    if not is_comic_id(str(item)):
+        raise ValueError(f"漫画ID必须是数字: {item}")
+    return str(item)
+
+
+def parse_batch_comics(body) -> List[Tuple[Dict, Optional[Tuple[Dict, int]]]]:
+    """
+    解析批量详情请求体 {"items": ["漫画ID", ...]}
+
+    Returns:
+        (条目信息, 错误结果) 列表，条目合法时错误结果为None
+
+    Raises:
+        ValueError: 请求体或items格式不正确
+    """
+    entries = []
+    for i, item in enumerate(_batch_items(body)):
+        try:
+            entries.append(({"index": i, "comic_id": _batch_comic_id(item)}, None))
+        except ValueError as e:
+            entries.append(({"index": i}, ({"error": str(e)}, 400)))
+    return entries
+
+
+def _batch_chapter(item) -> Tuple[str, int]:
+    if not isinstance(item, dict):
+        raise ValueError("章节条目必须包含comic_id和chapter")
+    comic_id = _batch_comic_id(item.get("comic_id"))
+    number = item.get("chapter")
+    if isinstance(number, bool) or not isinstance(number, int) or number < 1:
+        raise ValueError("章节号必须是大于0的整数")
+    return comic_id, number
+
+
+def parse_batch_chapters(body) -> List[Tuple[Dict, Optional[Tuple[Dict, int]]]]:
+    """
+    解析批量章节请求体 {"items": [{"comic_id": "漫画ID", "chapter": 章节号}, ...]}
+
+    Returns:
+        (条目信息, 错误结果) 列表，条目合法时错误结果为None
+
+    Raises:
+        ValueError: 请求体或items格式不正确
+    """
+    entries = []
+    for i, item in enumerate(_batch_items(body)):
+        try:
+            comic_id, number = _batch_chapter(item)
+        except ValueError as e:
+            entries.append(({"index": i}, ({"error": str(e)}, 400)))
+            continue
+        entries.append(({"index": i, "comic_id": comic_id, "chapter": number}, None))
+    return entries
+
+
+def format_batch_line(meta: Dict, payload: Dict, status: int) -> bytes:
+    """批量结果的一行NDJSON，成功时结果放在data中，失败时带error"""
+    line = {**meta, "status": status}
+    if status == 200:
+        line["data"] = payload
+    else:
+        line["error"] = payload.get("error", "未知错误")
+    return (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def run_batch(jobs: List[Tuple[Dict, Any]]):
+    """
+    在线程池中并发执行批量条目，按完成顺序产出NDJSON行
+
+    Args:
+        jobs: (条目信息, 返回(响应数据, 状态码)的函数) 列表，
+            同时执行的条目数不超过 Config.BATCH_PARALLELISM；
+            已确定结果的条目（如参数不合法）直接给出(响应数据, 状态码)，最先输出
+    """
+    for meta, func in jobs:
+        if not callable(func):
+            yield format_batch_line(meta, *func)
+    remaining = ((meta, func) for meta, func in jobs if callable(func))
+    running = {}
+
+    def submit_next():
+        for meta, func in remaining:
+            running[run_in_context(batch_executor, func)] = meta
+            return
+
+    for _ in range(Config.BATCH_PARALLELISM):
+        submit_next()
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            meta = running.pop(future)
+            submit_next()
+            try:
+                payload, status = future.result()
+            except Exception as e:
+                payload, status = {"error": str(e)}, 500
+            yield format_batch_line(meta, payload, status)
+
+
+async def run_batch_async(jobs: List[Tuple[Dict, Any]]):
+    """run_batch 的异步版本，函数为协程函数"""
+    semaphore = asyncio.Semaphore(Config.BATCH_PARALLELISM)
+
+    async def run(meta: Dict, func):
+        if not callable(func):
+            return format_batch_line(meta, *func)
+        async with semaphore:
+            try:
+                payload, status = await func()
+            except Exception as e:
+                payload, status = {"error": str(e)}, 500
+        return format_batch_line(meta, payload, status)
+
+    for next_line in asyncio.as_completed([run(meta, func) for meta, func in jobs]):
+        yield await next_line
+
+
+def format_chapter_list(comic_id: str, entry, page: int, page_size: int) -> Dict:
+    """章节索引的分页结果"""
+    ordered = entry[2]
+    start = (page - 1) * page_size
+    return {
+        "comic_id": comic_id,
+        "page": page,
+        "page_size": page_size,
+        "total": len(ordered),
+        "has_more": start + page_size < len(ordered),
+        "chapters": ordered[start : start + page_size],
+    }
+
+
+CHAPTER_LIST_MAX_PAGE_SIZE = 500
+
+
+def parse_chapter_list_args(args) -> Tuple[int, int]:
+    """读取分页参数，非法时抛出ValueError"""
+    try:
+        page = int(args.get("page", 1))
+        page_size = int(args.get("page_size", 100))
+    except ValueError:
+        raise ValueError("分页参数必须是整数")
+    if page < 1 or page_size < 1:
+        raise ValueError("页码和每页数量必须大于0")
+    return page, min(page_size, CHAPTER_LIST_MAX_PAGE_SIZE)
+
+
+def format_chapter_images(target_chapter: Dict, images_data: Dict) -> Dict:
+    """转换为漫画源规范的章节图片格式"""
+    chapter_data = images_data.get("data", {})
+    pictures = chapter_data.get("picture", [])
+
+    images = []
+    for pic in pictures:
+        image = {"url": pic.get("url", "")}
+        if pic.get("slices"):
+            image["slices"] = pic["slices"]
+        images.append(image)
+
+    return {"title": target_chapter.get("title", ""), "images": images}
+
+
+def format_search_results(search_result: Dict, client_page: int) -> Dict:
+    """转换为漫画源规范的搜索结果格式"""
+    results = []
+    for comic in search_result.get("results", []):
+        results.append(
+            {
+                "comic_id": int(comic.get("comic_id", 0)),
+                "title": comic.get("title", ""),
+                "cover_url": comic.get("cover_url", ""),
+                "pages": 0,
+            }
+        )
+
+    return {
+        "page": search_result.get("page", client_page),
+        "has_more": search_result.get("has_more", False),
+        "results": results,
+    }
+
+
+UPSTREAM_GOVERNOR_EVENTS = ("requests", "retries", "throttled", "rejected", "opened")
+
+
+def upstream_governor_metrics() -> Dict[str, Dict]:
+    """
+    按主机汇总上游调控器的指标
+
+    图片代理的主机来自请求参数，已知上游以外的主机合并为other，
+    避免指标的标签值无限增长；other的熔断状态取其中最严重的
+    """
+    known = upstream_hosts()
+    result = {}
+    for host, state in upstream_governor.stats()["hosts"].items():
+        label = host if host in known else "other"
+        merged = result.setdefault(
+            label, {"breaker": 0, **{event: 0 for event in UPSTREAM_GOVERNOR_EVENTS}}
+        )
+        merged["breaker"] = max(
+            merged["breaker"], UpstreamGovernor.BREAKER_STATES[state["breaker"]]
+        )
+        for event in UPSTREAM_GOVERNOR_EVENTS:
+            merged[event] += state[event]
+    return result
+
+
+def render_metrics() -> str:
+    """Prometheus文本格式的指标：请求与阶段耗时直方图、缓存命中计数"""
+    lines = request_duration.render() + stage_duration.render()
+
+    caches = {
+        "comic_info": comic_info_cache.stats(),
+        "search_page": search_page_cache.stats(),
+        "search_result": search_result_cache.stats(),
+        "chapter_images": chapter_images_cache.stats(),
+        "chapter_index": chapter_index.stats(),
+    }
+    image = image_cache.stats()
+    caches["image"] = {
+        "hits": image["memory_hits"] + image["disk_hits"],
+        "misses": image["misses"],
+    }
+    for kind in ("hits", "misses"):
+        name = f"qqcomic_cache_{kind}_total"
+        lines.append(f"# HELP {name} 缓存{'命中' if kind == 'hits' else '未命中'}次数")
+        lines.append(f"# TYPE {name} counter")
+        for cache, stats in caches.items():
+            lines.append(f'{name}{{cache="{cache}"}} {stats[kind]}')
+
+    lines.append("# HELP qqcomic_nonce_evaluations_total nonce求值次数")
+    lines.append("# TYPE qqcomic_nonce_evaluations_total counter")
+    with _nonce_stats_lock:
+        for path, count in nonce_stats.items():
+            lines.append(f'qqcomic_nonce_evaluations_total{{path="{path}"}} {count}')
+
+    name = "qqcomic_comic_info_revalidation_total"
+    lines.append(f"# HELP {name} 漫画详情缓存返回旧结果及重新验证的次数")
+    lines.append(f"# TYPE {name} counter")
+    for event, count in comic_info_revalidation_stats().items():
+        lines.append(f'{name}{{event="{event}"}} {count}')
+
+    stale_caches = {
+        "comic_info": comic_info_cache,
+        "search_result": search_result_cache,
+        "chapter_images": chapter_images_cache,
+    }
+    name = "qqcomic_cache_stale_total"
+    lines.append(f"# HELP {name} 上游失败时返回已过期缓存的次数")
+    lines.append(f"# TYPE {name} counter")
+    for cache, instance in stale_caches.items():
+        lines.append(f'{name}{{cache="{cache}"}} {instance.stats()["stale_hits"]}')
+
+    governor = upstream_governor_metrics()
+    format_labels = Histogram._format_labels
+    name = "qqcomic_upstream_breaker_state"
+    lines.append(f"# HELP {name} 上游熔断状态：0关闭，1半开，2打开")
+    lines.append(f"# TYPE {name} gauge")
+    for host, state in governor.items():
+        labels = format_labels([("host", host)])
+        lines.append(f"{name}{labels} {state['breaker']}")
+    name = "qqcomic_upstream_governor_total"
+    lines.append(f"# HELP {name} 上游请求、重试、限流等待、直接拒绝和熔断打开的次数")
+    lines.append(f"# TYPE {name} counter")
+    for host, state in governor.items():
+        for event in UPSTREAM_GOVERNOR_EVENTS:
+            labels = format_labels([("host", host), ("event", event)])
+            lines.append(f"{name}{labels} {state[event]}")
+
+    name = "qqcomic_search_index_total"
+    index_stats = search_index.stats()
+    lines.append(f"# HELP {name} 本地搜索索引的查询次数及hybrid模式回退上游的次数")
+    lines.append(f"# TYPE {name} counter")
+    lines.append(f'{name}{{event="query"}} {index_stats["queries"]}')
+    lines.append(f'{name}{{event="fallback"}} {index_stats["fallbacks"]}')
+    return "\n".join(lines) + "\n"
+
+
+# Flask路由
+@app.before_request
+def start_request_timing():
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.request_timing = begin_request_timing(route)
+
+
+@app.after_request
+def add_server_timing(response: Response) -> Response:
+    state = g.pop("request_timing", None)
+    if state is None:
+        return response
+    if response.is_streamed:
+        response.call_on_close(end_streamed_request_timing(state, response.status_code))
+    else:
+        response.headers["Server-Timing"] = end_request_timing(
+            state, response.status_code
+        )
+    return response
+
+
+@app.teardown_request
+def finish_request_timing(exc):
+    # 未经过after_request（出现未处理异常）时结束计时
+    state = g.pop("request_timing", None)
+    if state is not None:
+        end_request_timing(state, 500)
+
+
+@app.get("/config")
+@app.get("/config/")
+def get_config():
+    """获取漫画源配置信息"""
+    api_url = request.host_url.rstrip("/")
+    config = {
+        "QQComic": {
+            "name": "腾讯动漫",
+            "apiUrl": api_url,
             "detailPath": "/comic/<id>",
             "photoPath": "/photo/<id>/chapter/<chapter>",
             "searchPath": "/search/<text>/<page>",
@@ -512,114 +3862,973 @@ def get_config():
     return jsonify(config)
 
 
-@app.route("/")
-def index():
-    return "it works!"
+@app.route("/")
+def index():
+    return "it works!"
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """缓存命中统计"""
+    return jsonify(
+        {
+            "comic_info": {
+                **comic_info_cache.stats(),
+                "fresh_ttl": Config.COMIC_INFO_CACHE_TTL,
+                "revalidation": comic_info_revalidation_stats(),
+            },
+            "image": image_cache.stats(),
+            "image_prefetch": image_prefetcher.stats(),
+            "image_workers": image_transform_pool.stats(),
+            "search_page": search_page_cache.stats(),
+            "search_result": {
+                **search_result_cache.stats(),
+                "top_queries": search_query_stats.top(Config.SEARCH_TOP_QUERIES),
+            },
+            "chapter_index": chapter_index.stats(),
+            "search_index": search_index.stats(),
+            "chapter_images": {
+                **chapter_images_cache.stats(),
+                **chapter_images_flight.stats(),
+            },
+        }
+    )
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus格式的指标"""
+    return Response(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/upstream/stats")
+def get_upstream_stats():
+    """上游连接池统计"""
+    return jsonify(
+        {
+            **upstream.stats(),
+            "async": async_upstream.stats(),
+            "governor": upstream_governor.stats(),
+        }
+    )
+
+
+@app.route("/comic/<comic_id>")
+@app.route("/comic/<comic_id>/")
+def get_comic_info(comic_id: str):
+    """获取漫画信息接口"""
+    payload, status = comic_detail_result(comic_id)
+    return jsonify(payload), status, retry_after_headers(payload, status)
+
+
+@app.get("/comic/<comic_id>/chapters")
+def get_chapter_list(comic_id: str):
+    """分页获取章节索引"""
+    if not is_comic_id(comic_id):
+        payload, status = invalid_comic_id_result()
+        return jsonify(payload), status
+    try:
+        page, page_size = parse_chapter_list_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        entry, error = load_chapter_index(comic_id)
+        if error:
+            return jsonify(error), 500
+        return jsonify(format_chapter_list(comic_id, entry, page, page_size))
+    except UpstreamUnavailableError as e:
+        payload, status = unavailable_result(e)
+        return jsonify(payload), status, retry_after_headers(payload, status)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/photo/<comic_id>/chapter/<int:chapter_number>", methods=["GET", "POST"])
+def get_specific_chapter(comic_id: str, chapter_number: int):
+    """获取特定章节图片信息"""
+    cookie = request.headers.get("Cookie") if request.headers.get("Cookie") else None
+    payload, status = chapter_images_result(
+        comic_id,
+        chapter_number,
+        cookie,
+        request.host_url,
+        request.headers.get("Accept", ""),
+    )
+    return jsonify(payload), status, retry_after_headers(payload, status)
+
+
+@app.post("/batch/comics")
+def batch_comics():
+    """批量获取漫画详情，按完成顺序以NDJSON流式返回"""
+    try:
+        entries = parse_batch_comics(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    jobs = [
+        (meta, error or functools.partial(comic_detail_result, meta["comic_id"]))
+        for meta, error in entries
+    ]
+    return Response(stream_in_context(run_batch(jobs)), mimetype="application/x-ndjson")
+
+
+@app.post("/batch/chapters")
+def batch_chapters():
+    """批量获取章节图片，按完成顺序以NDJSON流式返回"""
+    try:
+        entries = parse_batch_chapters(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cookie = request.headers.get("Cookie") or None
+    api_url = request.host_url
+    accept = request.headers.get("Accept", "")
+    jobs = [
+        (
+            meta,
+            error
+            or functools.partial(
+                chapter_images_result,
+                meta["comic_id"],
+                meta["chapter"],
+                cookie,
+                api_url,
+                accept,
+            ),
+        )
+        for meta, error in entries
+    ]
+    return Response(stream_in_context(run_batch(jobs)), mimetype="application/x-ndjson")
+
+
+@app.get("/search/<value>")
+@app.get("/search/<value>/")
+@app.get("/search/<value>/<int:client_page>")
+def search_comics(value: str = "", client_page: Optional[int] = 1):
+    """搜索漫画接口，source参数可选local、remote、hybrid"""
+    keyword = normalize_search_query(value)
+
+    if client_page < 1:
+        return jsonify({"error": "页码必须大于0"}), 400
+    source = request.args.get("source", Config.SEARCH_SOURCE)
+    if source not in SEARCH_SOURCES:
+        return jsonify({"error": f"不支持的搜索来源: {source}"}), 400
+
+    try:
+        search_result, used = comic_searcher.search(keyword, client_page, source)
+
+        if "error" in search_result:
+            return jsonify(search_result), 500
+
+        response = jsonify(format_search_results(search_result, client_page))
+        response.headers["X-Search-Source"] = used
+        return response
+
+    except Exception as e:
+        return jsonify({"error": f"搜索失败: {str(e)}"}), 500
+
+
+class ImageTooLargeError(ValueError):
+    """原图超过大小或像素限制"""
+
+
+IMAGE_UPSTREAM_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Referer": "https://ac.qq.com/",
+}
+
+
+def download_image(image_url: str, headers: Dict) -> Tuple[int, bytes]:
+    """
+    分块下载原图，超过 IMAGE_MAX_BYTES 时立即中止
+
+    完整的压缩数据仍会读入内存后才解码；解码阶段只有JPEG能用draft模式
+    少解码像素，见 _resize_image
+
+    Returns:
+        (状态码, 图片数据)，状态码不是200时数据为空
+    """
+    resp = upstream.get(image_url, headers=headers, timeout=30, stream=True)
+    try:
+        if resp.status_code != 200:
+            return resp.status_code, b""
+
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > Config.IMAGE_MAX_BYTES:
+            raise ImageTooLargeError(f"原图超过 {Config.IMAGE_MAX_BYTES} 字节")
+
+        buffer = bytearray()
+        with timed("upstream"):
+            for chunk in resp.iter_content(chunk_size=64 * 1024):
+                buffer += chunk
+                if len(buffer) > Config.IMAGE_MAX_BYTES:
+                    raise ImageTooLargeError(f"原图超过 {Config.IMAGE_MAX_BYTES} 字节")
+        return resp.status_code, bytes(buffer)
+    finally:
+        resp.close()
+
+
+# 输出格式 -> (PIL格式名, MIME类型)
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+}
+IMAGE_FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+async def download_image_async(image_url: str, headers: Dict) -> Tuple[int, bytes]:
+    """download_image 的异步版本"""
+    async with async_upstream.stream(image_url, headers=headers, timeout=30) as resp:
+        if resp.status_code != 200:
+            return resp.status_code, b""
+
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > Config.IMAGE_MAX_BYTES:
+            raise ImageTooLargeError(f"原图超过 {Config.IMAGE_MAX_BYTES} 字节")
+
+        buffer = bytearray()
+        with timed("upstream"):
+            async for chunk in resp.aiter_bytes(chunk_size=64 * 1024):
+                buffer += chunk
+                if len(buffer) > Config.IMAGE_MAX_BYTES:
+                    raise ImageTooLargeError(f"原图超过 {Config.IMAGE_MAX_BYTES} 字节")
+        return resp.status_code, bytes(buffer)
+
+
+def _image_format_supported(fmt: str) -> bool:
+    if fmt == "jpeg":
+        return True
+    try:
+        from PIL import features
+
+        return bool(features.check(fmt))
+    except Exception:
+        return False
+
+
+def _accepted_types(accept: str) -> set:
+    """解析Accept头，返回q值大于0的媒体类型"""
+    accepted = set()
+    for item in accept.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(parts[0].lower())
+    return accepted
+
+
+def negotiate_image_format(explicit: Optional[str], accept: str) -> str:
+    """
+    选择图片输出格式
+
+    Args:
+        explicit: format参数，优先使用
+        accept: 请求的Accept头
+
+    Returns:
+        jpeg、webp或avif，显式指定不支持的格式时抛出ValueError
+    """
+    if explicit:
+        fmt = explicit.strip().lower()
+        fmt = IMAGE_FORMAT_ALIASES.get(fmt, fmt)
+        if fmt not in IMAGE_FORMATS or not _image_format_supported(fmt):
+            raise ValueError(f"不支持的图片格式: {explicit}")
+        return fmt
+
+    accepted = _accepted_types(accept or "")
+    for fmt in Config.IMAGE_NEGOTIATED_FORMATS:
+        if (
+            fmt in IMAGE_FORMATS
+            and IMAGE_FORMATS[fmt][1] in accepted
+            and _image_format_supported(fmt)
+        ):
+            return fmt
+    return "jpeg"
+
+
+def prefetch_image_format(accept: str) -> str:
+    """
+    选择预取的输出格式
+
+    章节列表请求的Accept通常是 */* 或 application/json，不代表随后请求图片时
+    的Accept；其中没有图片类型时，按浏览器请求图片时协商出的格式预取，
+    即 IMAGE_NEGOTIATED_FORMATS 中第一个可用的格式
+    """
+    if Config.IMAGE_PREFETCH_FORMAT:
+        return negotiate_image_format(Config.IMAGE_PREFETCH_FORMAT, accept)
+    if "image/" not in (accept or ""):
+        accept = ",".join(IMAGE_FORMATS[fmt][1] for fmt in IMAGE_FORMATS)
+    return negotiate_image_format(None, accept)
+
+
+def _resize_image(content: bytes, target_width: int) -> "Image.Image":
+    """解码原图并缩放到目标宽度，透明图片转为白底RGB"""
+    from PIL import Image
+
+    # Image.open只读取文件头，尺寸检查在解码之前完成
+    original_image = Image.open(BytesIO(content))
+    width, height = original_image.size
+    if width * height > Config.IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(f"原图像素超过 {Config.IMAGE_MAX_PIXELS}")
+
+    # 计算新高度，保持宽高比
+    width_percent = target_width / float(width)
+    target_height = max(1, int(float(height) * float(width_percent)))
+    if target_width * target_height > Config.IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(f"输出图片像素超过 {Config.IMAGE_MAX_PIXELS}")
+
+    if original_image.format == "JPEG" and target_width < width:
+        # JPEG在解码时按1/2、1/4、1/8缩小，不必先解出完整尺寸，
+        # 缩小后的尺寸不会小于目标尺寸，所以原图宽度不足目标的2倍时不起作用；
+        # 其他格式没有这种解码方式，仍完整解码
+        original_image.draft(None, (target_width, target_height))
+
+    with timed("image_decode"):
+        original_image.load()
+
+    with timed("image_resize"):
+        # 调整图片尺寸，大倍数缩小时先用reduce整数倍降采样
+        gap = Config.IMAGE_REDUCING_GAP
+        resized_image = original_image.resize(
+            (target_width, target_height),
+            Image.Resampling.LANCZOS,
+            reducing_gap=gap if gap > 1 else None,
+        )
+
+        if original_image.mode in ("RGBA", "LA", "P"):
+            # 如果图片有透明度，转换为RGB
+            background = Image.new("RGB", resized_image.size, (255, 255, 255))
+            background.paste(
+                resized_image,
+                mask=(
+                    resized_image.split()[-1] if resized_image.mode == "RGBA" else None
+                ),
+            )
+            resized_image = background
+    return resized_image
+
+
+def _encode_image(image: "Image.Image", quality: int, fmt: str) -> bytes:
+    """按输出格式编码并调整质量"""
+    output_buffer = BytesIO()
+    with timed("image_encode"):
+        if fmt == "jpeg":
+            image.save(output_buffer, format="JPEG", quality=quality, optimize=True)
+        else:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(output_buffer, format=IMAGE_FORMATS[fmt][0], quality=quality)
+    return output_buffer.getvalue()
 
 
-@app.route("/comic/<comic_id>")
-@app.route("/comic/<comic_id>/")
-def get_comic_info(comic_id: str):
-    """获取漫画信息接口"""
+def transform_image(
+    content: bytes, target_width: int, quality: int, fmt: str = "jpeg"
+) -> bytes:
+    """按目标宽度缩放图片并重新编码为指定格式"""
+    return _encode_image(_resize_image(content, target_width), quality, fmt)
+
+
+def clamp_image_width(width: int) -> int:
+    """把width参数限制在1到 IMAGE_MAX_WIDTH 之间"""
+    return max(1, min(width, Config.IMAGE_MAX_WIDTH))
+
+
+class ImageRegionError(ValueError):
+    """分段参数无效或超出图片范围"""
+
+
+def _region_arg(args, name: str) -> Optional[int]:
+    value = args.get(name)
+    if value is None or value == "":
+        return None
     try:
-        info = ComicParser.get_comic_info(comic_id)
-        if "error" in info:
-            return jsonify(info), 500
-        
-        result = {
-            "item_id": int(comic_id),
-            "name": info.get("title", ""),
-            "page_count": 0,
-            "views": info.get("popularity", "0"),
-            "rate": float(info.get("rating", {}).get("score", "0")),
-            "cover": info.get("cover_url", ""),
-            "tags": info.get("tags", []),
-            "total_chapters": info.get("total_chapters", 0)
-        }
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return int(value)
+    except ValueError:
+        raise ImageRegionError(f"{name} 需为整数")
 
 
-@app.route("/photo/<comic_id>/chapter/<int:chapter_number>", methods=["GET", "POST"])
-def get_specific_chapter(comic_id: str, chapter_number: int):
-    """获取特定章节图片信息"""
-    cookie = (
-        request.headers.get("Cookie")
-        if request.headers.get("Cookie")
-        else None
+def parse_image_region(args) -> Tuple[str, int]:
+    """
+    解析图片代理的分段参数
+
+    slices=N&slice=i 把缩放后的图片等分为N段并返回第i段（从0开始），
+    y0=起始行&y1=结束行 返回缩放后图片的一段像素范围，y1省略时到底部
+
+    Returns:
+        (分段方式, 段序号)，分段方式为 "slices=N" 或 "y=起始-结束"，
+        不分段时为 ("", 0)
+    """
+    slices = _region_arg(args, "slices")
+    if slices is not None:
+        index = _region_arg(args, "slice") or 0
+        if not 1 <= slices <= Config.IMAGE_MAX_SLICES:
+            raise ImageRegionError(f"slices 需在 1 到 {Config.IMAGE_MAX_SLICES} 之间")
+        if not 0 <= index < slices:
+            raise ImageRegionError("slice 超出范围")
+        return ("", 0) if slices == 1 else (f"slices={slices}", index)
+
+    top, bottom = _region_arg(args, "y0"), _region_arg(args, "y1")
+    if top is None and bottom is None:
+        return "", 0
+    top = top or 0
+    if top < 0 or (bottom is not None and bottom <= top):
+        raise ImageRegionError("y0 需不小于0且小于 y1")
+    return f"y={top}-{'' if bottom is None else bottom}", 0
+
+
+def region_boxes(layout: str, height: int) -> List[Tuple[int, int]]:
+    """按分段方式计算各段在缩放后图片中的 (起始行, 结束行)"""
+    kind, _, value = layout.partition("=")
+    if kind == "slices":
+        slices = int(value)
+        return [
+            (height * i // slices, height * (i + 1) // slices) for i in range(slices)
+        ]
+    top, _, bottom = value.partition("-")
+    top, bottom = int(top), min(int(bottom or height), height)
+    if top >= height:
+        raise ImageRegionError(f"y0 超出图片高度 {height}")
+    return [(top, bottom)]
+
+
+def transform_image_regions(
+    content: bytes, target_width: int, quality: int, fmt: str, layout: str
+) -> List[bytes]:
+    """
+    缩放图片后按分段方式切成横条，分别编码
+
+    所有分段只解码和缩放一次
+
+    Returns:
+        各段编码后的图片，顺序与 region_boxes 相同
+    """
+    resized_image = _resize_image(content, target_width)
+    width, height = resized_image.size
+    return [
+        _encode_image(resized_image.crop((0, top, width, bottom)), quality, fmt)
+        for top, bottom in region_boxes(layout, height)
+    ]
+
+
+def _run_in_worker(func, *args) -> Tuple[Any, Dict[str, float]]:
+    """在子进程中执行图片处理函数，连同各阶段耗时一起返回"""
+    _request_timings.set({})
+    result = func(*args)
+    return result, _request_timings.get()
+
+
+def _watch_parent(parent_pid: int):
+    """子进程初始化：服务进程退出后结束子进程"""
+
+    def watch():
+        # 服务进程被信号终止时不会通知子进程，子进程会一直等待任务
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch, name="qqcomic-parent-watch", daemon=True).start()
+
+
+class ImageWorkersBusyError(RuntimeError):
+    """图片处理队列已满"""
+
+
+class ImageTransformPool:
+    """
+    图片缩放编码进程池
+
+    LANCZOS缩放和JPEG优化编码会长时间持有GIL，放到子进程中执行，
+    避免阻塞同一进程中的其他请求。等待和处理中的任务超过上限时拒绝新任务，
+    子进程处理一定数量的任务后由进程池重建
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.IMAGE_WORKERS,
+        queue_size: int = Config.IMAGE_QUEUE_SIZE,
+        max_tasks: int = Config.IMAGE_WORKER_MAX_TASKS,
+    ):
+        self.workers = workers
+        self.queue_size = max(queue_size, 1)
+        self.max_tasks = max_tasks
+        self.enabled = workers > 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        # 调用方需持有锁
+        if self._executor is None and self.enabled:
+            kwargs = {}
+            # max_tasks_per_child 需要 Python 3.11，且不能使用fork启动
+            if self.max_tasks > 0 and sys.version_info >= (3, 11):
+                kwargs["max_tasks_per_child"] = self.max_tasks
+            try:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_watch_parent,
+                    initargs=(os.getpid(),),
+                    **kwargs,
+                )
+            except (OSError, ImportError, NotImplementedError) as e:
+                # 缺少/dev/shm等情况下无法创建进程池，退回到请求线程中处理
+                logging.warning(f"图片处理进程池不可用: {str(e)}")
+                self.enabled = False
+        return self._executor
+
+    def _submit(self, func, args: Tuple, limit: int) -> Optional[Future]:
+        with self._lock:
+            executor = self._get_executor()
+            if executor is None:
+                return None
+            if self._pending >= limit:
+                self.rejected += 1
+                raise ImageWorkersBusyError("图片处理队列已满")
+            self._pending += 1
+        try:
+            future = executor.submit(_run_in_worker, func, *args)
+        except BrokenProcessPool:
+            self._task_done(executor, None)
+            raise
+        future.add_done_callback(functools.partial(self._task_done, executor))
+        return future
+
+    def _task_done(self, executor: ProcessPoolExecutor, future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+            if future is None:
+                error = BrokenProcessPool()
+            elif future.cancelled():
+                # 等待结果的协程被取消，排队中的任务随之取消
+                return
+            else:
+                error = future.exception()
+            if error is None:
+                self.completed += 1
+                return
+            self.failed += 1
+            if isinstance(error, BrokenProcessPool) and self._executor is executor:
+                # 子进程异常退出后进程池不可再用，下次提交时重建
+                self._executor = None
+                self.restarts += 1
+                executor.shutdown(wait=False)
+
+    def _limit(self, background: bool) -> int:
+        # 后台任务只使用一半队列，留出空间给用户请求
+        return max(self.queue_size // 2, 1) if background else self.queue_size
+
+    @staticmethod
+    def _record(timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            record_stage(stage, seconds)
+
+    def run(self, func, *args, background: bool = False):
+        """
+        执行 transform_image 等图片处理函数
+
+        Args:
+            func: 模块级函数，参数和返回值需可序列化
+            background: 是否为预取等后台任务
+
+        Returns:
+            func 的返回值，队列已满时抛出ImageWorkersBusyError
+        """
+        future = self._submit(func, args, self._limit(background))
+        if future is None:
+            return func(*args)
+        result, timings = future.result()
+        self._record(timings)
+        return result
+
+    async def run_async(self, func, *args):
+        """run 的异步版本，未启用进程池时在CPU线程池中处理"""
+        future = self._submit(func, args, self._limit(False))
+        if future is None:
+            return await run_cpu_bound(func, *args)
+        result, timings = await asyncio.wrap_future(future)
+        self._record(timings)
+        return result
+
+    def shutdown(self):
+        """结束子进程，未开始的任务被取消"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "pending": self._pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+            }
+
+
+image_transform_pool = ImageTransformPool()
+
+
+def process_image(
+    cache_key: str,
+    image_url: str,
+    target_width: int,
+    quality: int,
+    fmt: str,
+    background: bool = False,
+) -> Tuple[int, bytes]:
+    """
+    下载并处理原图，写入图片缓存
+
+    Returns:
+        (上游状态码, 处理后的图片)，状态码不是200时图片为空
+    """
+    status_code, content = download_image(image_url, IMAGE_UPSTREAM_HEADERS)
+    if status_code != 200:
+        return status_code, b""
+    output = image_transform_pool.run(
+        transform_image, content, target_width, quality, fmt, background=background
     )
-    print(f"使用的Cookie: {cookie}")
-    try:
-        comic_info = ComicParser.get_comic_info(comic_id)
-        if "error" in comic_info:
-            return jsonify(comic_info), 500
-
-        target_chapter = None
-        for chapter in comic_info["chapters"]:
-            if chapter["number"] == chapter_number:
-                target_chapter = chapter
-                break
+    image_cache.set(cache_key, output, len(content))
+    return status_code, output
 
-        if not target_chapter:
-            return jsonify({"error": f"未找到第 {chapter_number} 章"}), 404
 
-        images_data = ComicParser.get_chapter_images(target_chapter["link"], cookie)
-        print(f"漫画名称: {comic_info['title']}")
+async def process_image_async(
+    cache_key: str, image_url: str, target_width: int, quality: int, fmt: str
+) -> Tuple[int, bytes]:
+    """process_image 的异步版本"""
+    status_code, content = await download_image_async(image_url, IMAGE_UPSTREAM_HEADERS)
+    if status_code != 200:
+        return status_code, b""
+    output = await image_transform_pool.run_async(
+        transform_image, content, target_width, quality, fmt
+    )
+    await run_cpu_bound(image_cache.set, cache_key, output, len(content))
+    return status_code, output
 
-        if not images_data.get("success"):
-            return jsonify({"error": images_data.get("error", "获取图片失败")}), 500
 
-        chapter_data = images_data.get("data", {})
-        pictures = chapter_data.get("picture", [])
+def _cache_regions(
+    image_url: str,
+    target_width: int,
+    quality: int,
+    fmt: str,
+    layout: str,
+    outputs: List[bytes],
+    source_bytes: int,
+):
+    for index, output in enumerate(outputs):
+        key = ImageCache.make_key(image_url, target_width, quality, fmt, layout, index)
+        image_cache.set(key, output, source_bytes // len(outputs))
 
-        images = []
-        for pic in pictures:
-            images.append({"url": pic.get("url", "")})
 
-        result = {
-            "title": target_chapter.get("title", ""),
-            "images": images
-        }
-        return jsonify(result)
+def process_image_regions(
+    image_url: str, target_width: int, quality: int, fmt: str, layout: str
+) -> Tuple[int, List[bytes]]:
+    """
+    下载原图，按分段方式切成横条并全部写入图片缓存
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    同一张图片的其他分段随后直接命中缓存，不再下载和解码原图
 
+    Returns:
+        (上游状态码, 各段图片)，状态码不是200时列表为空
+    """
+    status_code, content = download_image(image_url, IMAGE_UPSTREAM_HEADERS)
+    if status_code != 200:
+        return status_code, []
+    outputs = image_transform_pool.run(
+        transform_image_regions, content, target_width, quality, fmt, layout
+    )
+    _cache_regions(image_url, target_width, quality, fmt, layout, outputs, len(content))
+    return status_code, outputs
 
-@app.get("/search/<value>")
-@app.get("/search/<value>/")
-@app.get("/search/<value>/<int:client_page>")
-def search_comics(value: str = "", client_page: Optional[int] = 1):
-    """搜索漫画接口"""
-    keyword = decode_search_value(value)
 
-    if client_page < 1:
-        return jsonify({"error": "页码必须大于0"}), 400
+async def process_image_regions_async(
+    image_url: str, target_width: int, quality: int, fmt: str, layout: str
+) -> Tuple[int, List[bytes]]:
+    """process_image_regions 的异步版本"""
+    status_code, content = await download_image_async(image_url, IMAGE_UPSTREAM_HEADERS)
+    if status_code != 200:
+        return status_code, []
+    outputs = await image_transform_pool.run_async(
+        transform_image_regions, content, target_width, quality, fmt, layout
+    )
+    await run_cpu_bound(
+        _cache_regions,
+        image_url,
+        target_width,
+        quality,
+        fmt,
+        layout,
+        outputs,
+        len(content),
+    )
+    return status_code, outputs
 
-    try:
-        search_result = comic_searcher.search_comics_direct(keyword, client_page)
-        
-        if "error" in search_result:
-            return jsonify(search_result), 500
 
-        results = []
-        for comic in search_result.get("results", []):
-            results.append({
-                "comic_id": int(comic.get("comic_id", 0)),
-                "title": comic.get("title", ""),
-                "cover_url": comic.get("cover_url", ""),
-                "pages": 0
-            })
+# 图片代理与预取共用，同一张图片同时只处理一次；
+# 分段请求以 (原图, 宽度, 质量, 格式, 分段方式) 为键，同一图片的各段共享一次处理
+image_flight = SingleFlight()
 
-        return jsonify({
-            "page": search_result.get("page", client_page),
-            "has_more": search_result.get("has_more", False),
-            "results": results
-        })
 
-    except Exception as e:
-        return jsonify({"error": f"搜索失败: {str(e)}"}), 500
+class ImagePrefetcher:
+    """
+    章节图片预取
+
+    章节图片列表返回后，把图片放入有界队列，由后台线程下载、处理并写入图片缓存；
+    每个图片主机的并发数单独限制
+    """
+
+    # 记录已预取、尚未被请求的缓存键数量上限
+    _MAX_TRACKED = 8192
+
+    def __init__(
+        self,
+        enabled: bool = Config.IMAGE_PREFETCH,
+        workers: int = Config.IMAGE_PREFETCH_WORKERS,
+        per_host: int = Config.IMAGE_PREFETCH_PER_HOST,
+        queue_size: int = Config.IMAGE_PREFETCH_QUEUE_SIZE,
+    ):
+        self.enabled = enabled
+        self.workers = workers
+        self.per_host = per_host
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._host_slots = {}
+        self._pending = set()
+        self._prefetched = OrderedDict()
+        self.enqueued = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.used = 0
+
+    def _ensure_workers(self):
+        # 调用方需持有锁
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"qqcomic-prefetch-{len(self._threads)}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception as e:
+                logging.warning(f"预取失败: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _submit(self, func, *args) -> bool:
+        with self._lock:
+            self._ensure_workers()
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_host)
+                self._host_slots[host] = slot
+            return slot
+
+    def prefetch_images(self, urls: List[str], fmt: str):
+        """把未缓存的图片加入预取队列"""
+        for url in urls:
+            key = ImageCache.make_key(
+                url, Config.IMAGE_DEFAULT_WIDTH, Config.IMAGE_DEFAULT_QUALITY, fmt
+            )
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending.add(key)
+            if image_cache.contains(key):
+                with self._lock:
+                    self._pending.discard(key)
+                    self.skipped += 1
+                continue
+            if self._submit(self._prefetch_image, key, url, fmt):
+                with self._lock:
+                    self.enqueued += 1
+            else:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _prefetch_image(self, key: str, url: str, fmt: str):
+        try:
+            with self._host_slot(url):
+                status_code, _ = image_flight.do(
+                    key,
+                    process_image,
+                    key,
+                    url,
+                    Config.IMAGE_DEFAULT_WIDTH,
+                    Config.IMAGE_DEFAULT_QUALITY,
+                    fmt,
+                    True,
+                )
+            with self._lock:
+                if status_code == 200:
+                    self.completed += 1
+                    self._prefetched[key] = True
+                    while len(self._prefetched) > self._MAX_TRACKED:
+                        self._prefetched.popitem(last=False)
+                else:
+                    self.failed += 1
+        except ImageWorkersBusyError:
+            # 图片处理繁忙时放弃预取
+            with self._lock:
+                self.dropped += 1
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _prefetch_chapter(
+        self, comic_id: str, chapter: Dict, cookie: Optional[str], fmt: str
+    ):
+        images_data = load_chapter_images(comic_id, chapter, cookie)
+        if images_data.get("success"):
+            self.prefetch_images(self._picture_urls(images_data), fmt)
+
+    @staticmethod
+    def _picture_urls(images_data: Dict) -> List[str]:
+        pictures = images_data.get("data", {}).get("picture", [])
+        return [pic["url"] for pic in pictures if pic.get("url")]
+
+    def schedule_chapter(
+        self,
+        comic_id: str,
+        chapters: Dict[int, Dict],
+        chapter: Dict,
+        images_data: Dict,
+        cookie: Optional[str],
+        accept: str,
+    ):
+        """
+        章节图片列表返回后调用，预取本章（以及下一章）的图片
+
+        Args:
+            comic_id: 漫画ID
+            chapters: 章节索引 {章节号: 章节}
+            chapter: 当前章节
+            images_data: 当前章节未改写的图片数据
+            cookie: 请求的Cookie，下一章使用同样的登录态获取
+            accept: 请求的Accept头，用于确定预取的输出格式
+        """
+        if not self.enabled:
+            return
+        try:
+            fmt = prefetch_image_format(accept)
+        except ValueError:
+            fmt = "jpeg"
+        self.prefetch_images(self._picture_urls(images_data), fmt)
+
+        if Config.IMAGE_PREFETCH_NEXT_CHAPTER:
+            next_chapter = chapters.get(chapter["number"] + 1)
+            if next_chapter is not None:
+                self._submit(
+                    self._prefetch_chapter, comic_id, next_chapter, cookie, fmt
+                )
+
+    def record_hit(self, key: str):
+        """图片代理命中缓存时调用，统计预取结果被使用的次数"""
+        with self._lock:
+            if self._prefetched.pop(key, None) is not None:
+                self.used += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "per_host": self.per_host,
+                "queue_depth": self._queue.qsize(),
+                "in_flight": len(self._pending),
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "completed": self.completed,
+                "failed": self.failed,
+                "used": self.used,
+                "hit_ratio": (
+                    round(self.used / self.completed, 4) if self.completed else 0.0
+                ),
+            }
+
+
+image_prefetcher = ImagePrefetcher()
+
+
+def _etag_matches(etag: str, header: str) -> bool:
+    """判断客户端的If-None-Match是否包含当前ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def image_response_headers(etag: str, args) -> Dict:
+    """
+    图片代理响应的缓存头
+
+    URL写明了宽度和质量时（get_proxy_image_url 生成的URL），相同URL的内容不会变化，
+    允许浏览器和CDN长期缓存；否则默认值可能随配置改变，只缓存1天
+    """
+    max_age = Config.IMAGE_CACHE_MAX_AGE
+    if "width" in args and "quality" in args and max_age > 0:
+        cache_control = f"public, max-age={max_age}, s-maxage={max_age}, immutable"
+    else:
+        cache_control = "public, max-age=86400"  # 缓存1天
+    return {
+        "Cache-Control": cache_control,
+        "ETag": etag,
+        "Vary": "Accept",
+    }
 
 
 # 在Flask路由部分添加图片代理接口
@@ -630,65 +4839,489 @@ def image_proxy():
         image_url = request.args.get("url")
         if not image_url:
             return jsonify({"error": "缺少url参数"}), 400
+        if not image_url_signed(request.args):
+            return jsonify({"error": "图片签名无效或图片主机不受支持"}), 403
 
         # 设置目标宽度和图片质量
-        target_width = int(request.args.get("width", 600))
-        quality = int(request.args.get("quality", 50))
-
-        # 下载原始图片
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Referer": "https://ac.qq.com/",
-        }
-
-        resp = requests.get(image_url, headers=headers, timeout=30)
-        if resp.status_code != 200:
-            return jsonify({"error": f"图片下载失败: {resp.status_code}"}), 500
-
-        # 处理图片
-        original_image = Image.open(BytesIO(resp.content))
-
-        # 计算新高度，保持宽高比
-        width_percent = target_width / float(original_image.size[0])
-        target_height = int(float(original_image.size[1]) * float(width_percent))
+        target_width = clamp_image_width(
+            int(request.args.get("width", Config.IMAGE_DEFAULT_WIDTH))
+        )
+        quality = int(request.args.get("quality", Config.IMAGE_DEFAULT_QUALITY))
+        try:
+            image_format = negotiate_image_format(
+                request.args.get("format"), request.headers.get("Accept", "")
+            )
+            layout, region_index = parse_image_region(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # 调整图片尺寸
-        resized_image = original_image.resize(
-            (target_width, target_height), Image.Resampling.LANCZOS
+        cache_key = ImageCache.make_key(
+            image_url, target_width, quality, image_format, layout, region_index
         )
+        etag = f'"{cache_key[:32]}"'
+        cache_headers = image_response_headers(etag, request.args)
 
-        # 保存为JPEG格式并调整质量
-        output_buffer = BytesIO()
-        if original_image.mode in ("RGBA", "LA", "P"):
-            # 如果图片有透明度，转换为RGB
-            background = Image.new("RGB", resized_image.size, (255, 255, 255))
-            background.paste(
-                resized_image,
-                mask=(
-                    resized_image.split()[-1] if resized_image.mode == "RGBA" else None
-                ),
-            )
-            resized_image = background
+        # 相同参数处理出的图片相同，客户端已有时直接返回304
+        if _etag_matches(etag, request.headers.get("If-None-Match", "")):
+            image_cache.mark_not_modified()
+            return Response(status=304, headers=cache_headers)
 
-        resized_image.save(output_buffer, format="JPEG", quality=quality, optimize=True)
-        output_buffer.seek(0)
+        output = image_cache.get(cache_key)
+        cache_status = "HIT"
+        if output is None:
+            cache_status = "MISS"
+            if layout:
+                # 同一图片的各段并发请求时只下载和解码一次
+                status_code, outputs = image_flight.do(
+                    (image_url, target_width, quality, image_format, layout),
+                    process_image_regions,
+                    image_url,
+                    target_width,
+                    quality,
+                    image_format,
+                    layout,
+                )
+                output = outputs[region_index] if status_code == 200 else b""
+            else:
+                # 下载并处理原始图片，与正在进行的预取合并
+                status_code, output = image_flight.do(
+                    cache_key,
+                    process_image,
+                    cache_key,
+                    image_url,
+                    target_width,
+                    quality,
+                    image_format,
+                )
+            if status_code != 200:
+                return jsonify({"error": f"图片下载失败: {status_code}"}), 500
+        else:
+            image_prefetcher.record_hit(cache_key)
 
         # 返回处理后的图片
         return Response(
-            output_buffer.getvalue(),
-            mimetype="image/jpeg",
+            output,
+            mimetype=IMAGE_FORMATS[image_format][1],
             headers={
-                "Cache-Control": "public, max-age=86400",  # 缓存1天
+                **cache_headers,
                 "Content-Disposition": "inline",
+                "X-Cache": cache_status,
             },
         )
 
+    except ImageTooLargeError as e:
+        return jsonify({"error": f"图片过大: {str(e)}"}), 413
+    except ImageRegionError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImageWorkersBusyError as e:
+        return (
+            jsonify({"error": str(e)}),
+            503,
+            {"Retry-After": str(Config.IMAGE_RETRY_AFTER)},
+        )
+    except UpstreamUnavailableError as e:
+        return (
+            jsonify({"error": str(e)}),
+            503,
+            {"Retry-After": str(math.ceil(e.retry_after))},
+        )
     except Exception as e:
         logging.error(f"图片处理失败: {str(e)}")
         return jsonify({"error": f"图片处理失败: {str(e)}"}), 500
 
 
+class AsyncRequest:
+    """原生ASGI请求的最小封装"""
+
+    def __init__(self, scope: Dict, receive=None):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {
+            key.decode("latin-1").lower(): value.decode("latin-1")
+            for key, value in scope.get("headers", [])
+        }
+        self.args = {
+            key: values[0]
+            for key, values in parse_qs(
+                scope.get("query_string", b"").decode("latin-1"),
+                keep_blank_values=True,
+            ).items()
+        }
+
+    async def body(self) -> bytes:
+        chunks = []
+        while True:
+            message = await self.receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def json(self):
+        """与Flask的get_json(silent=True)一致，不是JSON时返回None"""
+        content_type = self.headers.get("content-type", "").split(";")[0].strip()
+        if content_type != "application/json" and not (
+            content_type.startswith("application/") and content_type.endswith("+json")
+        ):
+            return None
+        try:
+            return json.loads(await self.body())
+        except ValueError:
+            return None
+
+    @property
+    def host_url(self) -> str:
+        scheme = self.scope.get("scheme", "http")
+        host = self.headers.get("host")
+        if not host:
+            server = self.scope.get("server") or ("localhost", None)
+            host = server[0] if server[1] is None else f"{server[0]}:{server[1]}"
+        return f"{scheme}://{host}{self.scope.get('root_path', '')}/"
+
+
+class AsyncComicApp:
+    """
+    原生ASGI入口
+
+    详情、章节、搜索和图片代理使用异步上游客户端处理，等待上游时不占用线程；
+    其余路由仍交给Flask应用
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._fallback = None
+        # (路径正则, 方法, 处理函数, 指标中的路由名，与Flask路由规则一致)
+        self.routes = [
+            (
+                re.compile(r"/comic/(?P<comic_id>[^/]+)/?"),
+                ("GET",),
+                self.comic_info,
+                "/comic/<comic_id>",
+            ),
+            (
+                re.compile(r"/comic/(?P<comic_id>[^/]+)/chapters"),
+                ("GET",),
+                self.chapter_list,
+                "/comic/<comic_id>/chapters",
+            ),
+            (
+                re.compile(
+                    r"/photo/(?P<comic_id>[^/]+)/chapter/(?P<chapter_number>\d+)"
+                ),
+                ("GET", "POST"),
+                self.chapter,
+                "/photo/<comic_id>/chapter/<int:chapter_number>",
+            ),
+            (
+                re.compile(r"/search/(?P<value>[^/]+)(?:/|/(?P<client_page>\d+))?"),
+                ("GET",),
+                self.search,
+                "/search/<value>/<int:client_page>",
+            ),
+            (
+                re.compile(r"/image/proxy"),
+                ("GET",),
+                self.image_proxy,
+                "/image/proxy",
+            ),
+            (
+                re.compile(r"/batch/comics"),
+                ("POST",),
+                self.batch_comics,
+                "/batch/comics",
+            ),
+            (
+                re.compile(r"/batch/chapters"),
+                ("POST",),
+                self.batch_chapters,
+                "/batch/chapters",
+            ),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "http":
+            for pattern, methods, handler, route in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match and scope["method"] in methods:
+                    timing = begin_request_timing(route)
+                    try:
+                        status, headers, body = await handler(
+                            AsyncRequest(scope, receive), **match.groupdict()
+                        )
+                    except BaseException:
+                        end_request_timing(timing, 500)
+                        raise
+                    if isinstance(body, bytes):
+                        headers = {
+                            **headers,
+                            "Server-Timing": end_request_timing(timing, status),
+                        }
+                        await self._send(send, status, headers, body)
+                    else:
+                        finish = end_streamed_request_timing(timing, status)
+                        try:
+                            await self._send_stream(send, status, headers, body)
+                        finally:
+                            finish()
+                    return
+        if self._fallback is None:
+            from asgiref.wsgi import WsgiToAsgi
+
+            self._fallback = WsgiToAsgi(self.wsgi_app)
+        await self._fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await async_upstream.aclose()
+                image_transform_pool.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _send(send, status: int, headers: Dict, body: bytes):
+        raw_headers = [
+            (key.lower().encode("latin-1"), str(value).encode("latin-1"))
+            for key, value in headers.items()
+        ]
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send(
+            {"type": "http.response.start", "status": status, "headers": raw_headers}
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_stream(send, status: int, headers: Dict, chunks):
+        """逐块发送响应体，chunks为异步迭代器"""
+        raw_headers = [
+            (key.lower().encode("latin-1"), str(value).encode("latin-1"))
+            for key, value in headers.items()
+        ]
+        await send(
+            {"type": "http.response.start", "status": status, "headers": raw_headers}
+        )
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    def _json(payload, status: int = 200) -> Tuple[int, Dict, bytes]:
+        # 与Flask的jsonify输出保持一致
+        with timed("serialize"):
+            body = json.dumps(
+                payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+            )
+        return status, {"Content-Type": "application/json"}, (body + "\n").encode()
+
+    def _result(self, payload: Dict, status: int) -> Tuple[int, Dict, bytes]:
+        # (响应数据, 状态码) 形式的结果，上游不可用时带Retry-After
+        status, headers, body = self._json(payload, status)
+        headers.update(retry_after_headers(payload, status))
+        return status, headers, body
+
+    async def comic_info(self, req: AsyncRequest, comic_id: str):
+        payload, status = await comic_detail_result_async(comic_id)
+        return self._result(payload, status)
+
+    async def chapter_list(self, req: AsyncRequest, comic_id: str):
+        if not is_comic_id(comic_id):
+            return self._json(*invalid_comic_id_result())
+        try:
+            page, page_size = parse_chapter_list_args(req.args)
+        except ValueError as e:
+            return self._json({"error": str(e)}, 400)
+
+        try:
+            entry, error = await load_chapter_index_async(comic_id)
+            if error:
+                return self._json(error, 500)
+            return self._json(format_chapter_list(comic_id, entry, page, page_size))
+        except UpstreamUnavailableError as e:
+            return self._result(*unavailable_result(e))
+        except Exception as e:
+            return self._json({"error": str(e)}, 500)
+
+    async def chapter(self, req: AsyncRequest, comic_id: str, chapter_number: str):
+        cookie = req.headers.get("cookie") or None
+        payload, status = await chapter_images_result_async(
+            comic_id,
+            int(chapter_number),
+            cookie,
+            req.host_url,
+            req.headers.get("accept", ""),
+        )
+        return self._result(payload, status)
+
+    async def batch_comics(self, req: AsyncRequest):
+        try:
+            entries = parse_batch_comics(await req.json())
+        except ValueError as e:
+            return self._json({"error": str(e)}, 400)
+
+        jobs = [
+            (
+                meta,
+                error or functools.partial(comic_detail_result_async, meta["comic_id"]),
+            )
+            for meta, error in entries
+        ]
+        return 200, {"Content-Type": "application/x-ndjson"}, run_batch_async(jobs)
+
+    async def batch_chapters(self, req: AsyncRequest):
+        try:
+            entries = parse_batch_chapters(await req.json())
+        except ValueError as e:
+            return self._json({"error": str(e)}, 400)
+
+        cookie = req.headers.get("cookie") or None
+        api_url = req.host_url
+        accept = req.headers.get("accept", "")
+        jobs = [
+            (
+                meta,
+                error
+                or functools.partial(
+                    chapter_images_result_async,
+                    meta["comic_id"],
+                    meta["chapter"],
+                    cookie,
+                    api_url,
+                    accept,
+                ),
+            )
+            for meta, error in entries
+        ]
+        return 200, {"Content-Type": "application/x-ndjson"}, run_batch_async(jobs)
+
+    async def search(
+        self, req: AsyncRequest, value: str, client_page: Optional[str] = None
+    ):
+        keyword = normalize_search_query(value)
+        client_page = int(client_page) if client_page else 1
+        if client_page < 1:
+            return self._json({"error": "页码必须大于0"}, 400)
+        source = req.args.get("source", Config.SEARCH_SOURCE)
+        if source not in SEARCH_SOURCES:
+            return self._json({"error": f"不支持的搜索来源: {source}"}, 400)
+
+        try:
+            search_result, used = await comic_searcher.search_async(
+                keyword, client_page, source
+            )
+            if "error" in search_result:
+                return self._json(search_result, 500)
+            status, headers, body = self._json(
+                format_search_results(search_result, client_page)
+            )
+            headers["X-Search-Source"] = used
+            return status, headers, body
+        except Exception as e:
+            return self._json({"error": f"搜索失败: {str(e)}"}, 500)
+
+    async def image_proxy(self, req: AsyncRequest):
+        try:
+            image_url = req.args.get("url")
+            if not image_url:
+                return self._json({"error": "缺少url参数"}, 400)
+            if not image_url_signed(req.args):
+                return self._json({"error": "图片签名无效或图片主机不受支持"}, 403)
+
+            target_width = clamp_image_width(
+                int(req.args.get("width", Config.IMAGE_DEFAULT_WIDTH))
+            )
+            quality = int(req.args.get("quality", Config.IMAGE_DEFAULT_QUALITY))
+            try:
+                image_format = negotiate_image_format(
+                    req.args.get("format"), req.headers.get("accept", "")
+                )
+                layout, region_index = parse_image_region(req.args)
+            except ValueError as e:
+                return self._json({"error": str(e)}, 400)
+
+            cache_key = ImageCache.make_key(
+                image_url, target_width, quality, image_format, layout, region_index
+            )
+            etag = f'"{cache_key[:32]}"'
+            cache_headers = image_response_headers(etag, req.args)
+
+            if _etag_matches(etag, req.headers.get("if-none-match", "")):
+                image_cache.mark_not_modified()
+                return 304, cache_headers, b""
+
+            output = await run_cpu_bound(image_cache.get, cache_key)
+            cache_status = "HIT"
+            if output is None:
+                cache_status = "MISS"
+                if layout:
+                    status_code, outputs = await image_flight.do_async(
+                        (image_url, target_width, quality, image_format, layout),
+                        process_image_regions_async,
+                        image_url,
+                        target_width,
+                        quality,
+                        image_format,
+                        layout,
+                    )
+                    if status_code != 200:
+                        return self._json(
+                            {"error": f"图片下载失败: {status_code}"}, 500
+                        )
+                    output = outputs[region_index]
+                else:
+                    # 与正在进行的预取合并
+                    status_code, output = await image_flight.do_async(
+                        cache_key,
+                        process_image_async,
+                        cache_key,
+                        image_url,
+                        target_width,
+                        quality,
+                        image_format,
+                    )
+                    if status_code != 200:
+                        return self._json(
+                            {"error": f"图片下载失败: {status_code}"}, 500
+                        )
+            else:
+                image_prefetcher.record_hit(cache_key)
+
+            return (
+                200,
+                {
+                    **cache_headers,
+                    "Content-Type": IMAGE_FORMATS[image_format][1],
+                    "Content-Disposition": "inline",
+                    "X-Cache": cache_status,
+                },
+                output,
+            )
+
+        except ImageTooLargeError as e:
+            return self._json({"error": f"图片过大: {str(e)}"}, 413)
+        except ImageRegionError as e:
+            return self._json({"error": str(e)}, 400)
+        except ImageWorkersBusyError as e:
+            status, headers, body = self._json({"error": str(e)}, 503)
+            headers["Retry-After"] = str(Config.IMAGE_RETRY_AFTER)
+            return status, headers, body
+        except UpstreamUnavailableError as e:
+            status, headers, body = self._json({"error": str(e)}, 503)
+            headers["Retry-After"] = str(math.ceil(e.retry_after))
+            return status, headers, body
+        except Exception as e:
+            logging.error(f"图片处理失败: {str(e)}")
+            return self._json({"error": f"图片处理失败: {str(e)}"}, 500)
+
+
 if __name__ == "__main__":
     app.run()
 
-asgi_app = WsgiToAsgi(app)
\ No newline at end of file
+# ASGI入口，例如 uvicorn api.index:asgi_app
+asgi_app = AsyncComicApp(app)
\ No newline at end of file
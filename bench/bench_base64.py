@@ -0,0 +1,105 @@
+"""
+decode_base64_custom 微基准
+
+先用随机数据和边界数据比对新旧实现的输出，再分别计时。
+用法: python bench/bench_base64.py [--size 300000] [--repeat 20]
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from index import ComicParser  # noqa: E402
+
+
+def legacy_decode_base64_custom(T: str) -> bytes:
+    """优化前的实现，用于对照"""
+    keyStr = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+    result = []
+    e = 0
+
+    while e < len(T):
+        b = keyStr.index(T[e])
+        e += 1
+        d = keyStr.index(T[e])
+        e += 1
+        f = keyStr.index(T[e])
+        e += 1
+        g = keyStr.index(T[e])
+        e += 1
+
+        b = b << 2 | d >> 4
+        d = (d & 15) << 4 | f >> 2
+        h = (f & 3) << 6 | g
+
+        result.append(b)
+        if f != 64:
+            result.append(d)
+        if g != 64:
+            result.append(h)
+
+    return bytes(result)
+
+
+def _outcome(func, data):
+    try:
+        return func(data)
+    except (ValueError, IndexError):
+        return "error"
+
+
+def check_equivalence(rounds: int = 2000):
+    """新旧实现的差分比对"""
+    rnd = random.Random(0)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+    samples = ["", "AA==", "AAA=", "AB==", "QQ==", "A===", "AA=A", "====", "QUJD"]
+    for _ in range(rounds):
+        raw = os.urandom(rnd.randint(0, 64))
+        samples.append(base64.b64encode(raw).decode())
+        samples.append(
+            "".join(rnd.choice(alphabet) for _ in range(4 * rnd.randint(0, 8)))
+        )
+    for sample in samples:
+        expected = _outcome(legacy_decode_base64_custom, sample)
+        actual = _outcome(ComicParser.decode_base64_custom, sample)
+        if expected != actual:
+            raise AssertionError(f"输出不一致: {sample!r} {expected!r} != {actual!r}")
+    print(f"差分比对通过: {len(samples)} 个样本")
+
+
+def timeit(func, data: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300_000, help="原始数据字节数")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    check_equivalence()
+
+    payload = base64.b64encode(os.urandom(args.size)).decode()
+    legacy = timeit(legacy_decode_base64_custom, payload, max(1, args.repeat // 5))
+    current = timeit(ComicParser.decode_base64_custom, payload, args.repeat)
+    fallback = timeit(
+        ComicParser._decode_base64_table, payload, max(1, args.repeat // 5)
+    )
+    print(f"数据长度: {len(payload)} 字符")
+    print(f"旧实现:   {legacy * 1000:8.2f} ms")
+    print(f"查表实现: {fallback * 1000:8.2f} ms")
+    print(f"当前实现: {current * 1000:8.2f} ms  ({legacy / current:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
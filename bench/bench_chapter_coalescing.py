@@ -0,0 +1,140 @@
+"""
+章节图片请求合并基准
+
+在带延迟的本地桩服务器上，同时发出N个相同章节的请求（Flask入口用线程，
+ASGI入口用协程），检查上游章节页只被请求一次，并输出各请求的耗时。
+带Cookie的请求使用独立的缓存键，不会读到匿名请求的结果。
+用法: python bench/bench_chapter_coalescing.py [--concurrency 100] [--delay-ms 300]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+
+def chapter_fetches(stub: StubUpstream, comic_id: int) -> int:
+    prefix = f"/ComicView/index/id/{comic_id}/"
+    return sum(n for path, n in stub.hits.items() if path.startswith(prefix))
+
+
+def detail_fetches(stub: StubUpstream, comic_id: int) -> int:
+    return stub.hits.get(f"/Comic/comicInfo/id/{comic_id}", 0)
+
+
+def summarize(name: str, latencies, fetches: int, details: int):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    worst = latencies[-1] * 1000
+    print(
+        f"{name:<22}请求 {len(latencies):>4}  章节页 {fetches}  详情页 {details}  "
+        f"p50 {p50:7.1f} ms  max {worst:7.1f} ms"
+    )
+
+
+def run_flask(index, stub, comic_id: int, concurrency: int, cookie=None):
+    barrier = threading.Barrier(concurrency)
+    latencies = []
+    statuses = []
+    lock = threading.Lock()
+
+    def worker():
+        client = index.app.test_client()
+        if cookie:
+            # 测试客户端会用自己的cookie jar覆盖Cookie请求头
+            client.set_cookie(*cookie.split("=", 1))
+        barrier.wait()
+        start = time.perf_counter()
+        resp = client.get(f"/photo/{comic_id}/chapter/3")
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            statuses.append(resp.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * concurrency, statuses
+    return latencies
+
+
+async def run_asgi(index, comic_id: int, concurrency: int):
+    import httpx
+
+    transport = httpx.ASGITransport(app=index.asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+
+        async def one():
+            start = time.perf_counter()
+            resp = await c.get(f"/photo/{comic_id}/chapter/3")
+            assert resp.status_code == 200, resp.text
+            return time.perf_counter() - start
+
+        return await asyncio.gather(*(one() for _ in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--delay-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    stub = StubUpstream(delay_ms=args.delay_ms).start()
+    os.environ["QQCOMIC_AC_BASE_URL"] = stub.base_url
+    os.environ["QQCOMIC_M_AC_BASE_URL"] = stub.base_url
+    os.environ["QQCOMIC_CHAPTER_INDEX_PATH"] = os.path.join(
+        tempfile.mkdtemp(), "chapters.sqlite3"
+    )
+    import index
+
+    try:
+        # 冷启动：详情页和章节页都只请求一次
+        latencies = run_flask(index, stub, 1, args.concurrency)
+        summarize(
+            "flask 冷启动", latencies, chapter_fetches(stub, 1), detail_fetches(stub, 1)
+        )
+        assert detail_fetches(stub, 1) == 1
+        assert chapter_fetches(stub, 1) == 1
+
+        latencies = run_flask(index, stub, 1, args.concurrency)
+        summarize(
+            "flask 缓存命中",
+            latencies,
+            chapter_fetches(stub, 1),
+            detail_fetches(stub, 1),
+        )
+        assert chapter_fetches(stub, 1) == 1
+
+        # 带Cookie的请求不共享匿名结果
+        latencies = run_flask(index, stub, 1, args.concurrency, cookie="uin=o123")
+        summarize(
+            "flask 带Cookie",
+            latencies,
+            chapter_fetches(stub, 1),
+            detail_fetches(stub, 1),
+        )
+        assert chapter_fetches(stub, 1) == 2
+
+        latencies = asyncio.run(run_asgi(index, 2, args.concurrency))
+        summarize(
+            "asgi 冷启动", latencies, chapter_fetches(stub, 2), detail_fetches(stub, 2)
+        )
+        assert detail_fetches(stub, 2) == 1
+        assert chapter_fetches(stub, 2) == 1
+
+        print(index.chapter_images_flight.stats())
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+漫画详情页解析基准
+
+用 bench/fixtures 下保存的详情页和生成的大型详情页（含单行压缩版本），
+比对 ComicParser.parse_comic_info 与旧实现的输出并计时。
+用法: python bench/bench_comic_info.py [--chapters 1000,3000] [--repeat 5]
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+
+from index import ComicParser, Config  # noqa: E402
+from stub_upstream import comic_info_page  # noqa: E402
+
+
+def legacy_parse_comic_info(comic_id: str, html: str):
+    """优化前 get_comic_info 的解析部分，用于对照"""
+    title_match = re.search("<title>(.*?)</title>", html)
+    title = title_match.group(1) if title_match else "未知标题"
+    comic_title = title.split("-")[0].strip() if "-" in title else title
+
+    cover_match = re.search(
+        r'<div class="works-cover[^"]*">\s*<a[^>]*>\s*<img src="([^"]*)"[^>]*>',
+        html,
+    )
+    if cover_match:
+        cover_url = cover_match.group(1)
+        if cover_url.startswith("//"):
+            cover_url = "https:" + cover_url
+        elif cover_url.startswith("/"):
+            cover_url = Config.AC_BASE_URL + cover_url
+    else:
+        cover_url = None
+
+    popularity_match = re.search(r"<span>人气：<em>(.*?)</em></span>", html)
+    popularity = popularity_match.group(1).strip() if popularity_match else "未知"
+
+    rating_match = re.search(
+        r"评分：<strong[^>]*>(.*?)</strong>\s*\(<span>(\d+)</span>人评分\)", html
+    )
+    if rating_match:
+        rating = {
+            "score": rating_match.group(1).strip(),
+            "rating_count": rating_match.group(2).strip(),
+        }
+    else:
+        rating = {"score": "未知", "rating_count": "0"}
+
+    chapter_pattern = r'<a(?!.*?开始阅读)[^>]*?title="([^"]+?)"[^>]*?href="(/ComicView/index/id/\d+/cid/\d+)"[^>]*?>([\s\S]*?)</a>'
+    chapter_matches = re.findall(chapter_pattern, html)
+
+    chapters = []
+    for match in chapter_matches:
+        title_attr = match[0].strip()
+        re.sub(r"\s+", " ", match[2]).strip()
+        chapter_link = Config.AC_BASE_URL + match[1]
+        chapter_name = title_attr.split("：")[1]
+        chapter_num = len(chapters) + 1
+        chapters.append(
+            {"number": chapter_num, "link": chapter_link, "title": chapter_name}
+        )
+
+    seen_links = set()
+    unique_chapters = []
+    for chapter in chapters:
+        cid_match = re.search(r"/cid/(\d+)", chapter["link"])
+        if cid_match:
+            cid = cid_match.group(1)
+            if cid not in seen_links:
+                seen_links.add(cid)
+                unique_chapters.append(chapter)
+        else:
+            if chapter["link"] not in seen_links:
+                seen_links.add(chapter["link"])
+                unique_chapters.append(chapter)
+
+    chapters = unique_chapters
+    chapters.sort(key=lambda x: x["number"])
+
+    return {
+        "comic_id": comic_id,
+        "title": comic_title,
+        "popularity": popularity,
+        "rating": rating,
+        "chapters": chapters,
+        "cover_url": cover_url,
+        "total_chapters": len(chapters),
+    }
+
+
+def load_corpus(chapter_counts):
+    """保存的详情页加上生成的大型详情页"""
+    corpus = {}
+    for path in sorted(
+        glob.glob(os.path.join(BENCH_DIR, "fixtures", "comic_info_*.html"))
+    ):
+        with open(path, encoding="utf-8") as f:
+            corpus[os.path.basename(path)] = f.read()
+    for count in chapter_counts:
+        page = comic_info_page(1, count)
+        corpus[f"generated_{count}"] = page
+        # 线上页面有时被压缩成一行，旧正则的前瞻在这种页面上代价最高
+        corpus[f"generated_{count}_minified"] = " ".join(
+            line.strip() for line in page.splitlines()
+        )
+    return corpus
+
+
+def timeit(func, *args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chapters", default="1000,3000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(int(n) for n in args.chapters.split(","))
+    print(f"{'页面':<34}{'章节':>6}{'旧实现(ms)':>12}{'当前(ms)':>10}{'加速':>8}")
+    for name, html in corpus.items():
+        expected = legacy_parse_comic_info("1", html)
+        actual = ComicParser.parse_comic_info("1", html)
+        if expected != actual:
+            raise AssertionError(f"{name} 解析结果不一致")
+        legacy = timeit(legacy_parse_comic_info, "1", html, repeat=args.repeat)
+        current = timeit(ComicParser.parse_comic_info, "1", html, repeat=args.repeat)
+        print(
+            f"{name:<34}{actual['total_chapters']:>6}{legacy * 1000:>12.2f}"
+            f"{current * 1000:>10.2f}{legacy / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
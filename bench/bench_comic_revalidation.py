@@ -0,0 +1,91 @@
+"""
+漫画详情重新验证基准
+
+在本地桩服务器上比较详情缓存过期后的刷新开销：完整解析、
+上游支持ETag时的304条件请求、上游不支持时按响应体摘要跳过解析。
+同时检查缓存过期后客户端仍直接拿到旧结果（后台重新验证），
+以及上游新增章节后刷新能取到新章节。
+用法: python bench/bench_comic_revalidation.py [--chapters 3000] [--rounds 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+os.environ["QQCOMIC_CHAPTER_INDEX_PATH"] = ""
+os.environ["QQCOMIC_CACHE_BACKEND"] = ""
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+
+def timed_calls(func, rounds: int) -> float:
+    """平均耗时，单位毫秒"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chapters", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    import index
+    from index import ComicParser, Config, comic_info_cache
+
+    comic_id = "7"
+    for etag in (True, False):
+        stub = StubUpstream(chapters=args.chapters, etag=etag).start()
+        Config.AC_BASE_URL = stub.base_url
+        Config.COMIC_INFO_CACHE_TTL = 600
+        comic_info_cache.clear()
+        path = f"/Comic/comicInfo/id/{comic_id}"
+        try:
+
+            def full_refresh():
+                comic_info_cache.clear()
+                ComicParser.refresh_comic_info(comic_id)
+
+            full = timed_calls(full_refresh, args.rounds)
+            before = index.comic_info_revalidation_stats()
+            revalidated = timed_calls(
+                lambda: ComicParser.refresh_comic_info(comic_id), args.rounds
+            )
+            after = index.comic_info_revalidation_stats()
+            outcome = "not_modified" if etag else "unchanged"
+            assert after[outcome] - before[outcome] == args.rounds, (before, after)
+
+            # 新鲜期设为0，客户端仍直接拿到缓存，刷新在后台进行
+            Config.COMIC_INFO_CACHE_TTL = 0
+            hits = stub.hits[path]
+            start = time.perf_counter()
+            ComicParser.get_comic_info(comic_id)
+            stale_ms = (time.perf_counter() - start) * 1000
+            deadline = time.time() + 10
+            while stub.hits[path] == hits and time.time() < deadline:
+                time.sleep(0.01)
+            assert stub.hits[path] == hits + 1, "未在后台重新验证"
+
+            # 上游新增章节后，重新验证取到新章节
+            stub.chapters += 1
+            info = ComicParser.refresh_comic_info(comic_id)
+            assert info["total_chapters"] == args.chapters + 1, info["total_chapters"]
+            stub.chapters -= 1
+
+            print(
+                f"{'ETag/304' if etag else '响应体摘要'}: 完整刷新 {full:.2f} ms, "
+                f"未变化时刷新 {revalidated:.2f} ms, "
+                f"过期后客户端耗时 {stale_ms:.3f} ms"
+            )
+        finally:
+            stub.stop()
+    print(index.comic_info_revalidation_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+nonce 去干扰基准
+
+先用随机数据比对 descramble 与旧的逐个删除实现，再在大数据上计时。
+用法: python bench/bench_descramble.py [--size 500000] [--tokens 40]
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from index import descramble  # noqa: E402
+
+
+def legacy_descramble(data: str, nonce: str) -> str:
+    """优化前 get_chapter_images 中的实现，用于对照"""
+    T = list(data)
+    N = re.findall(r"\d+[a-zA-Z]+", nonce)
+    jlen = len(N)
+
+    while jlen:
+        jlen -= 1
+        jlocate = int(re.findall(r"\d+", N[jlen])[0]) & 255
+        jstr = re.sub(r"\d+", "", N[jlen])
+        del T[jlocate : jlocate + len(jstr)]
+
+    return "".join(T)
+
+
+def random_nonce(rnd: random.Random, tokens: int) -> str:
+    parts = []
+    for _ in range(tokens):
+        parts.append(str(rnd.randint(0, 2000)))
+        parts.append(
+            "".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randint(1, 6)))
+        )
+        # 干扰字符之间偶尔夹杂其他符号
+        if rnd.random() < 0.2:
+            parts.append(rnd.choice("-_=."))
+    return "".join(parts)
+
+
+def check_equivalence(rounds: int = 5000):
+    """随机数据上的性质检查：结果与旧实现一致"""
+    rnd = random.Random(0)
+    alphabet = string.ascii_letters + string.digits + "+/="
+    for _ in range(rounds):
+        data = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 700)))
+        nonce = random_nonce(rnd, rnd.randint(0, 30))
+        expected = legacy_descramble(data, nonce)
+        actual = descramble(data, nonce)
+        if expected != actual:
+            raise AssertionError(f"输出不一致: nonce={nonce!r} 长度={len(data)}")
+    print(f"差分比对通过: {rounds} 组随机数据")
+
+
+def timeit(func, *args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=500_000, help="DATA字符数")
+    parser.add_argument("--tokens", type=int, default=40, help="nonce中的干扰片段数")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    check_equivalence()
+
+    rnd = random.Random(1)
+    data = "".join(rnd.choice(string.ascii_letters) for _ in range(args.size))
+    nonce = random_nonce(rnd, args.tokens)
+    legacy = timeit(legacy_descramble, data, nonce, repeat=args.repeat)
+    current = timeit(descramble, data, nonce, repeat=args.repeat)
+    print(f"数据长度: {len(data)} 字符, 干扰片段: {args.tokens}")
+    print(f"旧实现:   {legacy * 1000:8.2f} ms")
+    print(f"当前实现: {current * 1000:8.2f} ms  ({legacy / current:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
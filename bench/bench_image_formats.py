@@ -0,0 +1,49 @@
+"""
+图片代理输出格式基准
+
+对样例漫画页分别输出 JPEG、WebP、AVIF，统计体积和编码耗时。
+用法: python bench/bench_image_formats.py [--width 600] [--quality 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from bench_image_transform import make_sample  # noqa: E402
+from index import IMAGE_FORMATS, _image_format_supported, transform_image  # noqa: E402
+
+SAMPLES = [(800, 1200), (1080, 8000)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=600)
+    parser.add_argument("--quality", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'样图':<14}{'格式':<6}{'体积(KB)':>10}{'相对JPEG':>10}{'耗时(ms)':>10}")
+    for width, height in SAMPLES:
+        content = make_sample(width, height, "JPEG")
+        baseline = None
+        for fmt in IMAGE_FORMATS:
+            if not _image_format_supported(fmt):
+                print(f"{width}x{height:<9}{fmt:<6}{'不支持':>10}")
+                continue
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                output = transform_image(content, args.width, args.quality, fmt)
+                best = min(best, time.perf_counter() - start)
+            baseline = baseline or len(output)
+            print(
+                f"{f'{width}x{height}':<14}{fmt:<6}{len(output) / 1024:>10.1f}"
+                f"{len(output) / baseline:>10.0%}{best * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
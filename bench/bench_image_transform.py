@@ -0,0 +1,110 @@
+"""
+图片代理处理路径的内存与耗时基准
+
+生成若干张长条漫画样图，分别用旧路径（完整解码后LANCZOS）和
+当前的 transform_image（draft/reduce 后再 LANCZOS）处理。
+每种路径在独立子进程中运行，以便统计峰值内存（ru_maxrss）。
+用法: python bench/bench_image_transform.py [--width 600] [--quality 50]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+# (宽, 高, 格式)
+SAMPLES = [
+    (800, 1200, "JPEG"),
+    (1080, 8000, "JPEG"),
+    (1500, 20000, "JPEG"),
+    (1080, 8000, "PNG"),
+]
+
+
+def make_sample(width: int, height: int, fmt: str) -> bytes:
+    """画出带色块和文字线条的长图，接近漫画页的压缩特征"""
+    image = Image.new("RGB", (width, height), (250, 250, 245))
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 180):
+        shade = (y // 180 * 37) % 200
+        draw.rectangle((20, y + 10, width - 20, y + 150), outline=(0, 0, 0), width=4)
+        draw.ellipse(
+            (width // 4, y + 30, width // 2, y + 140), fill=(shade, 120, 200 - shade)
+        )
+        for x in range(40, width - 40, 60):
+            draw.line((x, y + 20, x + 30, y + 140), fill=(30, 30, 30), width=2)
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, quality=85)
+    return buffer.getvalue()
+
+
+def legacy_transform(content: bytes, target_width: int, quality: int) -> bytes:
+    """优化前 image_proxy 的处理流程，用于对照"""
+    original_image = Image.open(BytesIO(content))
+    width_percent = target_width / float(original_image.size[0])
+    target_height = int(float(original_image.size[1]) * float(width_percent))
+    resized_image = original_image.resize(
+        (target_width, target_height), Image.Resampling.LANCZOS
+    )
+    output_buffer = BytesIO()
+    resized_image.save(output_buffer, format="JPEG", quality=quality, optimize=True)
+    return output_buffer.getvalue()
+
+
+def _run(path: str, content: bytes, width: int, quality: int, repeat: int, conn):
+    # 两条路径都先导入应用模块，让峰值RSS的基线一致
+    from index import transform_image
+
+    func = legacy_transform if path == "legacy" else transform_image
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func(content, width, quality)
+        best = min(best, time.perf_counter() - start)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((best, peak, len(output)))
+    conn.close()
+
+
+def measure(path: str, content: bytes, width: int, quality: int, repeat: int):
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(
+        target=_run, args=(path, content, width, quality, repeat, child)
+    )
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=600)
+    parser.add_argument("--quality", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'样图':<20}{'路径':<8}{'耗时(ms)':>10}{'峰值RSS(MB)':>14}{'输出(KB)':>10}")
+    for width, height, fmt in SAMPLES:
+        content = make_sample(width, height, fmt)
+        label = f"{width}x{height} {fmt}"
+        for path in ("legacy", "current"):
+            elapsed, rss_kb, size = measure(
+                path, content, args.width, args.quality, args.repeat
+            )
+            print(
+                f"{label:<20}{path:<8}{elapsed * 1000:>10.1f}"
+                f"{rss_kb / 1024:>14.1f}{size / 1024:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
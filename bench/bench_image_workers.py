@@ -0,0 +1,95 @@
+"""
+图片处理进程池扩展性基准
+
+以不同的 QQCOMIC_IMAGE_WORKERS 启动ASGI服务，关闭图片缓存后压测 /image/proxy，
+同时以低并发请求 /comic，观察图片吞吐量随子进程数的变化，
+以及图片处理对其他接口延迟的影响。workers=0 表示在线程池中处理（旧行为）。
+用法: python bench/bench_image_workers.py [--workers 0,1,2,4] [--concurrency 32]
+      [--duration 10] [--delay-ms 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import loadtest  # noqa: E402
+
+
+def default_workers() -> str:
+    counts = [0, 1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return ",".join(str(n) for n in counts)
+
+
+async def run_mixed(base_url: str, upstream: str, args):
+    image_path = "/image/proxy?url=" + upstream + "/img/{n}.jpg&width=800"
+    return await asyncio.gather(
+        loadtest.run_load(base_url, image_path, args.concurrency, args.duration),
+        loadtest.run_load(
+            base_url, "/comic/{n}", args.probe_concurrency, args.duration
+        ),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=default_workers())
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--probe-concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--delay-ms", type=float, default=20)
+    parser.add_argument("--queue-size", type=int, default=64)
+    args = parser.parse_args()
+
+    stub_port = loadtest.free_port()
+    stub = loadtest.start_stub(stub_port, args.delay_ms)
+    upstream = f"http://127.0.0.1:{stub_port}"
+    print(
+        f"CPU {os.cpu_count()}, 图片并发 {args.concurrency}, "
+        f"/comic 并发 {args.probe_concurrency}, 每项 {args.duration}s"
+    )
+    print(
+        f"{'workers':>8}{'图片RPS':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'错误':>6}"
+        f"{'/comic RPS':>12}{'p50(ms)':>10}{'p95(ms)':>10}"
+    )
+    try:
+        for workers in [int(n) for n in args.workers.split(",")]:
+            port = loadtest.free_port()
+            proc = loadtest.start_server(
+                "asgi",
+                port,
+                upstream,
+                {
+                    "QQCOMIC_IMAGE_WORKERS": str(workers),
+                    "QQCOMIC_IMAGE_QUEUE_SIZE": str(args.queue_size),
+                    "QQCOMIC_IMAGE_CACHE_MEMORY_BYTES": "0",
+                    "QQCOMIC_IMAGE_CACHE_DISK_BYTES": "0",
+                    "QQCOMIC_COMIC_INFO_CACHE_SIZE": "256",
+                },
+            )
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                # 预热子进程和详情缓存，不计入结果
+                asyncio.run(loadtest.run_load(base_url, "/comic/{n}", 4, 1))
+                image, probe = asyncio.run(run_mixed(base_url, upstream, args))
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(
+                f"{workers:>8}{image['rps']:>10.1f}{image['p50'] * 1000:>10.1f}"
+                f"{image['p95'] * 1000:>10.1f}{image['errors']:>6}"
+                f"{probe['rps']:>12.1f}{probe['p50'] * 1000:>10.1f}"
+                f"{probe['p95'] * 1000:>10.1f}"
+            )
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
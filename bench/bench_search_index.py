@@ -0,0 +1,74 @@
+"""
+本地搜索索引基准
+
+先向索引写入一批漫画，再比较 source=local、hybrid 与 remote 的搜索耗时。
+remote 经过带固定延迟的本地桩服务器，且关闭页缓存，每次都请求上游。
+用法: python bench/bench_search_index.py [--comics 20000] [--rounds 200] [--delay-ms 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+os.environ["QQCOMIC_SEARCH_INDEX_PATH"] = ""
+os.environ["QQCOMIC_SEARCH_PAGE_CACHE_SIZE"] = "0"
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+WORDS = "海贼王火影忍者斗罗大陆一人之下狐妖小红娘镇魂街中国惊奇先生武动乾坤"
+
+
+def random_title(rng: random.Random) -> str:
+    return "".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comics", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--delay-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    import index
+    from index import Config, comic_searcher, search_index
+
+    rng = random.Random(0)
+    comics = [
+        {"comic_id": str(i), "title": random_title(rng), "tags": "热血 冒险"}
+        for i in range(args.comics)
+    ]
+    start = time.perf_counter()
+    search_index.add(comics)
+    print(f"写入 {args.comics} 部漫画: {(time.perf_counter() - start):.2f} s")
+
+    stub = StubUpstream(delay_ms=args.delay_ms).start()
+    Config.M_AC_BASE_URL = stub.base_url
+    comic_searcher.base_url = stub.base_url
+    queries = [random_title(rng)[:2] for _ in range(args.rounds)]
+    try:
+        for source in ("local", "hybrid", "remote"):
+            latencies = []
+            used = {"local": 0, "remote": 0}
+            rounds = args.rounds if source != "remote" else min(args.rounds, 20)
+            for query in queries[:rounds]:
+                start = time.perf_counter()
+                _, actual = comic_searcher.search(query, 1, source)
+                latencies.append(time.perf_counter() - start)
+                used[actual] += 1
+            latencies.sort()
+            print(
+                f"{source:<8}p50 {latencies[len(latencies) // 2] * 1000:>8.3f} ms"
+                f"  p95 {latencies[int(len(latencies) * 0.95)] * 1000:>8.3f} ms"
+                f"  本地/上游 {used['local']}/{used['remote']}"
+            )
+    finally:
+        stub.stop()
+    print(index.search_index.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+冷启动基准
+
+导入开销：用 python -X importtime 导入 index，取多次运行的中位数，
+列出 index 直接导入的模块中耗时最多的几项。
+首个响应耗时：每个接口各启动一个新进程，导入 index 后用测试客户端
+请求一次，记录进程启动到拿到首个响应的总耗时、导入耗时、首个请求耗时、
+第二次请求耗时，以及处理该请求时加载了哪些重型依赖。
+用法: python bench/bench_startup.py [--runs 5] [--top 10] [--routes comic,photo]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(BENCH_DIR, "..", "api")
+sys.path.insert(0, BENCH_DIR)
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+ROUTES = {
+    "index": "/",
+    "config": "/config",
+    "search": "/search/test/1",
+    "comic": "/comic/1",
+    "photo": "/photo/1/chapter/1",
+    "image": "/image/proxy?url={upstream}/img/1.jpg&width=600",
+}
+
+# 按需导入的重型依赖
+HEAVY_MODULES = ("requests", "httpx", "PIL.Image", "py_mini_racer", "asgiref.wsgi")
+
+CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import index
+imported = time.perf_counter()
+client = index.app.test_client()
+resp = client.get(sys.argv[1])
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+print(json.dumps({
+    "status": resp.status_code,
+    "import_ms": (imported - start) * 1000,
+    "first_ms": (first - imported) * 1000,
+    "second_ms": (second - first) * 1000,
+    "loaded": [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def child_env(upstream: str, image_workers: str) -> dict:
+    return dict(
+        os.environ,
+        PYTHONPATH=API_DIR,
+        QQCOMIC_AC_BASE_URL=upstream,
+        QQCOMIC_M_AC_BASE_URL=upstream,
+        QQCOMIC_CHAPTER_INDEX_PATH="",
+        QQCOMIC_CACHE_BACKEND="",
+        QQCOMIC_IMAGE_CACHE_DISK_BYTES="0",
+        QQCOMIC_IMAGE_WORKERS=image_workers,
+    )
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    解析 -X importtime 输出
+
+    Returns:
+        {"total": index的累计耗时, "modules": {index直接导入的模块: 累计耗时}}，单位毫秒
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative) / 1000))
+
+    # 子模块先于父模块输出，index之前的深度为1的条目都是它直接导入的
+    total = 0.0
+    modules = {}
+    for depth, name, cumulative in entries:
+        if depth == 0 and name == "index":
+            total = cumulative
+            break
+        if depth == 0:
+            modules = {}
+        elif depth == 1:
+            modules[name] = cumulative
+    return {"total": total, "modules": modules}
+
+
+def run_importtime(env: dict, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import index"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(parse_importtime(proc.stderr))
+    names = set().union(*(sample["modules"] for sample in samples))
+    return {
+        "total": statistics.median(sample["total"] for sample in samples),
+        "modules": {
+            name: statistics.median(
+                sample["modules"].get(name, 0.0) for sample in samples
+            )
+            for name in names
+        },
+    }
+
+
+def run_first_response(env: dict, path: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD_CODE, path, json.dumps(HEAVY_MODULES)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["total_ms"] = elapsed
+        samples.append(result)
+    summary = {
+        key: statistics.median(sample[key] for sample in samples)
+        for key in ("total_ms", "import_ms", "first_ms", "second_ms")
+    }
+    summary["status"] = samples[-1]["status"]
+    summary["loaded"] = samples[-1]["loaded"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="每项重复次数，取中位数")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument(
+        "--image-workers", default="0", help="子进程数，默认与无服务器环境一致"
+    )
+    parser.add_argument("--output", help="结果写入的JSON文件")
+    args = parser.parse_args()
+
+    stub = StubUpstream().start()
+    env = child_env(stub.base_url, args.image_workers)
+    report = {}
+    try:
+        imports = run_importtime(env, args.runs)
+        report["import"] = imports
+        print(f"import index: {imports['total']:.1f} ms (中位数, {args.runs} 次)")
+        ranked = sorted(imports["modules"].items(), key=lambda item: -item[1])
+        for name, cost in ranked[: args.top]:
+            print(f"  {name:<32}{cost:>9.1f} ms")
+
+        print(
+            f"\n{'接口':<8}{'状态':>6}{'总耗时':>10}{'导入':>10}{'首个请求':>10}"
+            f"{'第二次':>10}  加载的依赖"
+        )
+        report["routes"] = {}
+        for route in args.routes.split(","):
+            path = ROUTES[route].replace("{upstream}", stub.base_url)
+            result = run_first_response(env, path, args.runs)
+            report["routes"][route] = result
+            print(
+                f"{route:<8}{result['status']:>6}{result['total_ms']:>10.1f}"
+                f"{result['import_ms']:>10.1f}{result['first_ms']:>10.1f}"
+                f"{result['second_ms']:>10.1f}  {','.join(result['loaded']) or '-'}"
+            )
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
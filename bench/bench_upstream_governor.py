@@ -0,0 +1,246 @@
+"""
+上游限流、重试与熔断的故障注入基准
+
+在本地桩服务器上依次模拟：正常、部分请求返回429、全部返回429（上游限流）、
+部分请求无响应（超时）以及恢复，逐阶段请求 /comic，统计客户端看到的状态码、
+延迟、实际到达上游的请求数和熔断状态。详情缓存立即过期，但条目保留在进程内，
+用于验证上游不可用时返回旧数据；另一半请求的漫画此前从未请求过，
+用于观察熔断后的快速失败。每个阶段开始前等待熔断冷却结束。
+各阶段结束后检查熔断的打开与恢复，之后用独立的调控器逐项检查重试次数、
+Retry-After 以及半开状态的转换，不符合预期时抛出 AssertionError。
+用法: python bench/bench_upstream_governor.py [--requests 200] [--concurrency 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+# (阶段, 429比例, 无响应比例)
+PHASES = [
+    ("正常", 0.0, 0.0),
+    ("20% 429", 0.2, 0.0),
+    ("全部429", 1.0, 0.0),
+    ("30%超时", 0.0, 0.3),
+    ("恢复", 0.0, 0.0),
+]
+
+
+def check_retries(stub: StubUpstream):
+    """上游一直返回429时，请求次数为重试次数加一，最后返回429"""
+    from index import UpstreamClient, UpstreamGovernor
+
+    governor = UpstreamGovernor(retries=2, backoff_base=0.01, breaker_threshold=0)
+    client = UpstreamClient(governor=governor)
+    stub.throttle_rate, stub.retry_after = 1.0, 0
+    before = stub.hits.get("/img/retries.jpg", 0)
+    resp = client.get(stub.base_url + "/img/retries.jpg")
+    assert resp.status_code == 429, resp.status_code
+    assert stub.hits["/img/retries.jpg"] - before == 3, (
+        stub.hits["/img/retries.jpg"] - before
+    )
+    assert governor.stats()["hosts"][stub.base_url[7:]]["retries"] == 2
+
+
+def check_retry_after(stub: StubUpstream):
+    """重试前至少等待Retry-After；超过等待上限时不重试，并暂停该主机"""
+    from index import UpstreamClient, UpstreamGovernor, UpstreamUnavailableError
+
+    host = stub.base_url[7:]
+    stub.throttle_rate, stub.retry_after = 1.0, 1
+    governor = UpstreamGovernor(
+        retries=1, backoff_base=0.001, max_wait=5, breaker_threshold=0
+    )
+    start = time.perf_counter()
+    before = stub.hits.get("/img/retry-after.jpg", 0)
+    resp = UpstreamClient(governor=governor).get(stub.base_url + "/img/retry-after.jpg")
+    elapsed = time.perf_counter() - start
+    assert resp.status_code == 429
+    assert stub.hits["/img/retry-after.jpg"] - before == 2
+    assert elapsed >= 1.0, f"未等待Retry-After: {elapsed:.3f} s"
+
+    governor = UpstreamGovernor(retries=1, max_wait=0.5, breaker_threshold=0)
+    before = stub.hits["/img/retry-after.jpg"]
+    resp = UpstreamClient(governor=governor).get(stub.base_url + "/img/retry-after.jpg")
+    assert resp.status_code == 429
+    assert (
+        stub.hits["/img/retry-after.jpg"] - before == 1
+    ), "Retry-After超过上限时不应重试"
+    try:
+        governor.acquire(host)
+    except UpstreamUnavailableError as e:
+        assert e.reason == "限流", e.reason
+    else:
+        raise AssertionError("Retry-After期间应暂停该主机")
+
+
+def check_breaker(stub: StubUpstream):
+    """连续失败后熔断，冷却后放行一个探测请求，探测失败重新熔断，成功则恢复"""
+    from index import UpstreamClient, UpstreamGovernor, UpstreamUnavailableError
+
+    host = stub.base_url[7:]
+    governor = UpstreamGovernor(retries=0, breaker_threshold=2, breaker_cooldown=0.3)
+    client = UpstreamClient(governor=governor)
+
+    def breaker() -> str:
+        return governor.stats()["hosts"][host]["breaker"]
+
+    def rejected() -> bool:
+        before = stub.hits.get("/img/breaker.jpg", 0)
+        try:
+            client.get(stub.base_url + "/img/breaker.jpg")
+        except UpstreamUnavailableError:
+            assert stub.hits.get("/img/breaker.jpg", 0) == before, "熔断中不应请求上游"
+            return True
+        return False
+
+    stub.throttle_rate, stub.retry_after = 1.0, 0
+    for _ in range(2):
+        assert client.get(stub.base_url + "/img/breaker.jpg").status_code == 429
+    assert breaker() == "open"
+    assert rejected()
+
+    # 冷却结束后放行一个探测请求，结果返回前其他请求被拒绝
+    time.sleep(0.35)
+    governor.acquire(host)
+    assert breaker() == "half_open"
+    try:
+        governor.acquire(host)
+    except UpstreamUnavailableError:
+        pass
+    else:
+        raise AssertionError("半开状态只应放行一个探测请求")
+    # 探测请求没有结果（例如被取消）时重新熔断
+    governor.abandon(host)
+    assert breaker() == "open"
+
+    # 探测失败：重新熔断
+    time.sleep(0.35)
+    assert client.get(stub.base_url + "/img/breaker.jpg").status_code == 429
+    assert breaker() == "open"
+    assert governor.stats()["hosts"][host]["opened"] == 2
+
+    # 探测成功：恢复
+    time.sleep(0.35)
+    stub.throttle_rate = 0.0
+    assert client.get(stub.base_url + "/img/breaker.jpg").status_code == 200
+    assert breaker() == "closed"
+    assert not rejected()
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_phase(client_get, comics: int, requests: int, concurrency: int, offset: int):
+    def one(n: int):
+        # 偶数请求已缓存过的漫画，奇数请求从未请求过的漫画
+        comic_id = n % comics + 1 if n % 2 == 0 else offset + n
+        start = time.perf_counter()
+        status = client_get(f"/comic/{comic_id}")
+        return status, time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = [elapsed for _, elapsed in results]
+    # 最后一批请求的状态码，用于检查阶段结束时的状态
+    last = [status for status, _ in results[-concurrency:]]
+    return statuses, percentile(latencies, 0.5), percentile(latencies, 0.95), last
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--comics", type=int, default=20)
+    args = parser.parse_args()
+
+    # 在导入index之前设置，check_*函数被测试导入时不受影响
+    os.environ.update(
+        QQCOMIC_CHAPTER_INDEX_PATH="",
+        QQCOMIC_SEARCH_INDEX_PATH="",
+        QQCOMIC_CACHE_BACKEND="",
+        # 详情缓存立即过期，每个请求都会访问上游
+        QQCOMIC_COMIC_INFO_CACHE_TTL="0",
+        QQCOMIC_COMIC_INFO_STALE_TTL="0",
+        QQCOMIC_UPSTREAM_READ_TIMEOUT="0.5",
+        QQCOMIC_UPSTREAM_BREAKER_COOLDOWN="1",
+    )
+
+    import index
+    from index import Config, app, upstream_governor
+
+    stub = StubUpstream(chapters=50, hang_seconds=2, retry_after=0).start()
+    Config.AC_BASE_URL = stub.base_url
+    client = app.test_client()
+
+    def client_get(path: str) -> int:
+        return client.get(path).status_code
+
+    for n in range(1, args.comics + 1):
+        client_get(f"/comic/{n}")
+
+    phases = {}
+    print(
+        f"{'阶段':<10}{'状态码':<28}{'p50(ms)':>9}{'p95(ms)':>9}"
+        f"{'上游请求':>9}{'重试':>6}{'拒绝':>6}  熔断"
+    )
+    try:
+        for i, (name, throttle_rate, hang_rate) in enumerate(PHASES):
+            stub.throttle_rate = throttle_rate
+            stub.hang_rate = hang_rate
+            # 等待冷却结束，由探测请求决定是否关闭熔断
+            time.sleep(Config.UPSTREAM_BREAKER_COOLDOWN)
+            before = dict(stub.hits)
+            host = upstream_governor.stats()["hosts"].get(stub.base_url[7:], {})
+            retries, rejected = host.get("retries", 0), host.get("rejected", 0)
+            statuses, p50, p95, last = run_phase(
+                client_get,
+                args.comics,
+                args.requests,
+                args.concurrency,
+                1000 * (i + 1),
+            )
+            upstream_hits = sum(stub.hits.values()) - sum(before.values())
+            host = upstream_governor.stats()["hosts"][stub.base_url[7:]]
+            phases[name] = (statuses, host["retries"] - retries, host["breaker"], last)
+            print(
+                f"{name:<10}{str(statuses):<28}{p50 * 1000:>9.1f}{p95 * 1000:>9.1f}"
+                f"{upstream_hits:>9}{host['retries'] - retries:>6}"
+                f"{host['rejected'] - rejected:>6}  {host['breaker']}"
+            )
+        stale_hits = index.comic_info_cache.stats()["stale_hits"]
+        opened = upstream_governor.stats()["hosts"][stub.base_url[7:]]["opened"]
+        print("返回旧数据次数:", stale_hits, "熔断打开次数:", opened)
+
+        assert phases["正常"][0] == {200: args.requests}, phases["正常"]
+        assert phases["20% 429"][1] > 0, "部分429时应重试"
+        assert phases["全部429"][2] == "open", "全部429时应熔断"
+        # 熔断后已缓存的漫画返回旧数据，从未请求过的漫画快速失败
+        assert phases["全部429"][0].get(503, 0) > 0, phases["全部429"]
+        assert phases["全部429"][0].get(200, 0) > 0, phases["全部429"]
+        assert stale_hits > 0
+        assert phases["恢复"][2] == "closed", "上游恢复后应关闭熔断"
+        # 探测请求返回前其他请求仍被拒绝，之后全部成功
+        assert set(phases["恢复"][3]) == {200}, phases["恢复"]
+
+        check_retries(stub)
+        check_retry_after(stub)
+        check_breaker(stub)
+        print("检查通过")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+WSGI 与原生 ASGI 入口的压测对比
+
+启动带固定延迟的上游桩服务器，再分别用 uvicorn 运行
+WsgiToAsgi(app)（旧入口）和 asgi_app（原生异步入口），
+以相同并发请求同一组接口，输出每秒请求数和延迟分位数。
+需要额外安装 uvicorn。
+用法: python bench/loadtest.py [--concurrency 100] [--duration 10] [--delay-ms 50]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCH_DIR = os.path.abspath(os.path.dirname(__file__))
+API_DIR = os.path.join(BENCH_DIR, "..", "api")
+
+ENTRYPOINTS = {
+    "wsgi": "from asgiref.wsgi import WsgiToAsgi; import index; "
+    "application = WsgiToAsgi(index.app)",
+    "asgi": "import index; application = index.asgi_app",
+}
+
+ROUTES = {
+    "comic": "/comic/{n}",
+    "photo": "/photo/{n}/chapter/1",
+    "search": "/search/test{n}/1",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(proc: subprocess.Popen, url: str, name: str):
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{name} 启动失败")
+
+
+def start_stub(port: int, delay_ms: float, fixtures: str = None) -> subprocess.Popen:
+    # 桩服务器放在独立进程，避免与压测客户端争抢GIL
+    command = [
+        sys.executable,
+        os.path.join(BENCH_DIR, "stub_upstream.py"),
+        "--port",
+        str(port),
+        "--delay-ms",
+        str(delay_ms),
+    ]
+    if fixtures:
+        command += ["--fixtures", fixtures]
+    proc = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    wait_ready(proc, f"http://127.0.0.1:{port}/", "上游桩服务器")
+    return proc
+
+
+def start_server(
+    mode: str, port: int, upstream: str, extra_env: dict = None
+) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        QQCOMIC_AC_BASE_URL=upstream,
+        QQCOMIC_M_AC_BASE_URL=upstream,
+        # 关闭详情缓存，让每个请求都访问上游
+        QQCOMIC_COMIC_INFO_CACHE_SIZE="0",
+        # 桩服务器端口每次不同，章节索引只保存在内存中
+        QQCOMIC_CHAPTER_INDEX_PATH="",
+        PYTHONPATH=API_DIR,
+    )
+    env.update(extra_env or {})
+    code = (
+        f"{ENTRYPOINTS[mode]}; import uvicorn; "
+        f"uvicorn.run(application, port={port}, log_level='warning')"
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL
+    )
+    wait_ready(proc, f"http://127.0.0.1:{port}/", f"{mode} 服务")
+    return proc
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run_load(base_url: str, path: str, concurrency: int, duration: float):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+
+        async def worker(worker_id: int):
+            nonlocal errors
+            n = worker_id
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(path.format(n=n % 50 + 1))
+                    if resp.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+                n += concurrency
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--delay-ms", type=float, default=50, help="上游固定延迟")
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = start_stub(stub_port, args.delay_ms)
+    upstream = f"http://127.0.0.1:{stub_port}"
+    print(f"上游延迟 {args.delay_ms}ms, 并发 {args.concurrency}, 每项 {args.duration}s")
+    print(
+        f"{'入口':<6}{'接口':<8}{'请求数':>8}{'错误':>6}{'RPS':>9}"
+        f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+    )
+    try:
+        for mode in ENTRYPOINTS:
+            port = free_port()
+            proc = start_server(mode, port, upstream)
+            try:
+                for route in args.routes.split(","):
+                    result = asyncio.run(
+                        run_load(
+                            f"http://127.0.0.1:{port}",
+                            ROUTES[route],
+                            args.concurrency,
+                            args.duration,
+                        )
+                    )
+                    print(
+                        f"{mode:<6}{route:<8}{result['requests']:>8}"
+                        f"{result['errors']:>6}{result['rps']:>9.1f}"
+                        f"{result['p50'] * 1000:>10.1f}{result['p95'] * 1000:>10.1f}"
+                        f"{result['p99'] * 1000:>10.1f}"
+                    )
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+录制基准使用的上游页面和图片
+
+从 ac.qq.com / m.ac.qq.com 读取一部漫画的详情页、一个章节页、一页搜索结果和一张图片，
+保存到 bench/fixtures，供 stub_upstream.py --fixtures 回放和微基准使用。
+无法访问上游时可用 --synthetic 按桩服务器的规则生成同样结构的文件，
+另外生成 nonce 只能由V8求值的 chapter_v8.html；录制线上页面时不改动该文件。
+样本的来源记录在 bench/fixtures/README.md，重新生成后需同步修改。
+用法: python bench/record_fixtures.py [--comic-id 505430] [--cid 1] [--keyword 御史]
+      [--image-url URL] [--synthetic]
+"""
+
+import argparse
+import os
+import re
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+
+from stub_upstream import (  # noqa: E402
+    FIXTURE_FILES,
+    chapter_page,
+    comic_image,
+    search_page,
+)
+
+
+def record(args) -> dict:
+    """请求线上页面，返回 {类型: 内容}"""
+    from index import ComicSearch, Config, IMAGE_UPSTREAM_HEADERS, upstream
+
+    def fetch(url: str, headers: dict) -> bytes:
+        resp = upstream.get(url, headers=headers, timeout=30)
+        resp.raise_for_status()
+        return resp.content
+
+    searcher = ComicSearch()
+    chapter_url = (
+        f"{Config.AC_BASE_URL}/ComicView/index/id/{args.comic_id}/cid/{args.cid}"
+    )
+    recorded = {
+        "comic_info": fetch(
+            f"{Config.AC_BASE_URL}/Comic/comicInfo/id/{args.comic_id}", Config.HEADERS
+        ),
+        "chapter": fetch(chapter_url, Config.HEADERS),
+        "search": fetch(searcher._search_url(args.keyword, 1), searcher.headers),
+    }
+    image_url = args.image_url
+    if not image_url:
+        # 取章节页中的第一张图片
+        from index import ComicParser
+
+        data = ComicParser.parse_chapter_html(
+            chapter_url, recorded["chapter"].decode("utf-8")
+        )
+        image_url = data["data"]["picture"][0]["url"]
+    recorded["image"] = fetch(image_url, IMAGE_UPSTREAM_HEADERS)
+    return recorded
+
+
+def synthesize(args) -> dict:
+    """按桩服务器的规则生成结构相同的文件"""
+    with open(os.path.join(FIXTURES_DIR, "comic_info_basic.html"), "rb") as f:
+        comic_info = f.read()
+    return {
+        "comic_info": comic_info,
+        "chapter": chapter_page(
+            "manhua.acimg.cn", args.comic_id, args.cid, 30
+        ).encode(),
+        "chapter_v8": chapter_page(
+            "manhua.acimg.cn", args.comic_id, args.cid + 1, 30, v8_nonce=True
+        ).encode(),
+        "search": search_page(args.keyword, 1, 1).encode(),
+        "image": comic_image(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comic-id", type=int, default=505430)
+    parser.add_argument("--cid", type=int, default=1)
+    parser.add_argument("--keyword", default="御史")
+    parser.add_argument("--image-url")
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+
+    files = synthesize(args) if args.synthetic else record(args)
+    for kind, content in files.items():
+        path = os.path.join(FIXTURES_DIR, FIXTURE_FILES[kind])
+        with open(path, "wb") as f:
+            f.write(content)
+        print(f"{os.path.relpath(path)}  {len(content)} 字节")
+
+
+if __name__ == "__main__":
+    main()
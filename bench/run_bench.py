@@ -0,0 +1,281 @@
+"""
+离线基准套件
+
+微基准：用 bench/fixtures 中的页面和图片，逐次计时
+decode_base64_custom、nonce 求值（快速路径和V8）、descramble、章节页完整解析、
+详情页解析、_parse_search_results 和图片缩放编码。
+压测：用 --fixtures 回放模式启动上游桩服务器和 uvicorn，
+按设定并发请求 /comic、/photo、/search 和 /image/proxy，统计吞吐量和 p50/p95/p99。
+结果可写入 JSON，并与之前的结果比较，便于在提交之间发现性能回退。
+
+用法: python bench/run_bench.py [--output result.json] [--compare base.json]
+      [--skip-load] [--modes asgi,wsgi] [--concurrency 50] [--duration 10]
+      [--delay-ms 50] [--warm]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "api"))
+
+import loadtest  # noqa: E402
+from stub_upstream import FIXTURE_FILES  # noqa: E402
+
+LOAD_ROUTES = {
+    "comic": "/comic/{n}",
+    "photo": "/photo/{n}/chapter/1",
+    # 回放时第2话的cid为偶数，章节页的nonce走V8
+    "photo_v8": "/photo/{n}/chapter/2",
+    "search": "/search/test{n}/1",
+    "image": "/image/proxy?url={upstream}/img/{n}.jpg",
+}
+
+# 冷启动压测关闭各级缓存，每个请求都走完整流程
+COLD_ENV = {
+    "QQCOMIC_COMIC_INFO_CACHE_SIZE": "0",
+    "QQCOMIC_SEARCH_PAGE_CACHE_SIZE": "0",
+    "QQCOMIC_CHAPTER_IMAGES_CACHE_SIZE": "0",
+    "QQCOMIC_IMAGE_CACHE_MEMORY_BYTES": "0",
+    "QQCOMIC_IMAGE_CACHE_DISK_BYTES": "0",
+}
+
+
+def read_fixture(kind: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, FIXTURE_FILES[kind]), "rb") as f:
+        return f.read()
+
+
+def summarize(latencies) -> dict:
+    """延迟统计，单位毫秒"""
+    ordered = sorted(latencies)
+    return {
+        "calls": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": loadtest.percentile(ordered, 0.50) * 1000,
+        "p95_ms": loadtest.percentile(ordered, 0.95) * 1000,
+        "p99_ms": loadtest.percentile(ordered, 0.99) * 1000,
+    }
+
+
+def measure(func, *args, min_calls: int = 20, min_seconds: float = 1.0) -> dict:
+    """逐次调用计时，至少调用 min_calls 次且持续 min_seconds 秒"""
+    func(*args)  # 预热
+    latencies = []
+    deadline = time.perf_counter() + min_seconds
+    while len(latencies) < min_calls or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def run_micro(min_seconds: float) -> dict:
+    from index import (
+        ComicParser,
+        comic_searcher,
+        descramble,
+        evaluate_nonce,
+        transform_image,
+    )
+
+    chapter_html = read_fixture("chapter").decode("utf-8")
+    comic_html = read_fixture("comic_info").decode("utf-8")
+    search_html = read_fixture("search").decode("utf-8")
+    image = read_fixture("image")
+
+    chapter_v8_html = read_fixture("chapter_v8").decode("utf-8")
+
+    def extract(html: str):
+        # 与 parse_chapter_html 相同的提取方式
+        data = re.findall("(?<=var DATA = ').*?(?=')", html)[0]
+        nonce_expr = re.findall('window\\[".+?(?<=;)', html)[1]
+        return data, "=".join(nonce_expr.split("=")[1:])[:-1]
+
+    data, nonce_expr = extract(chapter_html)
+    nonce_v8_expr = extract(chapter_v8_html)[1]
+    nonce = evaluate_nonce(nonce_expr)
+    plain = descramble(data, nonce)
+    chapter_url = "https://ac.qq.com/ComicView/index/id/1/cid/1"
+
+    benchmarks = {
+        "decode_base64_custom": (ComicParser.decode_base64_custom, plain),
+        "evaluate_nonce": (evaluate_nonce, nonce_expr),
+        "evaluate_nonce_v8": (evaluate_nonce, nonce_v8_expr),
+        "descramble": (descramble, data, nonce),
+        "parse_chapter_html": (
+            ComicParser.parse_chapter_html,
+            chapter_url,
+            chapter_html,
+        ),
+        "parse_chapter_html_v8": (
+            ComicParser.parse_chapter_html,
+            chapter_url,
+            chapter_v8_html,
+        ),
+        "parse_comic_info": (ComicParser.parse_comic_info, "1", comic_html),
+        "parse_search_results": (comic_searcher._parse_search_results, search_html),
+        "transform_image_jpeg": (transform_image, image, 600, 50, "jpeg"),
+        "transform_image_webp": (transform_image, image, 600, 50, "webp"),
+    }
+    results = {}
+    for name, (func, *args) in benchmarks.items():
+        results[name] = measure(func, *args, min_seconds=min_seconds)
+        print(
+            f"  {name:<24}{results[name]['calls']:>7} 次"
+            f"{results[name]['p50_ms']:>10.3f}{results[name]['p95_ms']:>10.3f}"
+            f"{results[name]['p99_ms']:>10.3f} ms"
+        )
+    return results
+
+
+def run_load(args) -> dict:
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="qqcomic-bench-")
+    extra_env = {
+        "QQCOMIC_CHAPTER_INDEX_PATH": os.path.join(workdir, "chapters.sqlite3"),
+        "QQCOMIC_IMAGE_CACHE_DIR": os.path.join(workdir, "images"),
+    }
+    if args.warm:
+        # loadtest 默认关闭详情缓存，保留缓存时恢复为默认大小
+        extra_env["QQCOMIC_COMIC_INFO_CACHE_SIZE"] = "256"
+    else:
+        extra_env.update(COLD_ENV)
+
+    stub_port = loadtest.free_port()
+    stub = loadtest.start_stub(stub_port, args.delay_ms, FIXTURES_DIR)
+    upstream = f"http://127.0.0.1:{stub_port}"
+    try:
+        for mode in args.modes.split(","):
+            port = loadtest.free_port()
+            proc = loadtest.start_server(mode, port, upstream, extra_env)
+            results[mode] = {}
+            try:
+                for route in args.routes.split(","):
+                    path = LOAD_ROUTES[route].replace("{upstream}", upstream)
+                    result = asyncio.run(
+                        loadtest.run_load(
+                            f"http://127.0.0.1:{port}",
+                            path,
+                            args.concurrency,
+                            args.duration,
+                        )
+                    )
+                    result = {
+                        "requests": result["requests"],
+                        "errors": result["errors"],
+                        "rps": result["rps"],
+                        "p50_ms": result["p50"] * 1000,
+                        "p95_ms": result["p95"] * 1000,
+                        "p99_ms": result["p99"] * 1000,
+                    }
+                    results[mode][route] = result
+                    print(
+                        f"  {mode:<6}{route:<10}{result['requests']:>8}"
+                        f"{result['errors']:>6}{result['rps']:>9.1f}"
+                        f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                        f"{result['p99_ms']:>10.1f}"
+                    )
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, base: dict):
+    """按p50比较两次结果，正数表示变慢"""
+    print(f"\n与 {base['meta'].get('commit') or '基准'} 比较 (p50):")
+    for section in ("micro", "load"):
+        rows = []
+        if section == "micro":
+            for name, result in current.get(section, {}).items():
+                old = base.get(section, {}).get(name)
+                if old:
+                    rows.append((name, old["p50_ms"], result["p50_ms"]))
+        else:
+            for mode, routes in current.get(section, {}).items():
+                for route, result in routes.items():
+                    old = base.get(section, {}).get(mode, {}).get(route)
+                    if old:
+                        rows.append(
+                            (f"{mode}/{route}", old["p50_ms"], result["p50_ms"])
+                        )
+        for name, old, new in rows:
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"  {name:<24}{old:>10.3f}{new:>10.3f} ms{change:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="结果写入的JSON文件")
+    parser.add_argument("--compare", help="用于比较的历史结果JSON")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--micro-seconds", type=float, default=1.0)
+    parser.add_argument("--modes", default="asgi", help="asgi,wsgi")
+    parser.add_argument("--routes", default=",".join(LOAD_ROUTES))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--delay-ms", type=float, default=50, help="上游固定延迟")
+    parser.add_argument("--warm", action="store_true", help="压测时保留缓存")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+    if not args.skip_micro:
+        print(f"微基准 {'':<17}{'调用':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+        report["micro"] = run_micro(args.micro_seconds)
+    if not args.skip_load:
+        print(
+            f"\n压测 上游延迟 {args.delay_ms}ms, 并发 {args.concurrency}, "
+            f"每项 {args.duration}s, {'保留缓存' if args.warm else '关闭缓存'}"
+        )
+        print(
+            f"  {'入口':<6}{'接口':<10}{'请求数':>8}{'错误':>6}{'RPS':>9}"
+            f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+        )
+        report["load"] = run_load(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
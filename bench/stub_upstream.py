@@ -0,0 +1,317 @@
+"""
+本地上游桩服务器
+
+模拟 ac.qq.com 的详情页、章节页，m.ac.qq.com 的搜索接口和图片CDN，
+页面结构与线上一致，可配置固定延迟用于压测。
+指定 --fixtures 时回放目录中录制的页面和图片（见 record_fixtures.py），
+cid为偶数的章节回放nonce只能由V8求值的章节页，否则按规则生成页面。指定 --etag 时详情页带ETag并支持条件请求。
+--throttle-rate 和 --hang-rate 按比例注入429（带Retry-After）和长时间无响应，
+用于验证限流、重试和熔断。
+把 QQCOMIC_AC_BASE_URL 和 QQCOMIC_M_AC_BASE_URL 指向它即可离线运行。
+用法: python bench/stub_upstream.py [--port 8765] [--delay-ms 50] [--chapters 300]
+      [--fixtures bench/fixtures] [--etag] [--throttle-rate 0.2] [--hang-rate 0.1]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image, ImageDraw
+
+
+def comic_info_page(comic_id: int, chapters: int) -> str:
+    """漫画详情页"""
+    items = []
+    for i in range(1, chapters + 1):
+        items.append(
+            f'<li><a target="_blank" title="测试漫画{comic_id}：第{i}话 标题{i}" '
+            f'href="/ComicView/index/id/{comic_id}/cid/{1000 + i}">\n'
+            f"  第{i}话 标题{i}\n</a></li>"
+        )
+    return f"""<html><head><title>测试漫画{comic_id}-腾讯动漫</title></head><body>
+<div class="works-cover ui-left">
+  <a href="/Comic/comicInfo/id/{comic_id}"><img src="//img.example/cover/{comic_id}.jpg" alt="封面"></a></div>
+<a class="works-ft-btn" href="/ComicView/index/id/{comic_id}/cid/1001" title="开始阅读">开始阅读</a>
+<span>人气：<em>12.3亿</em></span>
+评分：<strong class="ui-text-orange">9.1</strong> (<span>4567</span>人评分)
+<ol class="chapter-page-all works-chapter-list">{"".join(items)}</ol>
+</body></html>"""
+
+
+def _v8_only_token(i: int, token: str) -> str:
+    """结果同为token、但纯Python快速路径不支持的写法，nonce只能交给V8求值"""
+    if i % 3 == 0:
+        return f'(function(){{return "{token}"}})()'
+    if i % 3 == 1:
+        return f'"{token[::-1]}".split("").reverse().join("")'
+    return f'(2>1?"{token}":"")'
+
+
+def scramble(data: str, seed: int, v8_nonce: bool = False) -> tuple:
+    """
+    按线上规则插入干扰字符，返回(加扰后的DATA, nonce表达式)
+
+    默认的nonce表达式只拼接字符串字面量，走纯Python快速路径；
+    v8_nonce为True时改用函数调用、方法调用和条件表达式，必须由V8求值
+    """
+    rnd = random.Random(seed)
+    chars = list(data)
+    tokens = []
+    for _ in range(8):
+        locate = rnd.randint(0, 255)
+        letters = "".join(rnd.choice("abcdefXYZ") for _ in range(rnd.randint(1, 3)))
+        tokens.append(f"{locate + 256 * rnd.randint(0, 3)}{letters}")
+        chars[locate:locate] = list(letters)
+    if v8_nonce:
+        expression = "+".join(_v8_only_token(i, t) for i, t in enumerate(tokens))
+    else:
+        expression = "+".join(f'"{token}"' for token in tokens)
+    return "".join(chars), expression
+
+
+def chapter_page(
+    host: str, comic_id: int, cid: int, pictures: int, v8_nonce: bool = False
+) -> str:
+    """章节页，DATA为加扰的Base64图片列表，v8_nonce见 scramble"""
+    data = {
+        "comic": {"id": comic_id},
+        "chapter": {"cid": cid},
+        "picture": [
+            {
+                "url": f"http://{host}/img/{comic_id}/{cid}/{i}.jpg",
+                "width": 800,
+                "height": 1200,
+            }
+            for i in range(pictures)
+        ],
+    }
+    encoded = base64.b64encode(json.dumps(data).encode()).decode()
+    scrambled, expression = scramble(encoded, cid, v8_nonce)
+    return f"""<html><head><title>《测试漫画{comic_id}》第{cid}话-在线漫画</title></head><body>
+<script>window["nonce"] = "placeholder";</script>
+<script>var DATA = '{scrambled}',
+ PRELOAD_NUM = 4;</script>
+<script>window["n"+"once"] = {expression};</script>
+</body></html>"""
+
+
+def search_page(word: str, page: int, pages: int) -> str:
+    """搜索结果片段，超过pages页后为空"""
+    if page > pages:
+        return '<ul class="comic-list"></ul>'
+    items = []
+    for i in range(10):
+        comic_id = page * 100 + i
+        items.append(
+            f'<li class="comic-item"><a href="/comic/index/id/{comic_id}">'
+            f'<img class="cover-image" src="//img.example/cover/{comic_id}.jpg">'
+            f'<strong class="comic-title">{word}{page}-{i}</strong>'
+            f'<small class="comic-update">更新至第{i}话</small>'
+            f'<small class="comic-tag">热血 冒险</small>'
+            f'<small class="comic-desc">{word}的描述{i}</small></a></li>'
+        )
+    return f'<ul class="comic-list">{"".join(items)}</ul>'
+
+
+def comic_image(width: int = 800, height: int = 1200) -> bytes:
+    """带色块和线条的样例漫画页"""
+    image = Image.new("RGB", (width, height), (250, 250, 245))
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 180):
+        shade = (y // 180 * 37) % 200
+        draw.rectangle((20, y + 10, width - 20, y + 150), outline=(0, 0, 0), width=4)
+        draw.ellipse(
+            (width // 4, y + 30, width // 2, y + 140), fill=(shade, 120, 200 - shade)
+        )
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的监听队列只有5，高并发时连接会被丢弃重试
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # 客户端超时断开后写入响应失败，不打印堆栈
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+# 回放时各类请求使用的录制文件；cid为偶数的章节回放chapter_v8，
+# 其nonce必须由V8求值，用于覆盖慢路径
+FIXTURE_FILES = {
+    "comic_info": "comic_info_basic.html",
+    "chapter": "chapter_basic.html",
+    "chapter_v8": "chapter_v8.html",
+    "search": "search_basic.html",
+    "image": "image_basic.jpg",
+}
+
+
+def load_fixtures(directory: str) -> dict:
+    """读取录制文件，缺少的类型仍按规则生成"""
+    fixtures = {}
+    for kind, name in FIXTURE_FILES.items():
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                fixtures[kind] = f.read()
+    return fixtures
+
+
+class StubUpstream:
+    """在后台线程运行的桩服务器，记录每个路径的请求次数"""
+
+    def __init__(
+        self,
+        port: int = 0,
+        delay_ms: float = 0,
+        chapters: int = 300,
+        pictures: int = 8,
+        search_pages: int = 3,
+        fixtures_dir: str = None,
+        etag: bool = False,
+        throttle_rate: float = 0.0,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 30.0,
+        retry_after: int = 1,
+    ):
+        self.fixtures = load_fixtures(fixtures_dir) if fixtures_dir else {}
+        # 详情页带ETag，并对匹配的If-None-Match返回304
+        self.etag = etag
+        # 按比例返回429，或等待hang_seconds后才响应，运行中可修改
+        self.throttle_rate = throttle_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.retry_after = retry_after
+        self.delay = delay_ms / 1000.0
+        self.chapters = chapters
+        self.pictures = pictures
+        self.search_pages = search_pages
+        self.image = self.fixtures.get("image") or comic_image()
+        self.hits = {}
+        self._lock = threading.Lock()
+        self.server = _Server(("127.0.0.1", port), self._handler())
+        self.port = self.server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                with stub._lock:
+                    stub.hits[url.path] = stub.hits.get(url.path, 0) + 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                headers = {}
+                fault = random.random()
+                if fault < stub.throttle_rate:
+                    status, content_type, body = 429, "text/plain", b"too many requests"
+                    headers["Retry-After"] = str(stub.retry_after)
+                else:
+                    if fault < stub.throttle_rate + stub.hang_rate:
+                        time.sleep(stub.hang_seconds)
+                    status, content_type, body = stub.route(
+                        url.path, parse_qs(url.query), self.headers.get("Host", "")
+                    )
+                if (
+                    stub.etag
+                    and status == 200
+                    and url.path.startswith("/Comic/comicInfo/")
+                ):
+                    headers["ETag"] = f'"{hashlib.md5(body).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == headers["ETag"]:
+                        status, body = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def route(self, path: str, query: dict, host: str):
+        html = "text/html; charset=utf-8"
+        parts = path.strip("/").split("/")
+        if path.startswith("/Comic/comicInfo/id/"):
+            if "comic_info" in self.fixtures:
+                return 200, html, self.fixtures["comic_info"]
+            page = comic_info_page(int(parts[-1]), self.chapters)
+            return 200, html, page.encode()
+        if path.startswith("/ComicView/index/id/"):
+            if "chapter_v8" in self.fixtures and int(parts[5]) % 2 == 0:
+                return 200, html, self.fixtures["chapter_v8"]
+            if "chapter" in self.fixtures:
+                return 200, html, self.fixtures["chapter"]
+            page = chapter_page(host, int(parts[3]), int(parts[5]), self.pictures)
+            return 200, html, page.encode()
+        if path == "/search/result":
+            if "search" in self.fixtures:
+                return 200, html, self.fixtures["search"]
+            word = query.get("word", [""])[0]
+            page = int(query.get("page", ["1"])[0])
+            return 200, html, search_page(word, page, self.search_pages).encode()
+        if path.startswith("/img/"):
+            return 200, "image/jpeg", self.image
+        return 404, "text/plain", b"not found"
+
+    def start(self) -> "StubUpstream":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--fixtures", help="回放录制文件的目录")
+    parser.add_argument("--etag", action="store_true", help="详情页支持条件请求")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="返回429的比例")
+    parser.add_argument("--hang-rate", type=float, default=0, help="长时间无响应的比例")
+    parser.add_argument("--hang-seconds", type=float, default=30)
+    args = parser.parse_args()
+
+    stub = StubUpstream(
+        args.port,
+        args.delay_ms,
+        args.chapters,
+        fixtures_dir=args.fixtures,
+        etag=args.etag,
+        throttle_rate=args.throttle_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+    )
+    print(f"上游桩服务器: {stub.base_url}")
+    stub.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
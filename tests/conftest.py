@@ -0,0 +1,36 @@
+"""
+测试共用的导入路径、环境变量与本地桩服务器
+
+测试只访问 bench/stub_upstream.py 启动的本地服务器，不访问网络；
+索引和缓存只保存在进程内。
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "api"), os.path.join(ROOT, "bench")]
+os.environ.update(
+    QQCOMIC_CHAPTER_INDEX_PATH="",
+    QQCOMIC_SEARCH_INDEX_PATH="",
+    QQCOMIC_CACHE_BACKEND="",
+    QQCOMIC_IMAGE_CACHE_DISK_BYTES="0",
+    QQCOMIC_IMAGE_WORKERS="0",
+)
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """本地上游桩服务器，详情页、章节页、搜索和图片都指向它"""
+    from index import Config, comic_searcher
+
+    server = StubUpstream().start()
+    monkeypatch.setattr(Config, "AC_BASE_URL", server.base_url)
+    monkeypatch.setattr(Config, "M_AC_BASE_URL", server.base_url)
+    monkeypatch.setattr(comic_searcher, "base_url", server.base_url)
+    yield server
+    server.stop()
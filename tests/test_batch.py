@@ -0,0 +1,69 @@
+"""批量接口：不合法的条目单独返回400，其他条目照常处理"""
+
+import asyncio
+import json
+
+import httpx
+
+import index
+
+
+def _lines(body: bytes):
+    return sorted(
+        (json.loads(line) for line in body.decode().splitlines()),
+        key=lambda line: line["index"],
+    )
+
+
+def test_batch_comics_invalid_item(stub):
+    client = index.app.test_client()
+    response = client.post("/batch/comics", json={"items": ["301", 302, "abc"]})
+    assert response.status_code == 200
+    lines = _lines(response.data)
+    assert [line["status"] for line in lines] == [200, 200, 400]
+    assert lines[0]["comic_id"] == "301"
+    assert lines[2] == {"index": 2, "status": 400, "error": "漫画ID必须是数字: abc"}
+
+
+def test_batch_chapters_invalid_item(stub):
+    client = index.app.test_client()
+    items = [
+        {"comic_id": "303", "chapter": 1},
+        {"comic_id": "303", "chapter": 0},
+        "303",
+    ]
+    response = client.post("/batch/chapters", json={"items": items})
+    assert response.status_code == 200
+    assert [line["status"] for line in _lines(response.data)] == [200, 400, 400]
+
+
+def test_batch_malformed_body(stub):
+    client = index.app.test_client()
+    assert client.post("/batch/comics", json={"items": []}).status_code == 400
+    assert client.post("/batch/comics", json={"ids": ["301"]}).status_code == 400
+    too_many = {"items": ["301"] * (index.Config.BATCH_MAX_ITEMS + 1)}
+    assert client.post("/batch/comics", json=too_many).status_code == 400
+
+
+def test_batch_invalid_item_async(stub):
+    async def run():
+        transport = httpx.ASGITransport(app=index.asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            response = await c.post(
+                "/batch/comics", json={"items": ["304", True, "abc"]}
+            )
+            assert response.status_code == 200
+            statuses = [line["status"] for line in _lines(response.content)]
+            assert statuses == [200, 400, 400]
+            response = await c.post("/batch/chapters", json={"items": {}})
+            assert response.status_code == 400
+
+    asyncio.run(run())
+
+
+def test_batch_stage_timings_use_route(stub):
+    client = index.app.test_client()
+    response = client.post("/batch/comics", json={"items": ["305"]})
+    assert [line["status"] for line in _lines(response.data)] == [200]
+    # 流式响应体在请求统计结束后才产出，阶段耗时仍计入批量路由
+    assert ("/batch/comics", "upstream") in index.stage_duration._series
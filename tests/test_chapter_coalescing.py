@@ -0,0 +1,38 @@
+"""同一章节的并发请求只访问一次上游，带Cookie的请求不共享匿名结果"""
+
+import asyncio
+
+import index
+from bench_chapter_coalescing import (
+    chapter_fetches,
+    detail_fetches,
+    run_asgi,
+    run_flask,
+)
+
+CONCURRENCY = 20
+
+
+def test_flask_requests_coalesce(stub):
+    stub.delay = 0.2
+    run_flask(index, stub, 201, CONCURRENCY)
+    assert detail_fetches(stub, 201) == 1
+    assert chapter_fetches(stub, 201) == 1
+
+    # 缓存命中，不再请求上游
+    run_flask(index, stub, 201, CONCURRENCY)
+    assert chapter_fetches(stub, 201) == 1
+
+
+def test_cookie_requests_use_own_cache_key(stub):
+    stub.delay = 0.2
+    run_flask(index, stub, 202, CONCURRENCY)
+    run_flask(index, stub, 202, CONCURRENCY, cookie="uin=o123")
+    assert chapter_fetches(stub, 202) == 2
+
+
+def test_asgi_requests_coalesce(stub):
+    stub.delay = 0.2
+    asyncio.run(run_asgi(index, 203, CONCURRENCY))
+    assert detail_fetches(stub, 203) == 1
+    assert chapter_fetches(stub, 203) == 1
@@ -0,0 +1,52 @@
+"""新发布章节：请求的章节号大于索引中最新章节时刷新索引"""
+
+import asyncio
+
+import httpx
+
+import index
+
+
+def test_new_chapter_refreshes_index(stub, monkeypatch):
+    monkeypatch.setattr(index.Config, "CHAPTER_INDEX_MIN_REFRESH", 0)
+    stub.chapters = 10
+    client = index.app.test_client()
+    assert client.get("/photo/101/chapter/10").status_code == 200
+
+    stub.chapters = 11
+    assert client.get("/photo/101/chapter/11").status_code == 200
+    # 仍不存在的章节刷新后返回404
+    assert client.get("/photo/101/chapter/12").status_code == 404
+
+
+def test_new_chapter_refresh_interval(stub, monkeypatch):
+    stub.chapters = 10
+    client = index.app.test_client()
+    assert client.get("/photo/102/chapter/1").status_code == 200
+
+    # 距上次刷新不足最小间隔时不访问上游
+    stub.chapters = 11
+    path = "/Comic/comicInfo/id/102"
+    hits = stub.hits[path]
+    assert client.get("/photo/102/chapter/11").status_code == 404
+    assert stub.hits[path] == hits
+
+
+def test_new_chapter_refreshes_index_async(stub, monkeypatch):
+    monkeypatch.setattr(index.Config, "CHAPTER_INDEX_MIN_REFRESH", 0)
+    stub.chapters = 10
+
+    async def run():
+        transport = httpx.ASGITransport(app=index.asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            assert (await c.get("/photo/103/chapter/10")).status_code == 200
+            stub.chapters = 11
+            hits = stub.hits["/Comic/comicInfo/id/103"]
+            responses = await asyncio.gather(
+                *(c.get("/photo/103/chapter/11") for _ in range(5))
+            )
+            assert [r.status_code for r in responses] == [200] * 5
+            # 并发请求只刷新一次
+            assert stub.hits["/Comic/comicInfo/id/103"] == hits + 1
+
+    asyncio.run(run())
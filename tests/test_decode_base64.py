@@ -0,0 +1,33 @@
+"""decode_base64_custom 与优化前实现的差分比对"""
+
+import base64
+import os
+import random
+
+from bench_base64 import _outcome, check_equivalence, legacy_decode_base64_custom
+from index import ComicParser
+
+
+def test_matches_legacy_decoder():
+    check_equivalence(rounds=500)
+
+
+def test_table_fallback_matches_legacy_decoder():
+    rnd = random.Random(1)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+    samples = ["", "AA==", "AAA=", "A===", "AA=A", "===="]
+    for _ in range(500):
+        samples.append(base64.b64encode(os.urandom(rnd.randint(0, 64))).decode())
+        samples.append(
+            "".join(rnd.choice(alphabet) for _ in range(4 * rnd.randint(0, 8)))
+        )
+    for sample in samples:
+        assert _outcome(ComicParser._decode_base64_table, sample) == _outcome(
+            legacy_decode_base64_custom, sample
+        ), sample
+
+
+def test_round_trip():
+    for size in range(0, 300, 7):
+        raw = os.urandom(size)
+        assert ComicParser.decode_base64_custom(base64.b64encode(raw).decode()) == raw
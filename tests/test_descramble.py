@@ -0,0 +1,27 @@
+"""descramble 与旧的逐个删除实现的差分比对和性质检查"""
+
+import random
+import string
+
+from bench_descramble import check_equivalence, legacy_descramble, random_nonce
+from index import descramble
+
+
+def test_matches_legacy_descramble():
+    check_equivalence(rounds=1000)
+
+
+def test_long_data_matches_legacy_descramble():
+    # 只有开头一段受影响，超出该范围的部分原样保留
+    rnd = random.Random(2)
+    data = "".join(rnd.choice(string.ascii_letters) for _ in range(20000))
+    for _ in range(50):
+        nonce = random_nonce(rnd, rnd.randint(1, 40))
+        result = descramble(data, nonce)
+        assert result == legacy_descramble(data, nonce)
+        assert data.endswith(result[-10000:])
+
+
+def test_nonce_without_tokens_keeps_data():
+    assert descramble("abcdef", "") == "abcdef"
+    assert descramble("abcdef", "---") == "abcdef"
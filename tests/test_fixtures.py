@@ -0,0 +1,34 @@
+"""基准样本：两个章节页都能解析，chapter_v8 的nonce必须走V8"""
+
+import os
+
+import pytest
+
+import index
+from stub_upstream import FIXTURE_FILES, StubUpstream
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "..", "bench", "fixtures")
+CHAPTER_URL = "https://ac.qq.com/ComicView/index/id/505430/cid/1"
+
+
+def _read(kind: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, FIXTURE_FILES[kind]), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("kind, path", [("chapter", "fast_path"), ("chapter_v8", "v8")])
+def test_chapter_fixture_nonce_path(kind, path):
+    before = dict(index.nonce_stats)
+    result = index.ComicParser.parse_chapter_html(CHAPTER_URL, _read(kind))
+    assert len(result["data"]["picture"]) == 30
+    assert index.nonce_stats[path] == before[path] + 1
+    assert sum(index.nonce_stats.values()) == sum(before.values()) + 1
+
+
+def test_replay_serves_v8_chapter_for_even_cid():
+    stub = StubUpstream(fixtures_dir=FIXTURES_DIR)
+    status, _, body = stub.route("/ComicView/index/id/505430/cid/102", {}, "127.0.0.1")
+    assert status == 200 and body.decode() == _read("chapter_v8")
+    status, _, body = stub.route("/ComicView/index/id/505430/cid/101", {}, "127.0.0.1")
+    assert body.decode() == _read("chapter")
+    stub.server.server_close()
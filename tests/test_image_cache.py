@@ -0,0 +1,66 @@
+"""处理后图片缓存：ETag协商、磁盘命中提升到内存，以及两级的LRU淘汰"""
+
+import os
+from urllib.parse import urlencode
+
+import index
+
+
+def test_etag_not_modified(stub):
+    client = index.app.test_client()
+    path = "/image/proxy?" + urlencode({"url": f"{stub.base_url}/img/601/1/0.jpg"})
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    hits = sum(stub.hits.values())
+    second = client.get(path, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == etag
+    assert sum(stub.hits.values()) == hits
+    assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_disk_hit_promoted_to_memory(tmp_path):
+    index.ImageCache(cache_dir=str(tmp_path), disk_bytes=1 << 20).set(
+        "k", b"x" * 10, 99
+    )
+
+    # 新实例的内存层为空，从磁盘读取后放入内存
+    cache = index.ImageCache(cache_dir=str(tmp_path), disk_bytes=1 << 20)
+    assert cache.get("k") == b"x" * 10
+    assert cache.get("k") == b"x" * 10
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+    assert stats["upstream_bytes_saved"] == 198
+
+
+def test_memory_lru_eviction():
+    cache = index.ImageCache(memory_bytes=10, disk_bytes=0)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    cache.get("a")
+    cache.set("c", b"1234")
+    # b最久未访问，被淘汰
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"1234"
+    assert cache.stats()["memory_bytes"] <= 10
+
+
+def test_disk_lru_eviction(tmp_path):
+    entry = 100 + index.ImageCache._HEADER_SIZE
+    cache = index.ImageCache(
+        memory_bytes=0, cache_dir=str(tmp_path), disk_bytes=entry * 7 // 2
+    )
+    for i, key in enumerate(("a1", "b1", "c1")):
+        cache.set(key, b"x" * 100)
+        os.utime(cache._disk_path(key), (1000 + i, 1000 + i))
+    # 读取会刷新访问时间，a1不再是最久未访问的
+    assert cache.get("a1") == b"x" * 100
+    cache.set("d1", b"x" * 100)
+
+    assert not os.path.exists(cache._disk_path("b1"))
+    for key in ("a1", "c1", "d1"):
+        assert os.path.exists(cache._disk_path(key))
+    assert cache.stats()["disk_bytes"] == entry * 3
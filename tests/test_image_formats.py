@@ -0,0 +1,69 @@
+"""按Accept协商图片输出格式，每种格式单独缓存"""
+
+import io
+from urllib.parse import urlencode
+
+import pytest
+from PIL import Image
+
+import index
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        ("image/avif,image/webp,*/*", "webp"),
+        ("image/webp;q=0.5", "webp"),
+        ("image/webp;q=0,*/*", "jpeg"),
+        ("image/png,*/*", "jpeg"),
+        ("", "jpeg"),
+    ],
+)
+def test_negotiate_from_accept(accept, expected):
+    assert index.negotiate_image_format(None, accept) == expected
+
+
+def test_negotiate_order_and_explicit(monkeypatch):
+    monkeypatch.setattr(index.Config, "IMAGE_NEGOTIATED_FORMATS", ["avif", "webp"])
+    expected = "avif" if index._image_format_supported("avif") else "webp"
+    assert index.negotiate_image_format(None, "image/avif,image/webp") == expected
+    # format参数优先于Accept
+    assert index.negotiate_image_format("JPG", "image/webp") == "jpeg"
+    with pytest.raises(ValueError):
+        index.negotiate_image_format("gif", "")
+
+
+def test_proxy_caches_each_format(stub):
+    client = index.app.test_client()
+    url = f"{stub.base_url}/img/801/1/0.jpg"
+    path = "/image/proxy?" + urlencode({"url": url})
+    webp = client.get(path, headers={"Accept": "image/webp,*/*"})
+    jpeg = client.get(path, headers={"Accept": "image/jpeg"})
+    assert webp.headers["Content-Type"] == "image/webp"
+    assert jpeg.headers["Content-Type"] == "image/jpeg"
+    assert "Accept" in webp.headers["Vary"]
+    assert webp.headers["ETag"] != jpeg.headers["ETag"]
+    assert Image.open(io.BytesIO(webp.data)).format == "WEBP"
+    assert Image.open(io.BytesIO(jpeg.data)).format == "JPEG"
+
+    width, quality = (
+        index.Config.IMAGE_DEFAULT_WIDTH,
+        index.Config.IMAGE_DEFAULT_QUALITY,
+    )
+    for fmt in ("webp", "jpeg"):
+        key = index.ImageCache.make_key(url, width, quality, fmt)
+        assert index.image_cache.contains(key)
+
+    # 两种格式都从缓存返回，不再访问上游
+    hits = sum(stub.hits.values())
+    again = client.get(path, headers={"Accept": "image/webp"})
+    assert again.headers["Content-Type"] == "image/webp"
+    assert again.data == webp.data
+    assert client.get(path).headers["Content-Type"] == "image/jpeg"
+    assert sum(stub.hits.values()) == hits
+
+
+def test_proxy_rejects_unknown_format(stub):
+    client = index.app.test_client()
+    query = urlencode({"url": f"{stub.base_url}/img/802/1/0.jpg", "format": "bmp"})
+    assert client.get(f"/image/proxy?{query}").status_code == 400
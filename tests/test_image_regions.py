@@ -0,0 +1,84 @@
+"""长条图分段：slices等分与y0/y1像素范围，只返回缩放后图片的一部分"""
+
+import asyncio
+import io
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+from PIL import Image
+
+import index
+
+
+def _size(data: bytes):
+    return Image.open(io.BytesIO(data)).size
+
+
+@pytest.fixture
+def image(stub):
+    source_width, source_height = _size(stub.image)
+    width = index.Config.IMAGE_DEFAULT_WIDTH
+    height = round(source_height * width / source_width)
+    return f"{stub.base_url}/img/901/1/0.jpg", width, height
+
+
+def _path(url: str, **region) -> str:
+    return "/image/proxy?" + urlencode({"url": url, "format": "jpeg", **region})
+
+
+def test_slices_cover_image(image):
+    url, width, height = image
+    client = index.app.test_client()
+    heights = []
+    for i in range(3):
+        response = client.get(_path(url, slices=3, slice=i))
+        assert response.status_code == 200
+        slice_width, slice_height = _size(response.data)
+        assert slice_width == width
+        heights.append(slice_height)
+    assert sum(heights) == height
+    assert max(heights) - min(heights) <= 1
+
+
+def test_pixel_range(image):
+    url, width, height = image
+    client = index.app.test_client()
+    assert _size(client.get(_path(url, y0=100, y1=250)).data) == (width, 150)
+    # 省略y1时到底部，超出高度的y1截断到底部
+    assert _size(client.get(_path(url, y0=100)).data) == (width, height - 100)
+    response = client.get(_path(url, y0=height - 10, y1=height + 500))
+    assert _size(response.data) == (width, 10)
+
+
+@pytest.mark.parametrize(
+    "region",
+    [
+        {"slices": 3, "slice": 3},
+        {"slices": 0},
+        {"y0": 200, "y1": 100},
+        {"y0": "a"},
+        {"y0": 100000},
+    ],
+)
+def test_invalid_region(image, region):
+    url, _, _ = image
+    client = index.app.test_client()
+    assert client.get(_path(url, **region)).status_code == 400
+
+
+def test_slices_async(image):
+    url, width, height = image
+
+    async def run():
+        transport = httpx.ASGITransport(app=index.asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            responses = await asyncio.gather(
+                *(c.get(_path(url, slices=2, slice=i)) for i in range(2))
+            )
+        assert [r.status_code for r in responses] == [200, 200]
+        sizes = [_size(r.content) for r in responses]
+        assert sum(h for _, h in sizes) == height
+        assert {w for w, _ in sizes} == {width}
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+"""图片代理URL签名：签名有效才处理，未设置密钥时只处理已知主机的图片"""
+
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import pytest
+
+import index
+
+
+def _path(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}"
+
+
+def _tamper(proxy_url: str, changes) -> str:
+    params = dict(parse_qsl(urlsplit(proxy_url).query))
+    params.update(changes)
+    params = {name: value for name, value in params.items() if value is not None}
+    return f"/image/proxy?{urlencode(params)}"
+
+
+@pytest.fixture
+def signed(stub, monkeypatch):
+    monkeypatch.setattr(index.Config, "IMAGE_URL_SECRET", "test-secret")
+    return f"{stub.base_url}/img/401/1/0.jpg"
+
+
+def test_valid_signature_accepted(signed):
+    client = index.app.test_client()
+    url = index.get_proxy_image_url(signed, "http://localhost/")
+    assert client.get(_path(url)).status_code == 200
+    sliced = index.get_proxy_image_url(signed, "http://localhost/", slices=3, slice=1)
+    assert client.get(_path(sliced)).status_code == 200
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"width": "601"},
+        {"url": "http://evil.example/a.jpg"},
+        {"slice": "2"},
+        {"sig": None},
+        {"sig": "0" * 32},
+    ],
+)
+def test_tampered_request_rejected(signed, stub, changes):
+    client = index.app.test_client()
+    url = index.get_proxy_image_url(signed, "http://localhost/", slices=3, slice=1)
+    hits = sum(stub.hits.values())
+    assert client.get(_tamper(url, changes)).status_code == 403
+    # 拒绝的请求不访问上游
+    assert sum(stub.hits.values()) == hits
+
+
+def test_unsigned_known_host_only(stub):
+    client = index.app.test_client()
+    known = urlencode({"url": f"{stub.base_url}/img/402/1/0.jpg"})
+    assert client.get(f"/image/proxy?{known}").status_code == 200
+    for url in ("http://evil.example/a.jpg", "file:///etc/passwd"):
+        response = client.get(f"/image/proxy?{urlencode({'url': url})}")
+        assert response.status_code == 403
@@ -0,0 +1,56 @@
+"""nonce快速求值与V8逐条对比，不能求值的表达式必须交给V8"""
+
+import pytest
+from py_mini_racer import MiniRacer
+
+import index
+
+CORPUS = [
+    '"abc"',
+    "'a' + 'b'",
+    '1 + 2 + "x"',
+    '"x" + 1 + 2',
+    '(1 + 2) + "x" + (3 + 4)',
+    '"a\\x41\\u4e2db"',
+    '"\\n\\t\\r\\b\\f\\v"',
+    '"\\0x"',
+    '"\\q\\"\\\'\\\\"',
+    '"\\8\\9"',
+    '"a\\101b"',
+    '"\\01"',
+    '"\\7"',
+    '"\\uD83D\\uDE00"',
+    '"\\u{41}"',
+    '9007199254740992 + ""',
+    '9007199254740993 + ""',
+    '9007199254740992 + 1 + ""',
+    '4503599627370496 + 4503599627370497 + ""',
+    '"x" + 9007199254740993',
+    '1000000000000000000000 + ""',
+    '"ab" + (12 + 3) + "cd" + 45',
+]
+
+
+@pytest.fixture(scope="module")
+def v8():
+    return MiniRacer()
+
+
+@pytest.mark.parametrize("expr", CORPUS)
+def test_fast_path_matches_v8(v8, expr):
+    expected = str(v8.eval(expr))
+    try:
+        result = index._eval_simple_js(expr)
+    except index._UnsupportedExpression:
+        pass
+    else:
+        assert result == expected
+    assert index.evaluate_nonce(expr) == expected
+
+
+@pytest.mark.parametrize(
+    "expr", ['"a\\101b"', '9007199254740993+""', '"\\uD83D\\uDE00"']
+)
+def test_unsupported_falls_back(expr):
+    with pytest.raises(index._UnsupportedExpression):
+        index._eval_simple_js(expr)
@@ -0,0 +1,54 @@
+"""搜索关键词规范化：写法不同的同一查询命中同一条结果缓存"""
+
+import asyncio
+from urllib.parse import quote
+
+import httpx
+import pytest
+
+import index
+
+SEARCH_PATH = "/search/result"
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "Cache Word",
+        "  cache   WORD ",
+        "ｃａｃｈｅ　ｗｏｒｄ",
+        "cache\tword",
+        quote("Cache Word"),
+        quote(quote("cache  word")),
+    ],
+)
+def test_normalize(value):
+    assert index.normalize_search_query(value) == "cache word"
+
+
+def test_variants_share_cache_entry(stub):
+    client = index.app.test_client()
+    first = client.get("/search/Norm%20Word")
+    assert first.status_code == 200
+    hits = stub.hits[SEARCH_PATH]
+    for value in ("norm  word", quote("ＮＯＲＭ word"), "NORM%2520WORD"):
+        response = client.get(f"/search/{value}")
+        assert response.get_json() == first.get_json()
+    assert stub.hits[SEARCH_PATH] == hits
+
+    # 不同页码是不同的缓存条目
+    assert client.get("/search/norm word/2").status_code == 200
+    assert stub.hits[SEARCH_PATH] > hits
+
+
+def test_variants_share_cache_entry_async(stub):
+    async def run():
+        transport = httpx.ASGITransport(app=index.asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            first = await c.get("/search/Async%20Word")
+            hits = stub.hits[SEARCH_PATH]
+            second = await c.get("/search/" + quote("ａｓｙｎｃ  WORD"))
+            assert second.json() == first.json()
+            assert stub.hits[SEARCH_PATH] == hits
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+"""搜索has_more的两种判断方式：probe并发请求下一页，count按本页结果数推断"""
+
+import asyncio
+
+import pytest
+
+import index
+
+SEARCH_PATH = "/search/result"
+
+
+def _search(keyword: str, page: int, use_async: bool):
+    searcher = index.comic_searcher
+    if use_async:
+        return asyncio.run(searcher.search_comics_direct_async(keyword, page))
+    return searcher.search_comics_direct(keyword, page)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_probe_mode(stub, monkeypatch, use_async):
+    monkeypatch.setattr(index.Config, "SEARCH_HAS_MORE_MODE", "probe")
+    keyword = f"probe{int(use_async)}"
+    first = _search(keyword, 2, use_async)
+    assert first["total_results"] == 10 and first["has_more"] is True
+    assert stub.hits[SEARCH_PATH] == 2
+
+    # 探测时已缓存第3页，翻页只需再探测第4页
+    last = _search(keyword, 3, use_async)
+    assert last["total_results"] == 10 and last["has_more"] is False
+    assert stub.hits[SEARCH_PATH] == 3
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_count_mode(stub, monkeypatch, use_async):
+    monkeypatch.setattr(index.Config, "SEARCH_HAS_MORE_MODE", "count")
+    keyword = f"count{int(use_async)}"
+    # 满一页时推断还有下一页，不额外请求
+    full = _search(keyword, 3, use_async)
+    assert full["total_results"] == 10 and full["has_more"] is True
+    assert stub.hits[SEARCH_PATH] == 1
+
+    empty = _search(keyword, 4, use_async)
+    assert empty["total_results"] == 0 and empty["has_more"] is False
+    assert stub.hits[SEARCH_PATH] == 2
@@ -0,0 +1,84 @@
+"""本地搜索索引：倒排查询与排序，以及local、hybrid来源的路由行为"""
+
+import pytest
+
+import index
+
+SEARCH_PATH = "/search/result"
+
+
+def _comic(comic_id: int, title: str, tags: str = "") -> dict:
+    return {"comic_id": str(comic_id), "title": title, "tags": tags}
+
+
+@pytest.fixture
+def search_index():
+    # 留空路径时只保存在内存中
+    return index.SearchIndex("")
+
+
+def test_ranking(search_index):
+    search_index.add(
+        [
+            _comic(1, "王牌御史外传"),
+            _comic(2, "新王牌御史"),
+            _comic(3, "王牌御史"),
+            _comic(4, "御史王牌"),
+            _comic(5, "日常", tags="王牌御史 同人"),
+        ]
+    )
+    result = search_index.search("王牌御史")
+    # 完全相同、前缀、包含、只有标签匹配依次靠前；不连续出现的不算匹配
+    assert [r["comic_id"] for r in result["results"]] == ["3", "1", "2", "5"]
+    assert result["total_matches"] == 4
+
+
+def test_query_forms(search_index):
+    search_index.add([_comic(1, "One Piece"), _comic(2, "海贼王"), _comic(3, "王者")])
+    assert [r["comic_id"] for r in search_index.search("王")["results"]] == ["3", "2"]
+    assert search_index.search("ＯＮＥ  piece")["total_results"] == 1
+    assert search_index.search("piece one")["total_results"] == 1
+    assert search_index.search("   ")["total_results"] == 0
+
+
+def test_update_replaces_terms(search_index):
+    search_index.add([_comic(1, "旧标题")])
+    search_index.add([_comic(1, "新名字")])
+    assert search_index.search("旧标题")["total_results"] == 0
+    assert search_index.search("新名字")["total_results"] == 1
+
+
+def test_pagination(search_index):
+    search_index.add([_comic(i, f"漫画{i:02d}") for i in range(25)])
+    pages = [search_index.search("漫画", page, 10) for page in (1, 2, 3)]
+    assert [p["total_results"] for p in pages] == [10, 10, 5]
+    assert [p["has_more"] for p in pages] == [True, True, False]
+
+
+def test_local_and_hybrid_sources(stub):
+    client = index.app.test_client()
+    # 本地索引中没有时，local来源返回空结果且不请求上游
+    response = client.get("/search/idxsrc?source=local")
+    assert response.headers["X-Search-Source"] == "local"
+    assert response.get_json()["results"] == []
+    assert SEARCH_PATH not in stub.hits
+
+    # 上游搜索结果写入索引
+    response = client.get("/search/idxsrc?source=remote")
+    assert response.headers["X-Search-Source"] == "remote"
+    hits = stub.hits[SEARCH_PATH]
+    local = client.get("/search/idxsrc?source=local").get_json()
+    assert len(local["results"]) == 10 and local["has_more"] is True
+    assert stub.hits[SEARCH_PATH] == hits
+
+    # hybrid在本地结果填满一页时不请求上游，否则回退上游
+    response = client.get("/search/idxsrc?source=hybrid")
+    assert response.headers["X-Search-Source"] == "local"
+    assert stub.hits[SEARCH_PATH] == hits
+    fallbacks = index.search_index.stats()["fallbacks"]
+    response = client.get("/search/idxsrc1-3?source=hybrid")
+    assert response.headers["X-Search-Source"] == "remote"
+    assert stub.hits[SEARCH_PATH] > hits
+    assert index.search_index.stats()["fallbacks"] == fallbacks + 1
+
+    assert client.get("/search/idxsrc?source=other").status_code == 400
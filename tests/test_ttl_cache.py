@@ -0,0 +1,37 @@
+"""进程内TTL缓存的过期与LRU淘汰，以及漫画详情不再重复抓取"""
+
+import index
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(index.time, "time", lambda: now[0])
+    cache = index.TTLCache("test", maxsize=4, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    # 过期条目仍可作为旧数据读取
+    assert cache.get_stale("a") == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_eviction():
+    cache = index.TTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # b最久未访问，被淘汰
+    assert cache.get("b") is None
+    assert cache.get_stale("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["size"] == 2
+
+
+def test_comic_info_fetched_once(stub):
+    client = index.app.test_client()
+    for _ in range(3):
+        assert client.get("/comic/701").status_code == 200
+    assert stub.hits["/Comic/comicInfo/id/701"] == 1
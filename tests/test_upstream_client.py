@@ -0,0 +1,27 @@
+"""上游客户端的连接池与调控器状态不随图片代理请求的主机数增长"""
+
+import index
+
+
+def test_unknown_hosts_share_pool(stub):
+    client = index.UpstreamClient(governor=index.UpstreamGovernor())
+    port = stub.base_url.rsplit(":", 1)[1]
+    client.get(f"{stub.base_url}/img/501/1/0.jpg").close()
+    for host in (f"localhost:{port}", f"LOCALHOST:{port}"):
+        client.get(f"http://{host}/img/501/1/0.jpg").close()
+    hosts = client.stats()["hosts"]
+    assert sorted(hosts) == sorted([stub.base_url.split("//")[1], "other"])
+    assert hosts["other"]["requests"] == 2
+
+
+def test_governor_evicts_unknown_hosts(monkeypatch):
+    governor = index.UpstreamGovernor()
+    monkeypatch.setattr(governor, "MAX_HOSTS", 4)
+    governor.acquire("manhua.acimg.cn")
+    for i in range(10):
+        governor.acquire(f"host{i}.example")
+    hosts = governor.stats()["hosts"]
+    # 已知上游不淘汰，其他主机保留最近请求的
+    assert list(hosts) == ["manhua.acimg.cn"] + [
+        f"host{i}.example" for i in range(6, 10)
+    ]
@@ -0,0 +1,36 @@
+"""上游调控器的重试、Retry-After 与熔断状态转换，检查逻辑与基准脚本共用"""
+
+import index
+from bench_upstream_governor import check_breaker, check_retries, check_retry_after
+
+
+def test_retries(stub):
+    check_retries(stub)
+
+
+def test_retry_after(stub):
+    check_retry_after(stub)
+
+
+def test_breaker_transitions(stub):
+    check_breaker(stub)
+
+
+def test_metrics_host_labels(monkeypatch):
+    governor = index.UpstreamGovernor()
+    monkeypatch.setattr(index, "upstream_governor", governor)
+    for host in ('evil"\n.example', "a.example", "manhua.acimg.cn"):
+        governor.acquire(host)
+    lines = [
+        line
+        for line in index.render_metrics().splitlines()
+        if line.startswith("qqcomic_upstream_breaker_state{")
+    ]
+    assert sorted(lines) == [
+        'qqcomic_upstream_breaker_state{host="manhua.acimg.cn"} 0',
+        'qqcomic_upstream_breaker_state{host="other"} 0',
+    ]
+    assert (
+        'qqcomic_upstream_governor_total{host="other",event="requests"} 2'
+        in index.render_metrics()
+    )